@@ -1,6 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, UserProfile, Contact, Message, Event, Review, TutorialVideo, Activity, ActivityRegistration, Notification, UserStatistics
+from django.utils.html import format_html
+from django.utils import timezone
+from . import notifications, tasks
+from .models import User, UserProfile, Contact, Message, Conversation, ConversationMember, GroupMessage, Event, Review, TutorialVideo, Activity, ActivityRegistration, Notification, UserStatistics, ScheduledReminder, BackgroundTask, MediaBlob, AuthToken, SlowQuery
 
 # ===== ADMINISTRATION UTILISATEUR =====
 
@@ -89,6 +92,37 @@ class MessageAdmin(admin.ModelAdmin):
         return obj.content
     content_preview.short_description = 'Aperçu du contenu'
 
+class ConversationMemberInline(admin.TabularInline):
+    """Inline pour les membres d'une conversation"""
+    model = ConversationMember
+    extra = 0
+    raw_id_fields = ('user', 'last_read_message')
+    readonly_fields = ('unread_count', 'joined_at')
+
+@admin.register(Conversation)
+class ConversationAdmin(admin.ModelAdmin):
+    """Administration des conversations de groupe"""
+    list_display = ('title', 'kind', 'activity', 'created_by', 'last_message_at', 'created_at')
+    list_filter = ('kind', 'created_at')
+    search_fields = ('title', 'created_by__username')
+    raw_id_fields = ('activity', 'created_by', 'last_message')
+    inlines = [ConversationMemberInline]
+
+@admin.register(GroupMessage)
+class GroupMessageAdmin(admin.ModelAdmin):
+    """Administration des messages de groupe"""
+    list_display = ('conversation', 'sender', 'content_preview', 'created_at')
+    list_filter = ('created_at',)
+    search_fields = ('conversation__title', 'sender__username', 'content')
+    raw_id_fields = ('conversation', 'sender')
+    
+    def content_preview(self, obj):
+        """Aperçu du contenu du message"""
+        if len(obj.content) > 50:
+            return obj.content[:50] + '...'
+        return obj.content
+    content_preview.short_description = 'Aperçu du contenu'
+
 # ===== ADMINISTRATION ÉVÉNEMENTS =====
 
 @admin.register(Event)
@@ -145,13 +179,13 @@ class ReviewAdmin(admin.ModelAdmin):
     
     def approve_reviews(self, request, queryset):
         """Action pour approuver les avis"""
-        queryset.update(is_approved=True)
+        queryset.update(is_approved=True, updated_at=timezone.now())
         self.message_user(request, f'{queryset.count()} avis approuvés.')
     approve_reviews.short_description = 'Approuver les avis sélectionnés'
     
     def disapprove_reviews(self, request, queryset):
         """Action pour désapprouver les avis"""
-        queryset.update(is_approved=False)
+        queryset.update(is_approved=False, updated_at=timezone.now())
         self.message_user(request, f'{queryset.count()} avis désapprouvés.')
     disapprove_reviews.short_description = 'Désapprouver les avis sélectionnés'
 
@@ -205,6 +239,12 @@ class ActivityAdmin(admin.ModelAdmin):
         """Nombre de participants inscrits"""
         return obj.participants_count
     participants_count.short_description = 'Participants inscrits'
+    
+    def save_model(self, request, obj, form, change):
+        """Prévenir les inscrits d'une modification ou d'une désactivation"""
+        super().save_model(request, obj, form, change)
+        if change and notifications.activity_change_kind(obj, form.changed_data):
+            tasks.notify_activity_change.enqueue(obj.id, form.changed_data)
 
 class ActivityRegistrationInline(admin.TabularInline):
     """Inline pour les inscriptions aux activités"""
@@ -258,13 +298,13 @@ class NotificationAdmin(admin.ModelAdmin):
     def mark_as_read(self, request, queryset):
         """Action pour marquer comme lues"""
         from django.utils import timezone
-        queryset.update(is_read=True, read_at=timezone.now())
+        queryset.update(is_read=True, read_at=timezone.now(), updated_at=timezone.now())
         self.message_user(request, f'{queryset.count()} notifications marquées comme lues.')
     mark_as_read.short_description = 'Marquer comme lues'
     
     def mark_as_unread(self, request, queryset):
         """Action pour marquer comme non lues"""
-        queryset.update(is_read=False, read_at=None)
+        queryset.update(is_read=False, read_at=None, updated_at=timezone.now())
         self.message_user(request, f'{queryset.count()} notifications marquées comme non lues.')
     mark_as_unread.short_description = 'Marquer comme non lues'
 
@@ -292,6 +332,104 @@ class UserStatisticsAdmin(admin.ModelAdmin):
     
     readonly_fields = ('join_date', 'last_activity')
 
+# ===== ADMINISTRATION RAPPELS =====
+
+@admin.register(ScheduledReminder)
+class ScheduledReminderAdmin(admin.ModelAdmin):
+    """Administration des rappels planifiés (créés par run_reminders)"""
+    list_display = ('kind', 'object_id', 'user', 'lead_hours', 'due_at', 'status', 'sent_at')
+    list_filter = ('kind', 'status', 'lead_hours')
+    search_fields = ('user__username',)
+    raw_id_fields = ('user',)
+    readonly_fields = ('created_at', 'sent_at')
+    ordering = ('-due_at',)
+
+# ===== ADMINISTRATION TÂCHES DE FOND =====
+
+@admin.register(BackgroundTask)
+class BackgroundTaskAdmin(admin.ModelAdmin):
+    """Administration des tâches de fond (exécutées par run_tasks)"""
+    list_display = ('name', 'status', 'attempts', 'max_attempts', 'run_at', 'locked_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'last_error')
+    readonly_fields = ('created_at', 'finished_at', 'locked_by', 'locked_until', 'last_error')
+    ordering = ('-created_at',)
+    actions = ['retry_tasks']
+    
+    def retry_tasks(self, request, queryset):
+        """Action pour relancer les tâches échouées"""
+        from django.utils import timezone
+        retried = queryset.filter(status='failed').update(
+            status='queued', attempts=0, run_at=timezone.now(), finished_at=None,
+        )
+        self.message_user(request, f'{retried} tâches remises en file.')
+    retry_tasks.short_description = 'Relancer les tâches échouées'
+
+# ===== ADMINISTRATION MEDIA =====
+
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    """Administration des fichiers media dédupliqués"""
+    list_display = ('name', 'size', 'ref_count', 'created_at', 'updated_at')
+    list_filter = ('created_at',)
+    search_fields = ('name',)
+    ordering = ('ref_count', '-updated_at')
+    readonly_fields = ('name', 'size', 'ref_count', 'created_at', 'updated_at')
+
+# ===== ADMINISTRATION TOKENS =====
+
+@admin.register(AuthToken)
+class AuthTokenAdmin(admin.ModelAdmin):
+    """Administration des tokens d'authentification"""
+    list_display = ('user', 'device', 'created_at', 'last_used_at', 'expires_at', 'revoked_at')
+    list_filter = ('created_at', 'expires_at', 'revoked_at')
+    search_fields = ('user__username', 'user__email', 'device')
+    ordering = ('-created_at',)
+    readonly_fields = ('key', 'created_at', 'last_used_at')
+    
+    actions = ['revoke_tokens']
+    
+    def revoke_tokens(self, request, queryset):
+        """Action pour révoquer les tokens"""
+        from .authentication import revoke_token
+        tokens = list(queryset.filter(revoked_at__isnull=True))
+        for token in tokens:
+            revoke_token(token)
+        self.message_user(request, f'{len(tokens)} tokens révoqués.')
+    revoke_tokens.short_description = 'Révoquer les tokens sélectionnés'
+
+# ===== ADMINISTRATION REQUÊTES LENTES =====
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    """Requêtes SQL lentes agrégées par empreinte (alimentées par SlowQueryLogMiddleware)"""
+    list_display = ('sql_preview', 'view_name', 'origin', 'calls', 'avg_ms_display', 'max_ms', 'total_ms', 'last_seen')
+    list_filter = ('view_name', 'database', 'last_seen')
+    search_fields = ('normalized_sql', 'view_name', 'origin')
+    ordering = ('-total_ms',)
+    readonly_fields = ('fingerprint', 'normalized_sql', 'sample_sql', 'param_shapes', 'view_name', 'origin',
+                       'database', 'calls', 'total_ms', 'max_ms', 'last_ms', 'explain_display',
+                       'explain_analyzed', 'explained_at', 'first_seen', 'last_seen')
+    exclude = ('explain',)
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def sql_preview(self, obj):
+        """Aperçu du SQL normalisé"""
+        if len(obj.normalized_sql) > 80:
+            return obj.normalized_sql[:80] + '...'
+        return obj.normalized_sql
+    sql_preview.short_description = 'SQL normalisé'
+    
+    def avg_ms_display(self, obj):
+        return round(obj.avg_ms, 1)
+    avg_ms_display.short_description = 'Moyenne (ms)'
+    
+    def explain_display(self, obj):
+        return format_html('<pre>{}</pre>', obj.explain or '(pas encore de plan)')
+    explain_display.short_description = 'EXPLAIN'
+
 # Enregistrer le modèle User personnalisé
 admin.site.register(User, UserAdmin)
 
@@ -0,0 +1,209 @@
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from itertools import repeat
+
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Q, Exists, OuterRef
+from django.utils import timezone
+
+from .models import User, Contact, Message, TutorialVideo, Review, Activity, ActivityRegistration, Notification, UserStatistics
+from .serializers import (
+    ActivitySerializer, ContactSerializer, MessageSerializer, NotificationSerializer, UserStatisticsSerializer,
+)
+
+# ===== ENDPOINTS AGRÉGÉS (ACCUEIL, TABLEAU DE BORD) =====
+#
+# Chaque endpoint est découpé en sections indépendantes (une ou deux requêtes
+# SQL et leur sérialisation). load_sections() les lance en même temps sur un
+# pool de AGGREGATE_SECTION_WORKERS threads par processus : la latence est
+# celle de la section la plus lente, pas leur somme.
+#
+# Chaque section en cours tient sa propre connexion : une requête HTTP peut
+# ouvrir jusqu'à AGGREGATE_SECTION_WORKERS connexions en plus de celle de son
+# thread, et un worker gunicorn jusqu'à (threads + AGGREGATE_SECTION_WORKERS).
+# La connexion est fermée (rendue au pool en DB_POOL_MODE=psycopg) à la fin de
+# la section : les threads du pool ne gardent aucune connexion ouverte.
+#
+# Les sections ne font que lire ; une écriture (user_stats) reste sur le thread
+# de la requête. Elles tournent dans une copie du contexte de la requête
+# (routage vers les réplicas, request_id des logs) et avec ses compteurs de
+# requêtes (métriques, N+1, requêtes lentes), installés sur leurs connexions.
+#
+# Dans une transaction (tests compris), les autres connexions ne verraient pas
+# ses écritures : les sections sont alors exécutées l'une après l'autre.
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def section_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.AGGREGATE_SECTION_WORKERS, thread_name_prefix='aggregate-section',
+            )
+    return _executor
+
+
+def _load_section(loader, wrappers):
+    try:
+        with ExitStack() as stack:
+            for alias, alias_wrappers in wrappers.items():
+                for wrapper in alias_wrappers:
+                    stack.enter_context(connections[alias].execute_wrapper(wrapper))
+            return loader()
+    finally:
+        # Connexions de ce thread seulement
+        connections.close_all()
+
+
+def _run_section(context, loader, wrappers):
+    """Exécuter une section dans le contexte de la requête HTTP, avec ses compteurs"""
+    return context.run(_load_section, loader, wrappers)
+
+
+def load_sections(sections):
+    """{nom: chargeur} -> {nom: données}, chargeurs exécutés en parallèle"""
+    if settings.AGGREGATE_SECTION_WORKERS <= 0 or connection.in_atomic_block:
+        return {name: loader() for name, loader in sections.items()}
+    wrappers = {alias: list(connections[alias].execute_wrappers) for alias in connections}
+    # Un contexte ne peut être actif que dans un thread à la fois : une copie par section
+    contexts = [contextvars.copy_context() for _ in sections]
+    results = section_executor().map(_run_section, contexts, sections.values(), repeat(wrappers))
+    return dict(zip(sections, results))
+
+
+# ===== ACCUEIL =====
+
+def suggested_users(user):
+    """Utilisateurs pas encore ajoutés (ni demande envoyée ou reçue), par ordre d'inscription"""
+    return User.objects.exclude(
+        Q(id=user.id) |
+        Q(id__in=Contact.objects.filter(user=user).values('contact_id')) |
+        Q(id__in=Contact.objects.filter(contact=user).values('user_id'))
+    ).select_related('profile').order_by('id')[:10]
+
+
+def suggested_contacts(user):
+    """Nouveaux contacts suggérés (utilisateurs pas encore ajoutés)"""
+    return [
+        {
+            'id': suggested.id,
+            'username': suggested.username,
+            'first_name': suggested.first_name,
+            'last_name': suggested.last_name,
+            'profile_picture': suggested.profile.profile_picture.url if suggested.profile.profile_picture else None,
+            'location': suggested.profile.location,
+            'interests': suggested.profile.interests,
+        }
+        for suggested in suggested_users(user)
+    ]
+
+
+def active_videos():
+    return TutorialVideo.objects.filter(is_active=True)[:5]
+
+
+def tutorial_videos():
+    return [
+        {
+            'id': video.id,
+            'title': video.title,
+            'description': video.description,
+            'video_url': video.video_url,
+            'thumbnail': video.thumbnail.url if video.thumbnail else None,
+        }
+        for video in active_videos()
+    ]
+
+
+def latest_reviews():
+    return Review.objects.filter(is_approved=True).select_related('user')[:5]
+
+
+def approved_reviews():
+    return [
+        {
+            'id': review.id,
+            'user': {
+                'username': review.user.username,
+                'first_name': review.user.first_name,
+                'last_name': review.user.last_name,
+            },
+            'rating': review.rating,
+            'comment': review.comment,
+            'created_at': review.created_at,
+        }
+        for review in latest_reviews()
+    ]
+
+
+def home_sections(user):
+    return {
+        'suggested_contacts': lambda: suggested_contacts(user),
+        'tutorial_videos': tutorial_videos,
+        'reviews': approved_reviews,
+    }
+
+
+def home_validators(validators, user):
+    """Version de l'accueil : un agrégat par section, sur les éléments affichés"""
+    validators.aggregate(suggested_users(user), timestamps=('updated_at', 'profile__updated_at'))
+    validators.aggregate(active_videos())
+    validators.aggregate(latest_reviews(), timestamps=('updated_at', 'user__updated_at'))
+
+
+# ===== TABLEAU DE BORD =====
+
+def user_stats(user):
+    # Statistiques utilisateur (créer si n'existe pas)
+    stats, created = UserStatistics.objects.get_or_create(user=user)
+    stats.user = user  # Éviter de recharger l'utilisateur pour le serializer
+    return UserStatisticsSerializer(stats).data
+
+
+def upcoming_activities(user, request):
+    activities = Activity.objects.with_participation(user).filter(
+        Exists(ActivityRegistration.objects.filter(
+            activity=OuterRef('pk'), user=user, status='confirmed'
+        )),
+        date__gte=timezone.now(),
+        is_active=True
+    )[:5]
+    return ActivitySerializer(activities, many=True, context={'request': request}).data
+
+
+def recent_messages(user):
+    messages = Message.objects.filter(
+        Q(sender=user) | Q(receiver=user)
+    ).select_related('sender', 'receiver').order_by('-created_at')[:10]
+    return MessageSerializer(messages, many=True).data
+
+
+def pending_requests(user):
+    requests = Contact.objects.filter(
+        contact=user,
+        status='pending'
+    ).select_related('user', 'contact')[:5]
+    return ContactSerializer(requests, many=True).data
+
+
+def recent_notifications(user):
+    notifications = Notification.objects.filter(user=user).select_related('user')[:10]
+    return NotificationSerializer(notifications, many=True).data
+
+
+def dashboard_sections(user, request):
+    """Sections en lecture seule : user_stats (get_or_create) est appelé par la vue"""
+    return {
+        'upcoming_activities': lambda: upcoming_activities(user, request),
+        'recent_messages': lambda: recent_messages(user),
+        'pending_requests': lambda: pending_requests(user),
+        'recent_notifications': lambda: recent_notifications(user),
+        'unread_messages_count': lambda: Message.objects.filter(receiver=user, is_read=False).count(),
+        'unread_notifications_count': lambda: Notification.objects.filter(user=user, is_read=False).count(),
+    }
@@ -0,0 +1,226 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from . import db_routing
+from .models import AuthToken
+
+# ===== CACHE DES TOKENS =====
+
+class TokenCache:
+    """
+    Cache LRU borné avec expiration (TTL) pour les recherches token -> utilisateur.
+    Le cache est local au processus : les révocations faites par un autre worker
+    sont vues via l'index de révocation (RevocationIndex).
+    """
+
+    def __init__(self, max_entries=10000, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, user, token)
+        self._keys_by_user = {}        # user_id -> {key, ...}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def set(self, key, user, token):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, user, token)
+            self._keys_by_user.setdefault(user.pk, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        _, user, _ = self._entries.pop(key)
+        keys = self._keys_by_user.get(user.pk)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user.pk]
+
+
+token_cache = TokenCache(
+    max_entries=getattr(settings, 'AUTH_TOKEN_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 60),
+)
+
+
+# ===== INDEX DE RÉVOCATION =====
+
+class RevocationIndex:
+    """
+    Ensemble en mémoire des tokens révoqués et pas encore expirés.
+    Il est resynchronisé au plus toutes les `sync_interval` secondes par une
+    requête indexée sur revoked_at ; entre deux synchronisations, la
+    vérification ne coûte qu'un test d'appartenance.
+    """
+
+    def __init__(self, sync_interval=5):
+        self.sync_interval = sync_interval
+        self._revoked = {}  # key -> expires_at
+        self._synced_at = timezone.now()
+        self._next_sync = time.monotonic() + sync_interval
+        self._lock = threading.Lock()
+
+    def add(self, key, expires_at):
+        with self._lock:
+            self._revoked[key] = expires_at
+
+    def __contains__(self, key):
+        if time.monotonic() >= self._next_sync:
+            self.sync()
+        return key in self._revoked
+
+    def sync(self):
+        now = timezone.now()
+        # Marge pour les révocations dont la transaction s'est terminée après le dernier passage
+        since = self._synced_at - timedelta(seconds=self.sync_interval)
+        revoked = AuthToken.objects.filter(revoked_at__gte=since).values_list('key', 'expires_at')
+        with self._lock:
+            self._revoked.update(revoked)
+            # Un token expiré est de toute façon refusé : inutile de le garder
+            self._revoked = {key: exp for key, exp in self._revoked.items() if exp > now}
+            self._synced_at = now
+            self._next_sync = time.monotonic() + self.sync_interval
+
+    def clear(self):
+        with self._lock:
+            self._revoked.clear()
+
+    def __len__(self):
+        return len(self._revoked)
+
+
+revocation_index = RevocationIndex(
+    sync_interval=getattr(settings, 'AUTH_TOKEN_REVOCATION_SYNC', 5),
+)
+
+# ===== CYCLE DE VIE DES TOKENS =====
+
+def token_lifetime():
+    return timedelta(seconds=settings.AUTH_TOKEN_TTL)
+
+
+def issue_token(user, device=''):
+    """Créer un token pour un nouvel appareil (les plus anciens au-delà du quota sont révoqués)"""
+    # Connexion ou inscription : les requêtes suivantes du membre lisent ses écritures
+    db_routing.bind_user(user.id)
+    token = AuthToken.objects.create(
+        user=user,
+        device=(device or '')[:100],
+        expires_at=timezone.now() + token_lifetime(),
+    )
+    stale = AuthToken.objects.filter(
+        user=user, revoked_at__isnull=True, expires_at__gt=timezone.now()
+    ).order_by('-created_at')[settings.AUTH_TOKEN_MAX_PER_USER:]
+    for old_token in stale:
+        revoke_token(old_token)
+    return token
+
+
+def revoke_token(token):
+    """Révoquer un token : il reste en base jusqu'à la purge pour informer les autres workers"""
+    token.revoked_at = timezone.now()
+    token.save(update_fields=['revoked_at'])
+    revocation_index.add(token.key, token.expires_at)
+    token_cache.invalidate(token.key)
+
+
+def _detached_copy(instance):
+    """Copie d'une instance sans son cache de relations (profile, auth_token...)"""
+    clone = copy.copy(instance)
+    clone._state = copy.copy(instance._state)
+    clone._state.fields_cache = {}
+    return clone
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Authentification par AuthToken avec un cache mémoire : un token déjà vu ne
+    coûte aucune requête SQL tant qu'il est dans le cache. L'expiration est
+    glissante : le token est prolongé (une écriture) une fois dépassée la moitié
+    de sa durée de vie.
+    """
+    model = AuthToken
+
+    def authenticate_credentials(self, key):
+        if key in revocation_index:
+            token_cache.invalidate(key)
+            raise exceptions.AuthenticationFailed('Token révoqué.')
+
+        cached = token_cache.get(key)
+        if cached is None:
+            try:
+                token = AuthToken.objects.select_related('user').get(key=key, revoked_at__isnull=True)
+            except AuthToken.DoesNotExist:
+                raise exceptions.AuthenticationFailed('Token invalide.')
+            if not token.user.is_active:
+                raise exceptions.AuthenticationFailed('Utilisateur inactif ou supprimé.')
+            token_cache.set(key, token.user, token)
+            cached = (token.user, token)
+
+        cached_token = cached[1]
+        now = timezone.now()
+        if cached_token.expires_at <= now:
+            token_cache.invalidate(key)
+            raise exceptions.AuthenticationFailed('Token expiré.')
+        self.renew_if_needed(cached_token, now)
+
+        db_routing.bind_user(cached[0].id)
+
+        # Chaque requête reçoit sa propre copie : les vues modifient request.user
+        user = _detached_copy(cached[0])
+        token = _detached_copy(cached_token)
+        token._state.fields_cache['user'] = user
+        return user, token
+
+    def renew_if_needed(self, token, now):
+        """Prolonger le token s'il a consommé plus de la moitié de sa durée de vie"""
+        lifetime = token_lifetime()
+        if token.expires_at - now > lifetime / 2:
+            return
+        token.expires_at = now + lifetime
+        token.last_used_at = now
+        AuthToken.objects.filter(pk=token.pk, revoked_at__isnull=True).update(
+            expires_at=token.expires_at, last_used_at=now
+        )
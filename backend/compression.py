@@ -0,0 +1,187 @@
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from .metrics import counter, histogram
+
+try:
+    import brotli
+except ImportError:  # paquet optionnel : gzip seulement
+    brotli = None
+
+# ===== COMPRESSION DES RÉPONSES DE L'API =====
+#
+# CompressionMiddleware (config/middleware.py) compresse les réponses des
+# chemins COMPRESSION_PATHS selon l'en-tête Accept-Encoding du client :
+# Brotli si le paquet `brotli` est installé, sinon gzip. Le niveau dépend du
+# type de contenu (COMPRESSION_LEVELS) ; les types absents (images...) ne sont
+# pas compressés, ni les corps de moins de COMPRESSION_MIN_SIZE octets.
+#
+# Une réponse ordinaire est compressée en une passe sur le corps déjà rendu
+# (pas de copie intermédiaire) ; une réponse en flux l'est morceau par
+# morceau, sans jamais accumuler le corps entier ; chaque morceau est vidé
+# (Z_SYNC_FLUSH, flush Brotli) pour parvenir au client dès qu'il est produit.
+
+compression_bytes = counter(
+    'age2meet_http_compression_bytes_total', "Octets des réponses compressées, avant et après compression",
+    ('encoding', 'body'),
+)
+compression_ratio = histogram(
+    'age2meet_http_compression_ratio', "Taille compressée / taille d'origine, par encodage et type de contenu",
+    ('encoding', 'content_type'), buckets=(0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.7, 0.9, 1.0),
+)
+uncompressed_responses = counter(
+    'age2meet_http_uncompressed_responses_total', "Réponses envoyées sans compression, par raison", ('reason',),
+)
+
+
+def available_encodings():
+    """Encodages proposés, par ordre de préférence"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def parse_accept_encoding(header):
+    """{encodage: q} d'un en-tête Accept-Encoding"""
+    accepted = {}
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+def negotiate(header, encodings=None):
+    """Meilleur encodage accepté par le client parmi encodings, ou None"""
+    accepted = parse_accept_encoding(header or '')
+    best, best_quality = None, 0.0
+    for encoding in encodings or available_encodings():
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        # À qualité égale, l'ordre de préférence l'emporte
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def media_type(response):
+    return response.get('Content-Type', '').split(';')[0].strip().lower()
+
+
+def levels_for(content_type):
+    """{encodage: niveau} du type de contenu (ou de sa famille 'text/'), None s'il n'est pas compressible"""
+    levels = settings.COMPRESSION_LEVELS
+    if content_type in levels:
+        return levels[content_type]
+    return levels.get(content_type.partition('/')[0] + '/')
+
+
+class Encoder:
+    """Compresseur incrémental gzip ou Brotli"""
+
+    def __init__(self, encoding, level):
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=level)
+            self.compress = self._compressor.process
+            self.flush = self._compressor.flush
+            self.finish = self._compressor.finish
+        else:
+            # wbits=31 : en-tête et somme de contrôle gzip
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+            self.compress = self._compressor.compress
+            self.flush = lambda: self._compressor.flush(zlib.Z_SYNC_FLUSH)
+            self.finish = self._compressor.flush
+
+
+def compress(data, encoding, level):
+    encoder = Encoder(encoding, level)
+    return encoder.compress(data) + encoder.finish()
+
+
+def record(encoding, content_type, original, compressed):
+    compression_bytes.inc(original, encoding=encoding, body='original')
+    compression_bytes.inc(compressed, encoding=encoding, body='compressed')
+    if original:
+        compression_ratio.observe(compressed / original, encoding=encoding, content_type=content_type)
+
+
+def compress_stream(chunks, encoding, level, content_type):
+    encoder = Encoder(encoding, level)
+    original = compressed = 0
+    for chunk in chunks:
+        original += len(chunk)
+        output = encoder.compress(chunk) + encoder.flush()
+        compressed += len(output)
+        yield output
+    output = encoder.finish()
+    compressed += len(output)
+    yield output
+    record(encoding, content_type, original, compressed)
+
+
+async def acompress_stream(chunks, encoding, level, content_type):
+    encoder = Encoder(encoding, level)
+    original = compressed = 0
+    async for chunk in chunks:
+        original += len(chunk)
+        output = encoder.compress(chunk) + encoder.flush()
+        compressed += len(output)
+        yield output
+    output = encoder.finish()
+    compressed += len(output)
+    yield output
+    record(encoding, content_type, original, compressed)
+
+
+def compress_response(request, response):
+    """Compresser la réponse si le client l'accepte et si elle en vaut la peine ; renvoie l'encodage ou None"""
+    if response.has_header('Content-Encoding') or response.status_code in (204, 206, 304):
+        return None
+    if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+        uncompressed_responses.inc(reason='too_small')
+        return None
+    content_type = media_type(response)
+    levels = levels_for(content_type)
+    if not levels:
+        uncompressed_responses.inc(reason='content_type')
+        return None
+
+    # La réponse dépend désormais d'Accept-Encoding, même pour un client qui ne compresse pas
+    patch_vary_headers(response, ('Accept-Encoding',))
+    encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''), [
+        encoding for encoding in available_encodings() if encoding in levels
+    ])
+    if encoding is None:
+        uncompressed_responses.inc(reason='not_accepted')
+        return None
+    level = levels[encoding]
+
+    if response.streaming:
+        stream = acompress_stream if response.is_async else compress_stream
+        response.streaming_content = stream(response.streaming_content, encoding, level, content_type)
+        del response.headers['Content-Length']
+    else:
+        original = response.content
+        compressed = compress(original, encoding, level)
+        if len(compressed) >= len(original):
+            uncompressed_responses.inc(reason='incompressible')
+            return None
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        record(encoding, content_type, len(original), len(compressed))
+
+    # Mêmes données, autres octets : l'ETag ne peut plus être fort
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = 'W/' + etag
+    response['Content-Encoding'] = encoding
+    return encoding
@@ -0,0 +1,84 @@
+import hashlib
+
+from django.db.models import Count, Max, Sum
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .metrics import counter
+
+# ===== GET CONDITIONNELS (ETag / Last-Modified) =====
+#
+# Les listes (activités, événements, contacts, notifications, accueil) sont
+# relues à chaque écran. Leur version est calculée AVANT la sérialisation par
+# quelques agrégats sur les mêmes querysets que la réponse : COUNT et somme des
+# identifiants (un élément entre ou sort de la liste), MAX(updated_at) (un
+# élément est modifié). Si le client envoie If-None-Match avec cette version,
+# la vue répond 304 sans construire la réponse.
+#
+# L'ETag dépend aussi du membre et des paramètres de la requête. Seul
+# If-None-Match donne un 304 : une suppression ne fait pas reculer
+# MAX(updated_at), If-Modified-Since seul pourrait renvoyer une liste périmée ;
+# Last-Modified reste envoyé à titre indicatif.
+# Réponses propres à chaque membre : Cache-Control private, no-cache (le client
+# garde la réponse mais la revalide) et Vary: Authorization pour les caches
+# partagés, y compris pour les blocs publics (vidéos, avis) de l'accueil.
+
+conditional_responses = counter(
+    'age2meet_conditional_get_total', "GET conditionnels des listes, par endpoint et par issue",
+    ('endpoint', 'outcome'),
+)
+
+
+class Validators:
+    """Version d'une réponse de liste : ETag et Last-Modified, calculés à partir d'agrégats"""
+
+    def __init__(self, request, endpoint):
+        self.request = request
+        self.endpoint = endpoint
+        self.parts = [endpoint, request.user.id, sorted(request.GET.lists())]
+        self.last_modified = None
+
+    def add(self, *values):
+        """Valeurs dont dépend la réponse"""
+        self.parts.extend(values)
+
+    def modified(self, *timestamps):
+        for timestamp in timestamps:
+            if timestamp is not None and (self.last_modified is None or timestamp > self.last_modified):
+                self.last_modified = timestamp
+
+    def aggregate(self, queryset, timestamps=('updated_at',), **aggregates):
+        """COUNT, somme des identifiants, MAX de chaque horodatage et agrégats supplémentaires, en une requête"""
+        values = queryset.aggregate(
+            _count=Count('pk', distinct=True),
+            _ids=Sum('pk', distinct=True),
+            **{f'_max_{field}': Max(field) for field in timestamps},
+            **aggregates,
+        )
+        self.modified(*(values[f'_max_{field}'] for field in timestamps))
+        self.add(*values.values())
+        return values
+
+    @property
+    def etag(self):
+        digest = hashlib.blake2b(repr(self.parts).encode(), digest_size=16).hexdigest()
+        # Faible : même contenu, pas forcément les mêmes octets (compression)
+        return f'W/"{digest}"'
+
+    def not_modified(self):
+        """Réponse 304 si le client a déjà cette version, sinon None"""
+        response = get_conditional_response(self.request, etag=self.etag)
+        if response is None:
+            conditional_responses.inc(endpoint=self.endpoint, outcome='full')
+            return None
+        conditional_responses.inc(endpoint=self.endpoint, outcome='not_modified')
+        return self.apply(response)
+
+    def apply(self, response):
+        """En-têtes de validation et de cache de la réponse"""
+        response['ETag'] = self.etag
+        if self.last_modified is not None:
+            response['Last-Modified'] = http_date(self.last_modified.timestamp())
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Authorization',))
+        return response
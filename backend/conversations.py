@@ -0,0 +1,104 @@
+from django.db import transaction
+from django.db.models import F
+
+from .models import Conversation, ConversationMember, GroupMessage, ActivityRegistration
+
+# ===== CONVERSATIONS DE GROUPE (FAN-OUT À L'ÉCRITURE) =====
+#
+# Un message de groupe est écrit une seule fois (GroupMessage). La distribution
+# se fait par les lignes ConversationMember de chaque membre : un compteur de
+# non-lus et un pointeur vers le dernier message lu. Poster coûte donc un
+# INSERT et deux UPDATE (compteurs des membres, dernier message du fil), quel
+# que soit le nombre de membres ; la liste des conversations d'un membre se
+# lit dans sa seule table de boîte de réception.
+
+
+def create_group(creator, title, member_ids):
+    """Créer un fil de groupe avec son créateur et les membres donnés (amis vérifiés par l'appelant)"""
+    with transaction.atomic():
+        conversation = Conversation.objects.create(kind='group', title=title, created_by=creator)
+        ConversationMember.objects.bulk_create([
+            ConversationMember(conversation=conversation, user_id=user_id)
+            for user_id in dict.fromkeys([creator.id, *member_ids])
+        ])
+    return conversation
+
+
+def activity_conversation(activity):
+    """
+    Fil de l'activité (créé au premier accès) avec l'organisateur et les inscrits
+    confirmés. Ensuite, les inscriptions et annulations tiennent les membres à
+    jour (signaux sur ActivityRegistration).
+    """
+    conversation = Conversation.objects.filter(activity=activity).first()
+    if conversation is not None:
+        return conversation
+    with transaction.atomic():
+        conversation, created = Conversation.objects.get_or_create(
+            activity=activity,
+            defaults={'kind': 'activity', 'title': activity.title, 'created_by_id': activity.organizer_id},
+        )
+        if created:
+            participant_ids = ActivityRegistration.objects.filter(
+                activity=activity, status='confirmed',
+            ).values_list('user_id', flat=True)
+            ConversationMember.objects.bulk_create([
+                ConversationMember(conversation=conversation, user_id=user_id)
+                for user_id in dict.fromkeys([activity.organizer_id, *participant_ids])
+            ], ignore_conflicts=True)
+    return conversation
+
+
+def sync_activity_member(registration):
+    """Ajouter ou retirer l'inscrit du fil de l'activité, s'il existe déjà"""
+    if registration.status == 'confirmed':
+        conversation_id = Conversation.objects.filter(
+            activity_id=registration.activity_id,
+        ).values_list('id', flat=True).first()
+        if conversation_id is not None:
+            ConversationMember.objects.bulk_create([
+                ConversationMember(conversation_id=conversation_id, user_id=registration.user_id),
+            ], ignore_conflicts=True)
+    else:
+        remove_activity_member(registration)
+
+
+def remove_activity_member(registration):
+    # L'organisateur reste membre même s'il s'inscrit puis se désinscrit
+    ConversationMember.objects.filter(
+        conversation__activity_id=registration.activity_id, user_id=registration.user_id,
+    ).exclude(conversation__activity__organizer_id=registration.user_id).delete()
+
+
+def post_message(conversation, sender, content):
+    """Écrire le message une fois puis incrémenter les non-lus des autres membres en une requête"""
+    with transaction.atomic():
+        message = GroupMessage.objects.create(conversation=conversation, sender=sender, content=content)
+        ConversationMember.objects.filter(conversation=conversation).exclude(user=sender).update(
+            unread_count=F('unread_count') + 1,
+        )
+        Conversation.objects.filter(id=conversation.id).update(
+            last_message=message, last_message_at=message.created_at,
+        )
+    return message
+
+
+def mark_read(member, message_id):
+    """Avancer le pointeur de lecture du membre et remettre ses non-lus à zéro"""
+    if member.unread_count == 0 and member.last_read_message_id == message_id:
+        return
+    ConversationMember.objects.filter(id=member.id).update(
+        unread_count=0, last_read_message_id=message_id,
+    )
+    member.unread_count = 0
+    member.last_read_message_id = message_id
+
+
+def page(conversation, before=None, limit=50):
+    """Messages du plus récent au plus ancien, avant l'id `before` : (messages, curseur suivant)"""
+    messages = GroupMessage.objects.filter(conversation=conversation).select_related('sender')
+    if before is not None:
+        messages = messages.filter(id__lt=before)
+    messages = list(messages.order_by('-id')[:limit + 1])
+    next_before = messages[limit - 1].id if len(messages) > limit else None
+    return messages[:limit], next_before
@@ -0,0 +1,67 @@
+from django.db import connections
+
+from .metrics import counter, gauge
+
+# ===== CONNEXIONS À LA BASE (DB_POOL_MODE) =====
+#
+# Réglages dans config/settings.py, appliqués à 'default' et aux réplicas :
+#   persistent  une connexion par thread gardée DB_CONN_MAX_AGE secondes,
+#               vérifiée avant d'être réutilisée (CONN_HEALTH_CHECKS)
+#   psycopg     pool psycopg 3 par processus (OPTIONS['pool'] de Django),
+#               DB_POOL_MIN_SIZE à DB_POOL_MAX_SIZE connexions
+#   external    derrière un pooler en mode transaction (PgBouncer) : pas de
+#               curseurs côté serveur ni de requêtes préparées
+# Métriques : connexions ouvertes par le processus (dans tous les modes, une
+# reconnexion à froid se voit ici), et état des pools psycopg au moment du scrape.
+
+connections_opened = counter(
+    'age2meet_db_connections_opened_total',
+    "Connexions ouvertes (ou empruntées au pool psycopg) par le processus", ('database',),
+)
+
+
+def pools():
+    """(alias, pool psycopg) des pools déjà créés par ce processus"""
+    for alias in connections:
+        connection = connections[alias]
+        pool = getattr(type(connection), '_connection_pools', {}).get(alias)
+        if pool is not None:
+            yield alias, pool
+
+
+def collect_pool_connections():
+    for alias, pool in pools():
+        stats = pool.get_stats()
+        yield {'database': alias, 'state': 'open'}, stats.get('pool_size', 0)
+        yield {'database': alias, 'state': 'idle'}, stats.get('pool_available', 0)
+        yield {'database': alias, 'state': 'max'}, stats.get('pool_max', 0)
+
+
+def collect_pool_waiting():
+    for alias, pool in pools():
+        yield {'database': alias}, pool.get_stats().get('requests_waiting', 0)
+
+
+def collect_pool_totals():
+    # Cumuls depuis l'ouverture du pool (get_stats ne les remet pas à zéro)
+    for alias, pool in pools():
+        stats = pool.get_stats()
+        for key in ('requests_num', 'requests_queued', 'requests_errors', 'connections_num',
+                    'connections_errors', 'connections_lost', 'returns_bad'):
+            yield {'database': alias, 'stat': key}, stats.get(key, 0)
+        yield {'database': alias, 'stat': 'requests_wait_seconds'}, stats.get('requests_wait_ms', 0) / 1000
+
+
+gauge(
+    'age2meet_db_pool_connections', "Connexions des pools psycopg : ouvertes, libres, maximum",
+    ('database', 'state'), collect_pool_connections,
+)
+gauge(
+    'age2meet_db_pool_requests_waiting', "Demandes en attente d'une connexion libre du pool",
+    ('database',), collect_pool_waiting,
+)
+gauge(
+    'age2meet_db_pool_stats', "Cumuls des pools psycopg depuis leur ouverture (demandes, attentes, erreurs)",
+    ('database', 'stat'), collect_pool_totals,
+)
+
@@ -0,0 +1,236 @@
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+
+from .metrics import counter, histogram
+
+# ===== RÉPLICAS EN LECTURE =====
+#
+# Avec DATABASE_REPLICA_URLS, ReplicaRouter envoie les lectures des requêtes
+# HTTP en GET/HEAD vers un réplica sain, choisi au hasard. Restent sur la base
+# principale ('default') :
+#   - les requêtes POST/PUT/PATCH/DELETE en entier (vérifier puis écrire) ;
+#   - une requête dès qu'elle a écrit (instruction INSERT, UPDATE,
+#     DELETE... vue passer sur la base principale : un get_or_create qui
+#     trouve sa ligne n'écrit rien), et ses lectures en transaction ;
+#   - pendant REPLICA_STICKY_SECONDS après une écriture, toutes les requêtes
+#     du même membre (lire ses propres écritures : le message qu'il vient
+#     d'envoyer) ; le marqueur est dans CACHES, partagé entre workers s'il
+#     s'agit d'un cache partagé ;
+#   - les tables lues juste après leur écriture par une autre requête
+#     (tokens) ou par les workers ;
+#   - tout ce qui tourne hors requête HTTP (commandes, workers).
+# Le retard de chaque réplica est mesuré toutes les REPLICA_HEALTH_INTERVAL
+# secondes ; au-delà de REPLICA_MAX_LAG_SECONDS (ou injoignable), il est écarté.
+
+logger = logging.getLogger(__name__)
+
+db_reads = counter(
+    'age2meet_db_reads_total', "Lectures routées, par base et par raison", ('database', 'reason'),
+)
+replica_lag = histogram(
+    'age2meet_db_replica_lag_seconds', "Retard de réplication mesuré", ('database',),
+    buckets=(0.01, 0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0),
+)
+
+PRIMARY = 'default'
+
+# Tables toujours lues sur la base principale
+PRIMARY_ONLY_MODELS = {
+    'backend.AuthToken',  # un token vient d'être émis par /login/ ou /register/
+    'backend.BackgroundTask',
+    'backend.ScheduledReminder',
+    'backend.SlowQuery',
+}
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Premier mot des instructions qui modifient la base (SAVEPOINT, RELEASE... n'en sont pas)
+WRITE_STATEMENTS = frozenset(('INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'MERGE', 'TRUNCATE', 'CREATE', 'ALTER', 'DROP'))
+
+
+class RoutingState:
+    """Décision de routage d'une requête HTTP"""
+    __slots__ = ('primary', 'wrote', 'user_id')
+
+    def __init__(self, primary=None):
+        self.primary = primary  # raison de tout lire sur la base principale, ou None
+        self.wrote = False
+        self.user_id = None
+
+
+_state = ContextVar('db_routing_state', default=None)
+
+
+def is_write(sql):
+    words = sql.lstrip('( \n\t').split(None, 1)
+    return bool(words) and words[0].upper() in WRITE_STATEMENTS
+
+
+class WriteTracker:
+    """execute_wrapper de la base principale : marque la requête HTTP dès sa première écriture"""
+
+    def __init__(self, state):
+        self.state = state
+
+    def __call__(self, execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        if not self.state.wrote and is_write(sql):
+            self.state.wrote = True
+        return result
+
+
+@contextmanager
+def routing(method='GET'):
+    """Routage d'une requête HTTP : les lectures d'un GET peuvent aller aux réplicas"""
+    state = RoutingState(None if method in SAFE_METHODS else 'write_request')
+    token = _state.set(state)
+    try:
+        # Recopié sur les connexions des sections parallèles (aggregates.load_sections)
+        with connections[PRIMARY].execute_wrapper(WriteTracker(state)):
+            yield state
+    finally:
+        _state.reset(token)
+
+
+def _sticky_key(user_id):
+    return f'db-primary:{user_id}'
+
+
+def bind_user(user_id):
+    """Membre de la requête courante : ses lectures restent sur la base principale s'il vient d'écrire"""
+    state = _state.get()
+    if state is None or not settings.DATABASE_REPLICAS or state.user_id == user_id:
+        return
+    state.user_id = user_id
+    if state.primary is None and cache.get(_sticky_key(user_id)):
+        state.primary = 'sticky'
+
+
+def stick_to_primary(state):
+    """En fin de requête : après une écriture, le membre lit la base principale pendant la fenêtre"""
+    if state.wrote and state.user_id is not None:
+        cache.set(_sticky_key(state.user_id), 1, settings.REPLICA_STICKY_SECONDS)
+
+
+def _in_transaction():
+    # Les transactions ouvertes par TestCase ne comptent pas (même règle que atomic(durable=True))
+    return any(not block._from_testcase for block in connections[PRIMARY].atomic_blocks)
+
+
+def measure_lag(alias):
+    """Retard de réplication en secondes (0 hors PostgreSQL : copie locale, tests)"""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        return 0.0
+    with connection.cursor() as cursor:
+        # Réplica à jour de tout ce qu'il a reçu : pas de retard, même si le
+        # primaire n'a rien écrit depuis longtemps
+        cursor.execute(
+            "SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 "
+            "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+        )
+        return float(cursor.fetchone()[0])
+
+
+class ReplicaHealth:
+    """Retard des réplicas, mesuré au plus toutes les REPLICA_HEALTH_INTERVAL secondes par processus"""
+
+    def __init__(self, measure=measure_lag):
+        self.measure = measure
+        self.lags = {}
+        self.checked_at = None
+        self.lock = threading.Lock()
+
+    def healthy(self, replicas):
+        now = time.monotonic()
+        if self.checked_at is None or now - self.checked_at >= settings.REPLICA_HEALTH_INTERVAL:
+            # Une seule mesure à la fois : les autres threads gardent les dernières valeurs
+            if self.lock.acquire(blocking=False):
+                try:
+                    self.refresh(replicas)
+                    self.checked_at = now
+                finally:
+                    self.lock.release()
+        max_lag = settings.REPLICA_MAX_LAG_SECONDS
+        return [alias for alias in replicas if self.lags.get(alias) is not None and self.lags[alias] <= max_lag]
+
+    def refresh(self, replicas):
+        for alias in replicas:
+            try:
+                lag = self.measure(alias)
+            except DatabaseError:
+                logger.warning('Réplica injoignable', extra={'database': alias}, exc_info=True)
+                self.lags[alias] = None
+                continue
+            replica_lag.observe(lag, database=alias)
+            if lag > settings.REPLICA_MAX_LAG_SECONDS:
+                logger.warning('Réplica en retard, écarté', extra={'database': alias, 'lag': round(lag, 3)})
+            self.lags[alias] = lag
+
+    def reset(self):
+        self.lags = {}
+        self.checked_at = None
+
+
+replica_health = ReplicaHealth()
+
+
+class ReplicaRouter:
+    """Routeur de bases : lectures vers les réplicas, écritures et migrations sur 'default'"""
+
+    def primary_reason(self, model):
+        state = _state.get()
+        if state is None:
+            return 'outside_request'
+        if model._meta.label in PRIMARY_ONLY_MODELS:
+            return 'model'
+        if state.primary:
+            return state.primary
+        if state.wrote:
+            return 'wrote'
+        if _in_transaction():
+            return 'transaction'
+        return None
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas:
+            return None
+        reason = self.primary_reason(model)
+        if reason is None:
+            healthy = replica_health.healthy(replicas)
+            if healthy:
+                alias = random.choice(healthy)
+                db_reads.inc(database=alias, reason='replica')
+                return alias
+            reason = 'no_healthy_replica'
+        db_reads.inc(database=PRIMARY, reason=reason)
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        # Appelé aussi par get_or_create avant sa lecture : l'écriture est constatée par WriteTracker
+        return PRIMARY if settings.DATABASE_REPLICAS else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Mêmes données : un objet lu sur un réplica peut référencer un objet de la base principale
+        pool = {PRIMARY, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Les réplicas reçoivent le schéma par la réplication
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
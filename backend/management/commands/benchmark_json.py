@@ -0,0 +1,120 @@
+import io
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Q
+from django.urls import resolve
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from backend.models import User
+from backend.parsers import ORJSONParser
+from backend.renderers import ORJSONRenderer, orjson
+
+# Endpoints de lecture comparés : le corps est construit une fois, puis rendu
+# (et relu) par les deux implémentations. Seul le coût JSON est mesuré.
+ENDPOINTS = (
+    '/api/activities/',
+    '/api/user/activities/',
+    '/api/events/',
+    '/api/contacts/',
+    '/api/notifications/',
+    '/api/messages/',
+    '/api/conversations/',
+    '/api/home/',
+    '/api/dashboard/',
+)
+
+
+def best_time(func, iterations, repeat):
+    """Meilleure durée moyenne d'un appel (en secondes) sur `repeat` séries"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        elapsed = (time.perf_counter() - started) / iterations
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+class Command(BaseCommand):
+    help = "Comparer le rendu et la lecture JSON de DRF (json) et d'orjson sur les endpoints de lecture"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', help="Membre dont les pages sont rendues (défaut : le plus connecté "
+                                            "parmi les comptes générés)")
+        parser.add_argument('--account-prefix', default='synth42_', help="Préfixe des comptes générés")
+        parser.add_argument('--endpoint', action='append', help="Endpoint à mesurer (répétable ; défaut : tous)")
+        parser.add_argument('--iterations', type=int, default=200, help="Appels par série")
+        parser.add_argument('--repeat', type=int, default=5, help="Séries (la meilleure est gardée)")
+        parser.add_argument('--json', action='store_true', help="Sortie JSON (comparaison avant / après)")
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError("Paquet orjson non installé (pip install orjson)")
+        user = self.get_user(options)
+        results = [
+            self.measure(path, user, options['iterations'], options['repeat'])
+            for path in options['endpoint'] or ENDPOINTS
+        ]
+
+        if options['json']:
+            self.stdout.write(json.dumps({'user': user.email, 'endpoints': results}, indent=2))
+            return
+
+        self.stdout.write(f"Membre {user.email}, meilleure moyenne sur {options['repeat']} séries "
+                          f"de {options['iterations']} appels\n")
+        self.stdout.write(f"{'endpoint':<24} {'taille':>9}  {'rendu json':>10} {'orjson':>8} {'gain':>6}"
+                          f"  {'lecture json':>12} {'orjson':>8} {'gain':>6}")
+        for result in results:
+            self.stdout.write(
+                f"{result['endpoint']:<24} {result['bytes'] / 1024:7.1f} Ko"
+                f"  {result['render_stdlib_ms']:8.3f}ms {result['render_orjson_ms']:6.3f}ms"
+                f" {result['render_speedup']:5.1f}x"
+                f"  {result['parse_stdlib_ms']:10.3f}ms {result['parse_orjson_ms']:6.3f}ms"
+                f" {result['parse_speedup']:5.1f}x"
+            )
+
+    def get_user(self, options):
+        if options['email']:
+            user = User.objects.filter(email=options['email']).first()
+        else:
+            # Le membre le plus connecté : les listes les plus longues
+            user = User.objects.filter(username__startswith=options['account_prefix']).annotate(
+                friends=Count('sent_requests', filter=Q(sent_requests__status='accepted'), distinct=True)
+            ).order_by('-friends', 'id').first()
+        if user is None:
+            raise CommandError("Aucun membre trouvé (python manage.py generate_dataset, ou --email)")
+        return user
+
+    def measure(self, path, user, iterations, repeat):
+        request = APIRequestFactory().get(path)
+        force_authenticate(request, user=user)
+        response = resolve(path).func(request)
+        if response.status_code != 200:
+            raise CommandError(f'{path} -> {response.status_code} : {response.data!r}')
+        data = response.data
+
+        stdlib, fast = JSONRenderer(), ORJSONRenderer()
+        body = stdlib.render(data)
+        fast_body = fast.render(data)
+        if json.loads(body) != json.loads(fast_body):
+            raise CommandError(f'{path} : les deux rendus diffèrent')
+
+        render_stdlib = best_time(lambda: stdlib.render(data), iterations, repeat)
+        render_orjson = best_time(lambda: fast.render(data), iterations, repeat)
+        parse_stdlib = best_time(lambda: JSONParser().parse(io.BytesIO(body)), iterations, repeat)
+        parse_orjson = best_time(lambda: ORJSONParser().parse(io.BytesIO(body)), iterations, repeat)
+        return {
+            'endpoint': path,
+            'bytes': len(body),
+            'render_stdlib_ms': render_stdlib * 1000,
+            'render_orjson_ms': render_orjson * 1000,
+            'render_speedup': render_stdlib / render_orjson,
+            'parse_stdlib_ms': parse_stdlib * 1000,
+            'parse_orjson_ms': parse_orjson * 1000,
+            'parse_speedup': parse_stdlib / parse_orjson,
+        }
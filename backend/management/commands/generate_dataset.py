@@ -0,0 +1,472 @@
+import io
+import itertools
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from backend.models import (
+    User, UserProfile, Contact, Message, Event, Review, TutorialVideo,
+    Activity, ActivityRegistration, Notification, UserStatistics
+)
+
+# ===== PROFILS DE TAILLE =====
+
+SIZE_PROFILES = {
+    'tiny': {
+        'users': 200, 'avg_friends': 6, 'messages': 2_000, 'activities': 50,
+        'events': 100, 'notifications': 1_000,
+    },
+    'small': {
+        'users': 1_000, 'avg_friends': 8, 'messages': 20_000, 'activities': 200,
+        'events': 500, 'notifications': 5_000,
+    },
+    'medium': {
+        'users': 10_000, 'avg_friends': 12, 'messages': 500_000, 'activities': 5_000,
+        'events': 5_000, 'notifications': 50_000,
+    },
+    'large': {
+        'users': 100_000, 'avg_friends': 15, 'messages': 10_000_000, 'activities': 50_000,
+        'events': 50_000, 'notifications': 500_000,
+    },
+}
+
+FIRST_NAMES = [
+    'Marie', 'Jean', 'Claire', 'Pierre', 'Monique', 'Michel', 'Françoise', 'André',
+    'Jacqueline', 'Bernard', 'Nicole', 'Gérard', 'Danielle', 'Robert', 'Colette',
+    'Henri', 'Simone', 'Louis', 'Yvette', 'Paul', 'Odette', 'Jacques', 'Huguette',
+]
+LAST_NAMES = [
+    'Martin', 'Bernard', 'Dubois', 'Thomas', 'Robert', 'Richard', 'Petit', 'Durand',
+    'Leroy', 'Moreau', 'Simon', 'Laurent', 'Lefebvre', 'Michel', 'Garcia', 'David',
+    'Bertrand', 'Roux', 'Vincent', 'Fournier', 'Morel', 'Girard', 'Andre', 'Mercier',
+]
+CITIES = [
+    'Paris', 'Lyon', 'Marseille', 'Toulouse', 'Nice', 'Nantes', 'Strasbourg',
+    'Montpellier', 'Bordeaux', 'Lille', 'Rennes', 'Reims', 'Dijon', 'Angers', 'Nîmes',
+]
+INTERESTS = [
+    'Jardinage', 'Lecture', 'Cuisine', 'Randonnée', 'Peinture', 'Musique', 'Bridge',
+    'Voyages', 'Danse', 'Cinéma', 'Théâtre', 'Photographie', 'Tricot', 'Histoire',
+]
+MESSAGE_SNIPPETS = [
+    'Bonjour ! Comment allez-vous ?', 'Merci pour la belle journée.',
+    'On se retrouve jeudi au café ?', 'Avez-vous vu le programme du musée ?',
+    'Je vous envoie la recette promise.', 'Belle balade ce matin, à refaire !',
+    'Bonne soirée et à bientôt.', 'Je serai un peu en retard demain.',
+    'Mes petits-enfants viennent ce week-end.', 'Quel temps magnifique aujourd\'hui.',
+]
+STATUS_WEIGHTS = [('offline', 60), ('online', 20), ('away', 12), ('busy', 8)]
+CONTACT_STATUS_WEIGHTS = [('accepted', 85), ('pending', 10), ('declined', 5)]
+
+
+def weighted_choice(rng, weighted):
+    values, weights = zip(*weighted)
+    return rng.choices(values, weights)[0]
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Désactiver auto_now/auto_now_add pour conserver les dates générées"""
+    saved = []
+    for model in models:
+        for field in model._meta.local_fields:
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                saved.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _copy_value(value):
+    """Valeur au format texte de COPY (NULL = \\N)"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+class BatchWriter:
+    """Insertion par lots : bulk_create, ou COPY FROM STDIN sur PostgreSQL"""
+
+    def __init__(self, model, batch_size, use_copy=False):
+        self.model = model
+        self.batch_size = batch_size
+        self.use_copy = use_copy
+        self.fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+        self.pending = []
+        self.written = 0
+
+    def add(self, obj):
+        self.pending.append(obj)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        if self.use_copy:
+            self._copy(self.pending)
+        else:
+            self.model.objects.bulk_create(self.pending, batch_size=self.batch_size)
+        self.written += len(self.pending)
+        self.pending = []
+
+    def _copy(self, objs):
+        buffer = io.StringIO()
+        for obj in objs:
+            values = (field.get_db_prep_save(field.pre_save(obj, True), connection) for field in self.fields)
+            buffer.write('\t'.join(_copy_value(value) for value in values))
+            buffer.write('\n')
+        buffer.seek(0)
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in self.fields)
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            raw = cursor.cursor
+            sql = f'COPY {table} ({columns}) FROM STDIN'
+            if hasattr(raw, 'copy_expert'):
+                raw.copy_expert(sql, buffer)  # psycopg2
+            else:
+                with raw.copy(sql) as copy:   # psycopg 3
+                    copy.write(buffer.getvalue())
+
+
+class Command(BaseCommand):
+    help = "Générer un jeu de données synthétique, reproductible et volumineux (benchmarks, tests de charge)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', choices=sorted(SIZE_PROFILES), default='small',
+                            help="Profil de taille (tiny, small, medium, large)")
+        parser.add_argument('--seed', type=int, default=42, help="Graine aléatoire")
+        parser.add_argument('--users', type=int, help="Remplace le nombre d'utilisateurs du profil")
+        parser.add_argument('--messages', type=int, help="Remplace le nombre de messages du profil")
+        parser.add_argument('--activities', type=int, help="Remplace le nombre d'activités du profil")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Lignes par insertion")
+        parser.add_argument('--password', default='age2meet-bench',
+                            help="Mot de passe commun des utilisateurs générés")
+        parser.add_argument('--prefix', default='synth',
+                            help="Préfixe des noms d'utilisateur (doit être libre)")
+        parser.add_argument('--no-copy', action='store_true',
+                            help="Toujours utiliser bulk_create, même sur PostgreSQL")
+
+    def handle(self, *args, **options):
+        self.size = dict(SIZE_PROFILES[options['profile']])
+        for key in ('users', 'messages', 'activities'):
+            if options[key] is not None:
+                self.size[key] = options[key]
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.use_copy = connection.vendor == 'postgresql' and not options['no_copy']
+        self.prefix = f"{options['prefix']}{options['seed']}_"
+        # Dates relatives au jour courant : la structure reste identique d'un jour à l'autre
+        self.now = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+
+        if User.objects.filter(username__startswith=self.prefix).exists():
+            raise CommandError(
+                f"Des utilisateurs '{self.prefix}*' existent déjà : changez --prefix ou --seed"
+            )
+
+        started = time.monotonic()
+        self.stdout.write(
+            f"Profil {options['profile']} ({'COPY' if self.use_copy else 'bulk_create'}) : {self.size}"
+        )
+        with explicit_timestamps(User, UserProfile, Contact, Message, Event, Review, TutorialVideo,
+                                 Activity, ActivityRegistration, Notification, UserStatistics):
+            self.stage('utilisateurs', self.create_users, make_password(options['password']))
+            self.stage('profils', self.create_profiles)
+            self.stage('contacts', self.create_contacts)
+            self.stage('messages', self.create_messages)
+            self.stage('événements', self.create_events)
+            self.stage('activités', self.create_activities)
+            self.stage('inscriptions', self.create_registrations)
+            self.stage('notifications', self.create_notifications)
+            self.stage('avis et tutoriels', self.create_reviews_and_videos)
+            self.stage('statistiques', self.create_statistics)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Jeu de données généré en {time.monotonic() - started:.1f}s"
+        ))
+
+    def stage(self, label, func, *args):
+        started = time.monotonic()
+        count = func(*args)
+        self.stdout.write(f"  {label:<20} {count:>12,} lignes  {time.monotonic() - started:6.1f}s")
+
+    def writer(self, model):
+        return BatchWriter(model, self.batch_size, self.use_copy)
+
+    def past(self, max_days):
+        return self.now - timedelta(seconds=self.rng.randrange(max_days * 86400))
+
+    def pareto_weights(self, count, alpha=1.5, cap=1000.0):
+        """Poids en loi de puissance : quelques utilisateurs très actifs, une longue traîne"""
+        return [min(self.rng.paretovariate(alpha), cap) for _ in range(count)]
+
+    # ----- Utilisateurs -----
+
+    def create_users(self, password_hash):
+        writer = self.writer(User)
+        for i in range(self.size['users']):
+            first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+            joined = self.past(3 * 365)
+            writer.add(User(
+                username=f'{self.prefix}{i:07d}',
+                email=f'{self.prefix}{i:07d}@example.com',
+                password=password_hash,
+                first_name=first,
+                last_name=last,
+                date_of_birth=(self.now - timedelta(days=self.rng.randint(60 * 365, 90 * 365))).date(),
+                phone=f'06{self.rng.randrange(10 ** 8):08d}',
+                date_joined=joined,
+                created_at=joined,
+                updated_at=joined,
+            ))
+        writer.flush()
+        self.user_ids = list(
+            User.objects.filter(username__startswith=self.prefix).order_by('id').values_list('id', flat=True)
+        )
+        # Activité de chaque utilisateur (amis, messages, inscriptions...)
+        weights = self.pareto_weights(len(self.user_ids))
+        self.user_cum_weights = list(itertools.accumulate(weights))
+        return writer.written
+
+    def pick_users(self, k):
+        return self.rng.choices(self.user_ids, cum_weights=self.user_cum_weights, k=k)
+
+    def create_profiles(self):
+        writer = self.writer(UserProfile)
+        for user_id in self.user_ids:
+            created = self.past(3 * 365)
+            writer.add(UserProfile(
+                user_id=user_id,
+                bio=f"Retraité(e) passionné(e) de {self.rng.choice(INTERESTS).lower()}.",
+                location=self.rng.choice(CITIES),
+                interests=', '.join(self.rng.sample(INTERESTS, 3)),
+                status=weighted_choice(self.rng, STATUS_WEIGHTS),
+                is_verified=self.rng.random() < 0.3,
+                created_at=created,
+                updated_at=created,
+            ))
+        writer.flush()
+        return writer.written
+
+    # ----- Contacts et messages -----
+
+    def create_contacts(self):
+        target = len(self.user_ids) * self.size['avg_friends'] // 2
+        seen = set()
+        self.friendships = []
+        self.friend_counts = {}
+        writer = self.writer(Contact)
+        attempts = 0
+        while len(seen) < target and attempts < target * 5:
+            chunk = min(10_000, target - len(seen))
+            attempts += chunk
+            for a, b in zip(self.pick_users(chunk), self.pick_users(chunk)):
+                if a == b:
+                    continue
+                pair = (a, b) if a < b else (b, a)
+                if pair in seen:
+                    continue
+                seen.add(pair)
+                contact_status = weighted_choice(self.rng, CONTACT_STATUS_WEIGHTS)
+                created = self.past(2 * 365)
+                writer.add(Contact(user_id=a, contact_id=b, status=contact_status,
+                                   created_at=created, updated_at=created))
+                if contact_status == 'accepted':
+                    self.friendships.append(pair)
+                    for user_id in pair:
+                        self.friend_counts[user_id] = self.friend_counts.get(user_id, 0) + 1
+        writer.flush()
+        return writer.written
+
+    def create_messages(self):
+        self.messages_sent = {}
+        if not self.friendships:
+            return 0
+        # Volume par conversation en loi de puissance
+        conversation_weights = list(itertools.accumulate(self.pareto_weights(len(self.friendships), alpha=1.2)))
+        writer = self.writer(Message)
+        remaining = self.size['messages']
+        while remaining:
+            chunk = min(10_000, remaining)
+            remaining -= chunk
+            for a, b in self.rng.choices(self.friendships, cum_weights=conversation_weights, k=chunk):
+                sender, receiver = (a, b) if self.rng.random() < 0.5 else (b, a)
+                created = self.past(365)
+                writer.add(Message(
+                    sender_id=sender,
+                    receiver_id=receiver,
+                    content=self.rng.choice(MESSAGE_SNIPPETS),
+                    is_read=self.rng.random() < 0.85,
+                    created_at=created,
+                    updated_at=created,
+                ))
+                self.messages_sent[sender] = self.messages_sent.get(sender, 0) + 1
+        writer.flush()
+        return writer.written
+
+    # ----- Agenda et activités -----
+
+    def create_events(self):
+        writer = self.writer(Event)
+        owners = self.pick_users(self.size['events'])
+        self.events_created = {}
+        for owner in owners:
+            start = self.now + timedelta(hours=self.rng.randint(-60 * 24, 90 * 24))
+            created = start - timedelta(days=self.rng.randint(1, 60))
+            writer.add(Event(
+                user_id=owner,
+                title=f"{self.rng.choice(INTERESTS)} à {self.rng.choice(CITIES)}",
+                description="Événement généré pour les tests de charge.",
+                event_type=self.rng.choice(['personal', 'public', 'meetup', 'activity']),
+                location=self.rng.choice(CITIES),
+                start_date=start,
+                end_date=start + timedelta(hours=self.rng.randint(1, 4)),
+                is_public=self.rng.random() < 0.4,
+                created_at=created,
+                updated_at=created,
+            ))
+            self.events_created[owner] = self.events_created.get(owner, 0) + 1
+        writer.flush()
+
+        # Participants (table M2M)
+        Attendee = Event.attendees.through
+        attendees = self.writer(Attendee)
+        event_ids = Event.objects.filter(user__username__startswith=self.prefix).values_list('id', flat=True)
+        for event_id in event_ids.iterator():
+            for user_id in set(self.pick_users(self.rng.randint(0, 8))):
+                attendees.add(Attendee(event_id=event_id, user_id=user_id))
+        attendees.flush()
+        return writer.written + attendees.written
+
+    def create_activities(self):
+        writer = self.writer(Activity)
+        activity_types = [choice for choice, _ in Activity.ACTIVITY_TYPE_CHOICES]
+        # Peu d'organisateurs, très actifs
+        organizers = self.pick_users(max(1, len(self.user_ids) // 50))
+        for _ in range(self.size['activities']):
+            date = self.now + timedelta(hours=self.rng.randint(-90 * 24, 120 * 24))
+            created = date - timedelta(days=self.rng.randint(7, 90))
+            writer.add(Activity(
+                title=f"{self.rng.choice(INTERESTS)} - {self.rng.choice(CITIES)}",
+                description="Activité générée pour les tests de charge.",
+                activity_type=self.rng.choice(activity_types),
+                location=self.rng.choice(CITIES),
+                date=date,
+                end_date=date + timedelta(hours=self.rng.randint(1, 5)),
+                max_participants=self.rng.choice([6, 8, 10, 12, 15, 20, 30]),
+                price=Decimal(self.rng.choice([0, 0, 0, 5, 10, 15, 25])),
+                difficulty=self.rng.choice(['facile', 'facile', 'moyen', 'difficile']),
+                organizer_id=self.rng.choice(organizers),
+                is_active=self.rng.random() < 0.95,
+                created_at=created,
+                updated_at=created,
+            ))
+        writer.flush()
+        return writer.written
+
+    def create_registrations(self):
+        writer = self.writer(ActivityRegistration)
+        self.activities_participated = {}
+        activities = (
+            Activity.objects.filter(organizer__username__startswith=self.prefix)
+            .values_list('id', 'max_participants', 'date')
+        )
+        for activity_id, max_participants, date in activities.iterator():
+            participants = set(self.pick_users(self.rng.randint(0, max_participants)))
+            for user_id in participants:
+                registration_status = 'confirmed' if self.rng.random() < 0.9 else 'cancelled'
+                writer.add(ActivityRegistration(
+                    user_id=user_id,
+                    activity_id=activity_id,
+                    status=registration_status,
+                    registration_date=date - timedelta(days=self.rng.randint(1, 30)),
+                ))
+                if registration_status == 'confirmed':
+                    self.activities_participated[user_id] = self.activities_participated.get(user_id, 0) + 1
+        writer.flush()
+        return writer.written
+
+    # ----- Notifications, avis, statistiques -----
+
+    def create_notifications(self):
+        writer = self.writer(Notification)
+        notification_types = [choice for choice, _ in Notification.NOTIFICATION_TYPE_CHOICES]
+        for user_id in self.pick_users(self.size['notifications']):
+            created = self.past(180)
+            is_read = self.rng.random() < 0.7
+            read_at = created + timedelta(hours=self.rng.randint(1, 72)) if is_read else None
+            writer.add(Notification(
+                user_id=user_id,
+                title="Notification",
+                message=self.rng.choice(MESSAGE_SNIPPETS),
+                notification_type=self.rng.choice(notification_types),
+                is_read=is_read,
+                created_at=created,
+                updated_at=read_at or created,
+                read_at=read_at,
+            ))
+        writer.flush()
+        return writer.written
+
+    def create_reviews_and_videos(self):
+        reviews = self.writer(Review)
+        reviewers = self.rng.sample(self.user_ids, k=max(1, len(self.user_ids) // 20))
+        for user_id in reviewers:
+            created = self.past(365)
+            reviews.add(Review(
+                user_id=user_id,
+                rating=self.rng.choices([1, 2, 3, 4, 5], weights=[2, 3, 10, 35, 50])[0],
+                comment="Site très agréable, j'ai rencontré des personnes formidables.",
+                is_approved=self.rng.random() < 0.8,
+                created_at=created,
+                updated_at=created,
+            ))
+        reviews.flush()
+
+        videos = self.writer(TutorialVideo)
+        if not TutorialVideo.objects.exists():
+            for order in range(10):
+                created = self.past(365)
+                videos.add(TutorialVideo(
+                    title=f"Tutoriel {order + 1}",
+                    description="Découvrir Age2Meet pas à pas.",
+                    video_url=f"https://example.com/tutoriels/{order + 1}",
+                    order=order,
+                    is_active=True,
+                    created_at=created,
+                    updated_at=created,
+                ))
+            videos.flush()
+        return reviews.written + videos.written
+
+    def create_statistics(self):
+        writer = self.writer(UserStatistics)
+        for user_id in self.user_ids:
+            joined = self.past(3 * 365)
+            writer.add(UserStatistics(
+                user_id=user_id,
+                activities_participated=self.activities_participated.get(user_id, 0),
+                events_created=self.events_created.get(user_id, 0),
+                messages_sent=self.messages_sent.get(user_id, 0),
+                friends_count=self.friend_counts.get(user_id, 0),
+                profile_views=self.rng.randint(0, 500),
+                join_date=joined,
+                last_activity=self.past(30),
+            ))
+        writer.flush()
+        return writer.written
@@ -0,0 +1,453 @@
+import asyncio
+import itertools
+import json
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+# ===== TRANSPORTS =====
+#
+# Deux façons d'atteindre l'API, avec la même interface request() :
+#   - AsgiTransport : l'application Django est appelée dans le processus (aucun réseau)
+#   - HttpTransport : un serveur local (runserver, gunicorn, uvicorn) via un pool de
+#     connexions HTTP/1.1 keep-alive asyncio, sans dépendance externe
+
+
+class LoadResponse:
+    """Réponse minimale : statut et corps"""
+    __slots__ = ('status', 'body')
+
+    def __init__(self, status, body):
+        self.status = status
+        self.body = body
+
+    def json(self):
+        try:
+            return json.loads(self.body or b'null')
+        except ValueError:
+            return None
+
+
+class AsgiTransport:
+    """Appels directs à l'application ASGI de Django, chaque utilisateur virtuel ayant sa propre IP"""
+
+    def __init__(self, concurrency):
+        from django.core.handlers.asgi import ASGIHandler
+        self.app = ASGIHandler()
+        self.slots = asyncio.Semaphore(concurrency)
+
+    async def request(self, method, path, headers, body, client_ip):
+        path, _, query = path.partition('?')
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'root_path': '',
+            'headers': [(b'host', b'localhost'), (b'content-length', str(len(body)).encode())] + [
+                (name.lower().encode(), value.encode()) for name, value in headers.items()
+            ],
+            'client': (client_ip, 50000),
+            'server': ('localhost', 80),
+        }
+        pending = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        response = {'status': 0, 'body': []}
+
+        async def receive():
+            if pending:
+                return pending.pop()
+            # Pas de déconnexion : Django annule cette attente en fin de réponse
+            await asyncio.get_running_loop().create_future()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                response['body'].append(message.get('body', b''))
+
+        async with self.slots:
+            await self.app(scope, receive, send)
+        return LoadResponse(response['status'], b''.join(response['body']))
+
+    async def close(self):
+        pass
+
+
+class HttpTransport:
+    """Pool borné de connexions HTTP/1.1 persistantes vers un serveur"""
+
+    def __init__(self, base_url, concurrency, timeout=30):
+        parts = urlsplit(base_url)
+        if parts.scheme != 'http':
+            raise CommandError("Seules les URL http:// sont prises en charge (serveur local)")
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.slots = asyncio.Semaphore(concurrency)
+        self.idle = []
+
+    async def request(self, method, path, headers, body, client_ip):
+        async with self.slots:
+            reader, writer = self.idle.pop() if self.idle else await asyncio.open_connection(self.host, self.port)
+            try:
+                status, payload, keep_alive = await asyncio.wait_for(
+                    self._exchange(reader, writer, method, path, headers, body), self.timeout
+                )
+            except BaseException:
+                writer.close()
+                raise
+            if keep_alive:
+                self.idle.append((reader, writer))
+            else:
+                writer.close()
+            return LoadResponse(status, payload)
+
+    async def _exchange(self, reader, writer, method, path, headers, body):
+        lines = [f'{method} {self.prefix}{path} HTTP/1.1', f'Host: {self.host}:{self.port}',
+                 f'Content-Length: {len(body)}', 'Connection: keep-alive']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError('Connexion fermée par le serveur')
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            payload = b''.join(chunks)
+        elif 'content-length' in response_headers:
+            payload = await reader.readexactly(int(response_headers['content-length']))
+        else:
+            payload = await reader.read()
+            return status, payload, False
+        return status, payload, response_headers.get('connection', '').lower() != 'close'
+
+    async def close(self):
+        for _, writer in self.idle:
+            writer.close()
+        self.idle.clear()
+
+
+# ===== STATISTIQUES =====
+
+def percentile(sorted_values, fraction):
+    """Percentile par rang le plus proche sur une liste triée"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class LoadStats:
+    """Latences, statuts et erreurs par endpoint (libellé de route, pas URL concrète)"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.failures = defaultdict(Counter)
+        self.sessions = Counter()
+
+    def record(self, endpoint, status, elapsed, failure=None):
+        self.latencies[endpoint].append(elapsed)
+        self.statuses[endpoint][status] += 1
+        if failure is not None:
+            self.failures[endpoint][failure] += 1
+
+    def report(self, wall_time):
+        endpoints = {}
+        total = errors = 0
+        status_codes = Counter()
+        for endpoint in sorted(self.latencies):
+            values = sorted(self.latencies[endpoint])
+            count = len(values)
+            failed = sum(
+                n for status, n in self.statuses[endpoint].items() if status == 0 or status >= 400
+            )
+            total += count
+            errors += failed
+            status_codes.update(self.statuses[endpoint])
+            endpoints[endpoint] = {
+                'requests': count,
+                'errors': failed,
+                'error_rate': round(failed / count, 4),
+                'throughput_rps': round(count / wall_time, 2),
+                'latency_ms': {
+                    'p50': round(percentile(values, 0.50) * 1000, 2),
+                    'p95': round(percentile(values, 0.95) * 1000, 2),
+                    'p99': round(percentile(values, 0.99) * 1000, 2),
+                    'mean': round(sum(values) / count * 1000, 2),
+                    'max': round(values[-1] * 1000, 2),
+                },
+                'status_codes': {str(status): n for status, n in sorted(self.statuses[endpoint].items())},
+                'failures': dict(self.failures[endpoint]),
+            }
+        return {
+            'duration_s': round(wall_time, 2),
+            'requests': total,
+            'errors': errors,
+            'error_rate': round(errors / total, 4) if total else 0.0,
+            'throughput_rps': round(total / wall_time, 2) if wall_time else 0.0,
+            'sessions': dict(self.sessions),
+            'status_codes': {str(status): n for status, n in sorted(status_codes.items())},
+            'endpoints': endpoints,
+        }
+
+
+def compare_reports(baseline, current):
+    """Écarts p95 et débit par endpoint par rapport à un rapport précédent"""
+    comparison = {}
+    for endpoint, stats in current['endpoints'].items():
+        before = baseline.get('endpoints', {}).get(endpoint)
+        if not before:
+            continue
+        comparison[endpoint] = {
+            'p95_ms_before': before['latency_ms']['p95'],
+            'p95_ms_after': stats['latency_ms']['p95'],
+            'p95_change': _relative_change(before['latency_ms']['p95'], stats['latency_ms']['p95']),
+            'error_rate_before': before['error_rate'],
+            'error_rate_after': stats['error_rate'],
+        }
+    return {
+        'throughput_change': _relative_change(baseline.get('throughput_rps'), current['throughput_rps']),
+        'endpoints': comparison,
+    }
+
+
+def _relative_change(before, after):
+    if not before:
+        return None
+    return round((after - before) / before, 4)
+
+
+# ===== UTILISATEURS VIRTUELS =====
+
+class VirtualUser:
+    """Un membre simulé : son IP, son token, ses appels chronométrés"""
+
+    def __init__(self, transport, stats, client_ip):
+        self.transport = transport
+        self.stats = stats
+        self.client_ip = client_ip
+        self.token = None
+
+    async def call(self, method, path, endpoint, data=None):
+        headers = {'Accept': 'application/json'}
+        body = b''
+        if data is not None:
+            body = json.dumps(data).encode()
+            headers['Content-Type'] = 'application/json'
+        if self.token:
+            headers['Authorization'] = f'Token {self.token}'
+
+        started = time.perf_counter()
+        try:
+            response = await self.transport.request(method, path, headers, body, self.client_ip)
+        except Exception as e:
+            self.stats.record(f'{method} {endpoint}', 0, time.perf_counter() - started, type(e).__name__)
+            return None
+        self.stats.record(f'{method} {endpoint}', response.status, time.perf_counter() - started)
+        return response
+
+    async def login(self, email, password):
+        response = await self.call('POST', '/api/auth/login/', '/api/auth/login/', {
+            'email': email, 'password': password, 'device': 'loadtest',
+        })
+        if response is None or response.status != 200:
+            return False
+        self.token = (response.json() or {}).get('token')
+        return bool(self.token)
+
+    async def logout(self):
+        await self.call('POST', '/api/auth/logout/', '/api/auth/logout/', {})
+        self.token = None
+
+
+class Command(BaseCommand):
+    help = (
+        "Test de charge : sessions simultanées de membres (connexion, accueil, tableau de bord, "
+        "messagerie, activités, rafales d'inscriptions) et rapport JSON des latences par endpoint"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="Serveur cible (http://127.0.0.1:8000) ; par défaut l'application "
+                                          "est appelée dans le processus via ASGI")
+        parser.add_argument('--duration', type=float, default=60, help="Durée d'arrivée des sessions (s)")
+        parser.add_argument('--rate', type=float, default=2.0, help="Arrivées de sessions par seconde (Poisson)")
+        parser.add_argument('--concurrency', type=int, default=50, help="Requêtes simultanées maximum")
+        parser.add_argument('--polls', type=int, default=3, help="Relèves de messagerie par session")
+        parser.add_argument('--think-time', type=float, default=1.0, help="Pause moyenne entre deux pages (s)")
+        parser.add_argument('--burst-every', type=float, default=20.0,
+                            help="Intervalle entre rafales d'inscriptions à une activité (s, 0 = aucune)")
+        parser.add_argument('--burst-size', type=int, default=20, help="Membres par rafale d'inscriptions")
+        parser.add_argument('--accounts', type=int, default=200, help="Nombre de comptes générés à utiliser")
+        parser.add_argument('--account-prefix', default='synth42_',
+                            help="Préfixe des comptes de generate_dataset (<prefix><seed>_)")
+        parser.add_argument('--password', default='age2meet-bench', help="Mot de passe des comptes générés")
+        parser.add_argument('--seed', type=int, default=1, help="Graine aléatoire")
+        parser.add_argument('--output', help="Fichier du rapport JSON (sinon sortie standard)")
+        parser.add_argument('--baseline', help="Rapport JSON précédent à comparer")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.accounts = itertools.cycle([
+            f"{options['account_prefix']}{i:07d}@example.com" for i in range(options['accounts'])
+        ])
+        self.ip_counter = itertools.count(1)
+        self.stats = LoadStats()
+
+        started_at = timezone.now()
+        wall_time = asyncio.run(self.run())
+
+        report = {
+            'started_at': started_at.isoformat(),
+            'target': options['url'] or 'in-process (ASGI)',
+            'config': {key: options[key] for key in (
+                'duration', 'rate', 'concurrency', 'polls', 'think_time',
+                'burst_every', 'burst_size', 'accounts', 'seed',
+            )},
+        }
+        report.update(self.stats.report(wall_time))
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as f:
+                report['comparison'] = compare_reports(json.load(f), report)
+
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+            self.stderr.write(
+                f"{report['requests']} requêtes, {report['throughput_rps']} req/s, "
+                f"{report['error_rate']:.1%} d'erreurs -> {options['output']}"
+            )
+        else:
+            self.stdout.write(output)
+
+    async def run(self):
+        options = self.options
+        if options['url']:
+            transport = HttpTransport(options['url'], options['concurrency'])
+        else:
+            transport = AsgiTransport(options['concurrency'])
+
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(self.arrivals(transport))]
+        if options['burst_every'] > 0 and options['burst_size'] > 0:
+            tasks.append(asyncio.create_task(self.bursts(transport)))
+        sessions = await asyncio.gather(*tasks)
+        # Attendre la fin des sessions lancées pendant la fenêtre d'arrivée
+        await asyncio.gather(*itertools.chain.from_iterable(sessions))
+        wall_time = time.perf_counter() - started
+        await transport.close()
+        return wall_time
+
+    def virtual_user(self, transport):
+        n = next(self.ip_counter)
+        # Une IP par membre : les throttles par IP s'appliquent comme en production (mode ASGI)
+        return VirtualUser(transport, self.stats, f'10.{(n >> 16) & 255}.{(n >> 8) & 255}.{n & 255}')
+
+    async def think(self):
+        await asyncio.sleep(self.rng.uniform(0.5, 1.5) * self.options['think_time'])
+
+    async def arrivals(self, transport):
+        """Arrivées de sessions de navigation selon un processus de Poisson"""
+        deadline = time.perf_counter() + self.options['duration']
+        sessions = []
+        while True:
+            await asyncio.sleep(self.rng.expovariate(self.options['rate']))
+            if time.perf_counter() >= deadline:
+                return sessions
+            sessions.append(asyncio.create_task(self.browsing_session(transport)))
+            self.progress(len(sessions))
+
+    async def bursts(self, transport):
+        """Rafales périodiques : plusieurs membres s'inscrivent en même temps à la même activité"""
+        deadline = time.perf_counter() + self.options['duration']
+        sessions = []
+        while True:
+            await asyncio.sleep(self.options['burst_every'])
+            if time.perf_counter() >= deadline:
+                return sessions
+            sessions.append(asyncio.create_task(self.registration_burst(transport)))
+
+    def progress(self, count):
+        if count % 50 == 0:
+            sys.stderr.write(f'  {count} sessions lancées\n')
+
+    # ----- Scénarios -----
+
+    async def browsing_session(self, transport):
+        user = self.virtual_user(transport)
+        if not await user.login(next(self.accounts), self.options['password']):
+            self.stats.sessions['login_failed'] += 1
+            return
+        self.stats.sessions['browsing'] += 1
+
+        await user.call('GET', '/api/home/', '/api/home/')
+        await self.think()
+        await user.call('GET', '/api/dashboard/', '/api/dashboard/')
+
+        for _ in range(self.options['polls']):
+            await self.think()
+            await user.call('GET', '/api/messages/', '/api/messages/')
+            await user.call('GET', '/api/notifications/', '/api/notifications/')
+
+        await self.think()
+        response = await user.call('GET', '/api/activities/', '/api/activities/')
+        activities = response.json() if response is not None and response.status == 200 else []
+        for activity in self.rng.sample(activities, min(2, len(activities))):
+            await self.think()
+            await user.call('GET', f"/api/activities/{activity['id']}/", '/api/activities/{id}/')
+
+        await user.call('GET', '/api/user/activities/', '/api/user/activities/')
+        await user.logout()
+
+    async def registration_burst(self, transport):
+        users = [self.virtual_user(transport) for _ in range(self.options['burst_size'])]
+        logged_in = await asyncio.gather(*[
+            user.login(next(self.accounts), self.options['password']) for user in users
+        ])
+        users = [user for user, ok in zip(users, logged_in) if ok]
+        if not users:
+            self.stats.sessions['login_failed'] += 1
+            return
+        self.stats.sessions['registration_burst'] += 1
+
+        response = await users[0].call('GET', '/api/activities/', '/api/activities/')
+        activities = response.json() if response is not None and response.status == 200 else []
+        if not activities:
+            return
+        target = self.rng.choice(activities)['id']
+
+        # Tous les membres cliquent « S'inscrire » au même moment
+        await asyncio.gather(*[
+            user.call('POST', '/api/activities/register/', '/api/activities/register/', {'activity_id': target})
+            for user in users
+        ])
+        await asyncio.gather(*[user.logout() for user in users])
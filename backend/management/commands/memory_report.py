@@ -0,0 +1,102 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from backend.memory_profiling import load_profiles
+
+SORT_KEYS = {
+    'peak': lambda entry: entry['peak_max'],
+    'avg': lambda entry: entry['peak_total'] / entry['requests'],
+    'total': lambda entry: entry['peak_total'],
+}
+
+
+def _mb(size):
+    return f'{size / 1024 / 1024:8.2f} Mo'
+
+
+class Command(BaseCommand):
+    help = "Afficher le pic d'allocation et les principaux sites d'allocation par vue (MEMORY_PROFILING_ENABLED)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None,
+                            help="Répertoire des mesures (défaut : MEMORY_PROFILING_DIR)")
+        parser.add_argument('--sort', choices=sorted(SORT_KEYS), default='peak',
+                            help="Tri des vues : pic maximal, pic moyen ou cumul")
+        parser.add_argument('--limit', type=int, default=20, help="Nombre de vues affichées")
+        parser.add_argument('--sites', type=int, default=5, help="Sites d'allocation affichés par vue")
+        parser.add_argument('--view', default=None, help="Seulement ce nom d'URL (ex. backend:messages)")
+        parser.add_argument('--json', action='store_true', help="Sortie JSON (comparaison avant / après)")
+        parser.add_argument('--reset', action='store_true',
+                            help="Supprimer les mesures existantes (avant une nouvelle campagne)")
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or settings.MEMORY_PROFILING_DIR
+
+        if options['reset']:
+            removed = 0
+            if os.path.isdir(directory):
+                for name in os.listdir(directory):
+                    if name.startswith('memory-'):
+                        os.remove(os.path.join(directory, name))
+                        removed += 1
+            self.stdout.write(self.style.SUCCESS(f"{removed} fichiers de mesures supprimés"))
+            return
+
+        views = load_profiles(directory)
+        if options['view']:
+            views = {name: entry for name, entry in views.items() if name == options['view']}
+        if not views:
+            self.stdout.write(self.style.WARNING(
+                f"Aucune mesure dans {directory} (MEMORY_PROFILING_ENABLED=True sur le serveur ?)"
+            ))
+            return
+
+        ranked = sorted(views.items(), key=lambda item: SORT_KEYS[options['sort']](item[1]), reverse=True)
+        ranked = ranked[:options['limit']]
+
+        if options['json']:
+            self.stdout.write(json.dumps([
+                {
+                    'view': name,
+                    'requests': entry['requests'],
+                    'peak_max': entry['peak_max'],
+                    'peak_avg': round(entry['peak_total'] / entry['requests']),
+                    'net_avg': round(entry['net_total'] / entry['requests']),
+                    'sites': self.top_sites(entry, options['sites']),
+                }
+                for name, entry in ranked
+            ], indent=2))
+            return
+
+        for name, entry in ranked:
+            requests = entry['requests']
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(
+                f"  {requests} requêtes  pic max {_mb(entry['peak_max'])}  "
+                f"pic moyen {_mb(entry['peak_total'] / requests)}  "
+                f"solde moyen {_mb(entry['net_total'] / requests)}"
+            )
+            for site in self.top_sites(entry, options['sites']):
+                self.stdout.write(
+                    f"    {_mb(site['size_avg'])}/req  {site['count_avg']:>8} blocs  "
+                    f"{site['origin'] or '?'}  ->  {site['allocator']}"
+                )
+
+    def top_sites(self, entry, limit):
+        """Sites moyens par requête échantillonnée, les plus gros d'abord"""
+        if not entry['snapshots']:
+            return []
+        sites = sorted(entry['sites'].values(), key=lambda site: site['size_total'], reverse=True)[:limit]
+        return [
+            {
+                'origin': site['origin'],
+                'allocator': site['allocator'],
+                'size_avg': round(site['size_total'] / entry['snapshots']),
+                'size_max': site['size_max'],
+                'count_avg': round(site['count_total'] / entry['snapshots']),
+            }
+            for site in sites
+        ]
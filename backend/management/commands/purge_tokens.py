@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from backend.models import AuthToken
+
+
+class Command(BaseCommand):
+    help = "Supprimer par lots les tokens expirés ou révoqués"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Nombre de tokens supprimés par requête")
+        parser.add_argument('--revoked-grace-minutes', type=int, default=60,
+                            help="Délai avant suppression d'un token révoqué (synchronisation des workers)")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        now = timezone.now()
+        revoked_before = now - timedelta(minutes=options['revoked_grace_minutes'])
+        purgeable = AuthToken.objects.filter(
+            Q(expires_at__lt=now) | Q(revoked_at__lt=revoked_before)
+        )
+
+        deleted = 0
+        while True:
+            batch = list(purgeable.order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                break
+            count, _ = AuthToken.objects.filter(pk__in=batch).delete()
+            deleted += count
+
+        self.stdout.write(self.style.SUCCESS(f"{deleted} tokens supprimés"))
@@ -0,0 +1,71 @@
+import logging
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+
+from backend import reminders
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Planifier et envoyer les rappels d'activités et d'événements (worker)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Un seul passage (planification puis envoi des rappels échus), pour cron")
+        parser.add_argument('--interval', type=float, default=settings.REMINDER_POLL_INTERVAL,
+                            help="Secondes entre deux recherches de rappels échus")
+        parser.add_argument('--plan-interval', type=float, default=settings.REMINDER_PLAN_INTERVAL,
+                            help="Secondes entre deux planifications")
+        parser.add_argument('--batch-size', type=int, default=settings.REMINDER_BATCH_SIZE,
+                            help="Rappels traités par transaction")
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        if not options['once']:
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+
+        next_plan = 0.0
+        while not self.stopping:
+            close_old_connections()
+            planned = 0
+            try:
+                if time.monotonic() >= next_plan:
+                    planned = reminders.plan(batch_size=options['batch_size'])
+                    next_plan = time.monotonic() + options['plan_interval']
+                    logger.info('Rappels planifiés', extra={'planned': planned})
+                sent = self.drain(options['batch_size'])
+            except DatabaseError:
+                # Lot disputé par un autre worker (SQLite verrouillée) : rejoué au prochain passage
+                logger.warning('Passage des rappels interrompu', exc_info=True)
+                sent = 0
+            if options['once']:
+                self.stdout.write(self.style.SUCCESS(f"{planned} rappels planifiés, {sent} traités"))
+                return
+            self.sleep(options['interval'])
+
+    def drain(self, batch_size):
+        """Traiter les rappels échus par lots jusqu'à épuisement"""
+        total = 0
+        while not self.stopping:
+            processed = reminders.process_due(batch_size=batch_size)
+            total += processed
+            if processed < batch_size:
+                break
+        if total:
+            logger.info('Rappels traités', extra={'processed': total})
+        return total
+
+    def sleep(self, seconds):
+        deadline = time.monotonic() + seconds
+        while not self.stopping and time.monotonic() < deadline:
+            time.sleep(min(1.0, deadline - time.monotonic()))
+
+    def stop(self, signum, frame):
+        # Le lot en cours se termine (transaction), puis le worker s'arrête
+        self.stopping = True
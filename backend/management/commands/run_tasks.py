@@ -0,0 +1,122 @@
+import logging
+import multiprocessing
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, connections
+from django.utils.module_loading import autodiscover_modules
+
+from backend import task_queue
+
+logger = logging.getLogger(__name__)
+
+
+def worker_loop(stop, batch_size, interval):
+    """Boucle d'un processus du pool : exécuter les tâches prêtes jusqu'à l'arrêt"""
+    # Ctrl-C atteint tout le groupe de processus : seul le superviseur décide de l'arrêt.
+    # SIGTERM (systemd l'envoie à tout le groupe) : la tâche en cours se termine.
+    # Un Event multiprocessing ne peut pas être positionné depuis un gestionnaire
+    # de signal pendant qu'on l'attend : simple drapeau local.
+    terminated = []
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: terminated.append(signum))
+
+    def should_stop():
+        return bool(terminated) or stop.is_set()
+
+    # Processus issu d'un fork : le handler de logs y a redémarré son propre thread
+    # d'écriture (structured_logging), vidé quand le processus se termine.
+    worker = task_queue.worker_id()
+    while not should_stop():
+        close_old_connections()
+        try:
+            processed = task_queue.work(worker, batch_size, should_stop=should_stop)
+        except DatabaseError:
+            # Lot disputé par un autre processus (SQLite verrouillée) : rejoué au prochain passage
+            logger.warning('Réservation de tâches interrompue', exc_info=True)
+            processed = 0
+        if not processed:
+            sleep(interval, should_stop)
+    connections.close_all()
+
+
+def sleep(seconds, should_stop):
+    deadline = time.monotonic() + seconds
+    while not should_stop() and time.monotonic() < deadline:
+        time.sleep(min(0.5, deadline - time.monotonic()))
+
+
+class Command(BaseCommand):
+    help = "Exécuter les tâches de fond mises en file par les vues (pool de processus)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.TASK_WORKERS,
+                            help="Nombre de processus d'exécution")
+        parser.add_argument('--once', action='store_true',
+                            help="Exécuter les tâches prêtes dans ce processus puis s'arrêter (cron, tests)")
+        parser.add_argument('--interval', type=float, default=settings.TASK_POLL_INTERVAL,
+                            help="Secondes d'attente quand la file est vide")
+        parser.add_argument('--batch-size', type=int, default=settings.TASK_BATCH_SIZE,
+                            help="Tâches réservées à la fois par processus")
+
+    def handle(self, *args, **options):
+        autodiscover_modules('tasks')
+
+        if options['once']:
+            requeued = task_queue.requeue_expired()
+            processed = task_queue.work(batch_size=options['batch_size'])
+            purged = task_queue.purge_finished()
+            self.stdout.write(self.style.SUCCESS(
+                f"{processed} tâches exécutées, {requeued} reprises, {purged} purgées"
+            ))
+            return
+
+        self.stopping = False
+        self.stop = multiprocessing.Event()
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+        # Aucune connexion ouverte ne doit être héritée par les processus
+        connections.close_all()
+        self.processes = [self.spawn(options) for _ in range(max(options['workers'], 1))]
+        logger.info('Pool de tâches démarré', extra={'workers': len(self.processes)})
+
+        while not self.stopping:
+            self.housekeeping()
+            for index, process in enumerate(self.processes):
+                if not process.is_alive() and not self.stopping:
+                    logger.warning('Processus de tâches arrêté, relancé', extra={'exitcode': process.exitcode})
+                    connections.close_all()
+                    self.processes[index] = self.spawn(options)
+            sleep(max(options['interval'], 5.0), lambda: self.stopping)
+
+        self.stop.set()
+        # Chaque processus termine la tâche en cours et rend le reste de son lot
+        for process in self.processes:
+            process.join(settings.TASK_LEASE_SECONDS)
+            if process.is_alive():
+                process.terminate()
+        self.stdout.write(self.style.SUCCESS("Pool de tâches arrêté"))
+
+    def spawn(self, options):
+        process = multiprocessing.Process(
+            target=worker_loop, args=(self.stop, options['batch_size'], options['interval']), daemon=True,
+        )
+        process.start()
+        return process
+
+    def housekeeping(self):
+        """Baux expirés et tâches terminées anciennes, par le superviseur seulement"""
+        close_old_connections()
+        try:
+            requeued = task_queue.requeue_expired()
+            purged = task_queue.purge_finished()
+        except DatabaseError:
+            logger.warning('Maintenance de la file de tâches interrompue', exc_info=True)
+            return
+        if requeued or purged:
+            logger.info('Maintenance de la file de tâches', extra={'requeued': requeued, 'purged': purged})
+
+    def request_stop(self, signum, frame):
+        self.stopping = True
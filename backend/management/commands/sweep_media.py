@@ -0,0 +1,147 @@
+import os
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from backend.models import MediaBlob
+from backend.storage import TRACKED_IMAGE_FIELDS, media_storage
+
+
+class Command(BaseCommand):
+    help = "Supprimer par lots les fichiers media qui ne sont plus référencés"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Nombre de fichiers examinés par lot")
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help="Délai depuis le dernier upload d'un contenu avant suppression (upload en cours)")
+        parser.add_argument('--recount', action='store_true',
+                            help="Recalculer les compteurs de références depuis les modèles")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Afficher les fichiers orphelins sans les supprimer")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+
+        if options['recount']:
+            self.recount(batch_size)
+
+        deleted = freed = 0
+        for names in self.iter_media_files(batch_size):
+            removed, size = self.sweep_chunk(names, cutoff, dry_run)
+            deleted += removed
+            freed += size
+
+        # Lignes orphelines dont le fichier a déjà disparu du disque
+        stale = self.purge_missing_blobs(cutoff, batch_size, dry_run)
+
+        prefix = '[dry-run] ' if dry_run else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{deleted} fichiers orphelins supprimés ({freed / 1024 / 1024:.1f} Mo), "
+            f"{stale} entrées obsolètes retirées"
+        ))
+
+    def tracked_fields(self):
+        for app_label, model_name, field_name in TRACKED_IMAGE_FIELDS:
+            model = apps.get_model(app_label, model_name)
+            yield model, model._meta.get_field(field_name)
+
+    def referenced_names(self, names):
+        """Noms réellement référencés par un champ suivi (une requête par champ)"""
+        referenced = set()
+        for model, field in self.tracked_fields():
+            referenced.update(
+                model.objects.filter(**{f'{field.name}__in': names})
+                .values_list(field.name, flat=True)
+            )
+        return referenced
+
+    def iter_media_files(self, batch_size):
+        """Parcourir les dossiers d'upload suivis et produire des lots de noms relatifs"""
+        chunk = []
+        directories = {field.upload_to for _, field in self.tracked_fields()}
+        for directory in sorted(directories):
+            root = media_storage.path(directory)
+            for dirpath, _, filenames in os.walk(root):
+                for filename in filenames:
+                    full_path = os.path.join(dirpath, filename)
+                    chunk.append(os.path.relpath(full_path, media_storage.location).replace('\\', '/'))
+                    if len(chunk) >= batch_size:
+                        yield chunk
+                        chunk = []
+        if chunk:
+            yield chunk
+
+    def sweep_chunk(self, names, cutoff, dry_run):
+        rows = list(MediaBlob.objects.filter(name__in=names).values_list('name', 'ref_count', 'updated_at'))
+        ref_counts = {name: ref_count for name, ref_count, _ in rows}
+        # Dernier upload de ce contenu (updated_at, rafraîchi à chaque réutilisation par
+        # déduplication) ; date de modification du fichier s'il n'a pas de MediaBlob
+        last_used = {name: updated_at for name, _, updated_at in rows}
+        candidates = [
+            name for name in names
+            if ref_counts.get(name, 0) <= 0
+            and (last_used.get(name) or media_storage.get_modified_time(name)) < cutoff
+        ]
+        if not candidates:
+            return 0, 0
+
+        # Les compteurs peuvent dériver : toujours vérifier auprès des modèles
+        referenced = self.referenced_names(candidates)
+        orphans = [name for name in candidates if name not in referenced]
+
+        freed = 0
+        for name in orphans:
+            freed += media_storage.size(name)
+            if dry_run:
+                self.stdout.write(f"  orphelin : {name}")
+            else:
+                media_storage.delete(name)
+        if not dry_run:
+            MediaBlob.objects.filter(name__in=orphans).delete()
+        return len(orphans), freed
+
+    def purge_missing_blobs(self, cutoff, batch_size, dry_run):
+        removed = 0
+        last_pk = 0
+        while True:
+            batch = list(
+                MediaBlob.objects.filter(pk__gt=last_pk, ref_count__lte=0, updated_at__lt=cutoff)
+                .order_by('pk').values_list('pk', 'name')[:batch_size]
+            )
+            if not batch:
+                return removed
+            last_pk = batch[-1][0]
+            missing = [pk for pk, name in batch if not media_storage.exists(name)]
+            if missing and not dry_run:
+                MediaBlob.objects.filter(pk__in=missing).delete()
+            removed += len(missing)
+
+    def recount(self, batch_size):
+        """Reconstruire ref_count à partir des ImageField suivis"""
+        counts = {}
+        for model, field in self.tracked_fields():
+            rows = (
+                model.objects.exclude(**{field.name: ''}).exclude(**{f'{field.name}__isnull': True})
+                .values(field.name).annotate(n=Count('pk')).values_list(field.name, 'n')
+            )
+            for name, n in rows:
+                counts[name] = counts.get(name, 0) + n
+
+        MediaBlob.objects.update(ref_count=0)
+        names = list(counts)
+        for start in range(0, len(names), batch_size):
+            chunk = names[start:start + batch_size]
+            MediaBlob.objects.bulk_create(
+                [MediaBlob(name=name) for name in chunk], ignore_conflicts=True
+            )
+            blobs = list(MediaBlob.objects.filter(name__in=chunk))
+            for blob in blobs:
+                blob.ref_count = counts[blob.name]
+            MediaBlob.objects.bulk_update(blobs, ['ref_count'])
+        self.stdout.write(f"Compteurs recalculés pour {len(names)} fichiers")
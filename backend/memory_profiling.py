@@ -0,0 +1,200 @@
+import atexit
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+from django.conf import settings
+
+from .metrics import histogram
+from .profiling import INSTRUMENTATION_FILES, PROJECT_ROOT, _short_path
+
+# ===== PROFILAGE MÉMOIRE PAR VUE =====
+#
+# Utilisé par config.middleware.MemoryProfilingMiddleware (MEMORY_PROFILING_ENABLED).
+# tracemalloc donne pour chaque requête le pic d'allocation au-dessus du niveau
+# de départ ; pour une fraction des requêtes, un instantané donne les sites
+# d'allocation encore vivants en fin de requête : données de la vue,
+# response.data, corps rendu. Les agrégats par nom d'URL sont écrits
+# régulièrement dans MEMORY_PROFILING_DIR (un fichier par processus) et lus
+# par `python manage.py memory_report`.
+#
+# tracemalloc compte les allocations de tout le processus : une seule requête
+# est mesurée à la fois, et les chiffres ne sont fiables qu'avec des workers
+# à un seul thread (gunicorn sync).
+
+memory_peak = histogram(
+    'age2meet_http_memory_peak_bytes', "Pic d'allocation Python par requête HTTP (tracemalloc)", ('view',),
+    buckets=(65536, 262144, 1048576, 4194304, 16777216, 67108864, 268435456),
+)
+
+# Sites conservés par vue : les plus gros en cumul
+MAX_SITES_PER_VIEW = 50
+
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, os.path.abspath(__file__)),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+)
+
+
+def start():
+    """Démarrer tracemalloc (idempotent) avec MEMORY_PROFILING_FRAMES niveaux de pile"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(getattr(settings, 'MEMORY_PROFILING_FRAMES', 16))
+
+
+def _frame(frame):
+    return f'{_short_path(frame.filename)}:{frame.lineno}'
+
+
+def allocation_site(traceback):
+    """
+    (ligne du projet, ligne qui a alloué) : la première dit quel code est en
+    cause, la seconde où la mémoire est réellement prise (sérialiseur, json...).
+    """
+    origin = None
+    for frame in reversed(traceback):  # du plus récent au plus ancien
+        if frame.filename.startswith('<'):
+            continue  # <frozen importlib._bootstrap>, <string>...
+        filename = os.path.abspath(frame.filename)
+        if (filename.startswith(PROJECT_ROOT) and filename not in INSTRUMENTATION_FILES
+                and 'site-packages' not in filename):
+            origin = _frame(frame)
+            break
+    return origin, _frame(traceback[-1])
+
+
+class Measurement:
+    """Pic et solde d'allocation d'une requête, et ses sites si un instantané a été pris"""
+    __slots__ = ('peak', 'net', 'sites')
+
+    def __init__(self):
+        self.peak = 0
+        self.net = 0
+        self.sites = []
+
+
+def measure(func, snapshot=False, top=10):
+    """Exécuter func() en mesurant ses allocations : (résultat, Measurement)"""
+    measurement = Measurement()
+    # Oublier les blocs déjà vivants : l'instantané final ne contient que ceux
+    # alloués par la requête (comparer deux instantanés du processus entier
+    # coûte plusieurs secondes)
+    tracemalloc.clear_traces()
+    tracemalloc.reset_peak()
+    result = func()
+    # Mesure prise pendant que la réponse (data et corps rendu) est encore vivante
+    current, peak = tracemalloc.get_traced_memory()
+    measurement.peak = peak
+    measurement.net = current
+    if snapshot:
+        stats = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS).statistics('traceback')
+        for stat in stats[:top]:
+            origin, allocator = allocation_site(stat.traceback)
+            measurement.sites.append({
+                'origin': origin,
+                'allocator': allocator,
+                'size': stat.size,
+                'count': stat.count,
+            })
+    return result, measurement
+
+
+class MemoryProfile:
+    """
+    Agrégats du processus par nom d'URL, écrits au plus toutes les
+    MEMORY_PROFILING_FLUSH_INTERVAL secondes (et à l'arrêt du processus).
+    """
+
+    def __init__(self):
+        self.views = {}
+        self.lock = threading.Lock()
+        # Une seule requête mesurée à la fois : tracemalloc est global au processus
+        self.measuring = threading.Lock()
+        self._last_flush = time.monotonic()
+        atexit.register(self.flush)
+
+    def record(self, view, measurement):
+        memory_peak.observe(measurement.peak, view=view)
+        with self.lock:
+            entry = self.views.setdefault(view, {
+                'requests': 0, 'peak_max': 0, 'peak_total': 0, 'net_total': 0,
+                'snapshots': 0, 'sites': {},
+            })
+            entry['requests'] += 1
+            entry['peak_max'] = max(entry['peak_max'], measurement.peak)
+            entry['peak_total'] += measurement.peak
+            entry['net_total'] += measurement.net
+            if measurement.sites:
+                entry['snapshots'] += 1
+                merge_sites(entry['sites'], measurement.sites)
+        if time.monotonic() - self._last_flush >= getattr(settings, 'MEMORY_PROFILING_FLUSH_INTERVAL', 30):
+            self.flush()
+
+    def flush(self):
+        """Écrire les agrégats du processus dans MEMORY_PROFILING_DIR (remplacement atomique)"""
+        with self.lock:
+            self._last_flush = time.monotonic()
+            if not self.views:
+                return
+            payload = json.dumps({'pid': os.getpid(), 'updated_at': time.time(), 'views': self.views})
+        directory = settings.MEMORY_PROFILING_DIR
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'memory-{os.getpid()}.json')
+        with open(path + '.tmp', 'w') as f:
+            f.write(payload)
+        os.replace(path + '.tmp', path)
+
+
+def site_key(site):
+    return f"{site['origin'] or '?'} -> {site['allocator']}"
+
+
+def merge_sites(sites, new_sites):
+    """Cumuler des sites dans `sites` (clé -> agrégat) en gardant les MAX_SITES_PER_VIEW plus gros"""
+    for site in new_sites:
+        key = site_key(site)
+        entry = sites.setdefault(key, {
+            'origin': site['origin'], 'allocator': site['allocator'],
+            'size_total': 0, 'size_max': 0, 'count_total': 0, 'seen': 0,
+        })
+        size = site.get('size_total', site.get('size', 0))
+        entry['size_total'] += size
+        entry['size_max'] = max(entry['size_max'], site.get('size_max', size))
+        entry['count_total'] += site.get('count_total', site.get('count', 0))
+        entry['seen'] += site.get('seen', 1)
+    if len(sites) > MAX_SITES_PER_VIEW:
+        for key in sorted(sites, key=lambda key: sites[key]['size_total'])[:len(sites) - MAX_SITES_PER_VIEW]:
+            del sites[key]
+
+
+def load_profiles(directory):
+    """Fusionner les fichiers de tous les processus : nom d'URL -> agrégat"""
+    views = {}
+    if not os.path.isdir(directory):
+        return views
+    for name in sorted(os.listdir(directory)):
+        if not (name.startswith('memory-') and name.endswith('.json')):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue  # fichier en cours d'écriture ou tronqué
+        for view, entry in data.get('views', {}).items():
+            merged = views.setdefault(view, {
+                'requests': 0, 'peak_max': 0, 'peak_total': 0, 'net_total': 0,
+                'snapshots': 0, 'sites': {},
+            })
+            merged['requests'] += entry['requests']
+            merged['peak_max'] = max(merged['peak_max'], entry['peak_max'])
+            merged['peak_total'] += entry['peak_total']
+            merged['net_total'] += entry['net_total']
+            merged['snapshots'] += entry['snapshots']
+            merge_sites(merged['sites'], entry['sites'].values())
+    return views
+
+
+memory_profile = MemoryProfile()
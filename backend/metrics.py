@@ -0,0 +1,158 @@
+import bisect
+import os
+import threading
+
+# ===== MÉTRIQUES EN MÉMOIRE (FORMAT PROMETHEUS) =====
+#
+# Le registre est propre à chaque processus (worker gunicorn) et un scrape
+# n'atteint qu'un seul worker : chaque série porte le label `pid` du processus
+# qui l'expose, pour que les compteurs de workers différents restent des séries
+# distinctes au lieu de se succéder (et passer pour des remises à zéro) dans une
+# seule. Agréger côté requête : `sum without (pid) (rate(...))`.
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for name, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{name}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+class Counter:
+    """Compteur monotone avec labels"""
+    type_name = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        """(suffixe, labels, valeur) pour chaque série"""
+        for key, value in list(self._values.items()):
+            yield '', tuple(zip(self.labelnames, key)), value
+
+
+# Buckets par défaut : latences en secondes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram:
+    """Histogramme à buckets cumulés (_bucket, _sum, _count)"""
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # labels -> [compteurs par bucket, somme, total]
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def samples(self):
+        for key, (bucket_counts, total, count) in list(self._values.items()):
+            labels = tuple(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                yield '_bucket', labels + (('le', repr(float(bound))),), cumulative
+            yield '_bucket', labels + (('le', '+Inf'),), count
+            yield '_sum', labels, total
+            yield '_count', labels, count
+
+
+class Gauge:
+    """Valeurs lues au moment du scrape : collect() renvoie des paires (labels, valeur)"""
+    type_name = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def samples(self):
+        if self.collect is None:
+            return
+        for labels, value in self.collect():
+            yield '', tuple((name, labels.get(name, '')) for name in self.labelnames), value
+
+
+class MetricsRegistry:
+    """Registre des métriques du processus"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        """Exposition au format texte Prometheus (version 0.0.4)"""
+        process = (('pid', os.getpid()),)
+        lines = []
+        for metric in sorted(self._metrics.values(), key=lambda m: m.name):
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type_name}')
+            for suffix, labels, value in metric.samples():
+                lines.append(f'{metric.name}{suffix}{_format_labels(process + labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def counter(name, documentation, labelnames=()):
+    """Obtenir (ou créer) un compteur du registre"""
+    return registry.register(Counter(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=None):
+    """Obtenir (ou créer) un histogramme du registre"""
+    kwargs = {'buckets': buckets} if buckets is not None else {}
+    return registry.register(Histogram(name, documentation, labelnames, **kwargs))
+
+
+def gauge(name, documentation, labelnames=(), collect=None):
+    """Obtenir (ou créer) une jauge du registre, évaluée par collect() à chaque scrape"""
+    return registry.register(Gauge(name, documentation, labelnames, collect))
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.3 on 2026-10-19 12:48
+
+import backend.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0002_activity_notification_userstatistics_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='activity',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=backend.storage.get_media_storage, upload_to='activity_images/'),
+        ),
+        migrations.AlterField(
+            model_name='tutorialvideo',
+            name='thumbnail',
+            field=models.ImageField(blank=True, null=True, storage=backend.storage.get_media_storage, upload_to='tutorial_thumbnails/'),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='profile_picture',
+            field=models.ImageField(blank=True, null=True, storage=backend.storage.get_media_storage, upload_to='profile_pics/'),
+        ),
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('ref_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ref_count', 'updated_at'], name='backend_med_ref_cou_754560_idx')],
+            },
+        ),
+    ]
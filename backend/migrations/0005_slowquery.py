@@ -0,0 +1,39 @@
+# Generated by Django 5.2.3 on 2026-10-19 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0004_authtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=40, unique=True)),
+                ('normalized_sql', models.TextField()),
+                ('sample_sql', models.TextField(help_text='Dernière occurrence, paramètres non substitués')),
+                ('param_shapes', models.JSONField(blank=True, default=list, help_text='Types et tailles des paramètres, jamais leurs valeurs')),
+                ('view_name', models.CharField(blank=True, max_length=200)),
+                ('origin', models.CharField(blank=True, help_text='Ligne du code qui a déclenché la requête', max_length=255)),
+                ('database', models.CharField(default='default', max_length=100)),
+                ('calls', models.PositiveIntegerField(default=0)),
+                ('total_ms', models.FloatField(default=0)),
+                ('max_ms', models.FloatField(default=0)),
+                ('last_ms', models.FloatField(default=0)),
+                ('explain', models.TextField(blank=True)),
+                ('explain_analyzed', models.BooleanField(default=False)),
+                ('explained_at', models.DateTimeField(blank=True, null=True)),
+                ('first_seen', models.DateTimeField(auto_now_add=True)),
+                ('last_seen', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Slow queries',
+                'ordering': ['-total_ms'],
+            },
+        ),
+    ]
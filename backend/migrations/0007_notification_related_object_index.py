@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-19 13:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0006_group_conversations'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['related_object_id', 'notification_type'], name='backend_not_related_f886c2_idx'),
+        ),
+    ]
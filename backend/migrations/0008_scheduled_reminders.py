@@ -0,0 +1,52 @@
+# Generated by Django 5.2.3 on 2026-10-19 13:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0007_notification_related_object_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('activity', 'Activité'), ('event', 'Événement')], max_length=10)),
+                ('object_id', models.IntegerField(help_text="ID de l'activité ou de l'événement")),
+                ('lead_hours', models.PositiveIntegerField(help_text="Nombre d'heures avant le début")),
+                ('due_at', models.DateTimeField()),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('sent', 'Envoyé'), ('skipped', 'Ignoré')], default='pending', max_length=10)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['due_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['date'], name='backend_act_date_df0882_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['start_date'], name='backend_eve_start_d_0924e1_idx'),
+        ),
+        migrations.AddField(
+            model_name='scheduledreminder',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scheduled_reminders', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='scheduledreminder',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['due_at'], name='reminder_pending_due_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='scheduledreminder',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id', 'user', 'lead_hours'), name='unique_scheduled_reminder'),
+        ),
+    ]
@@ -1,6 +1,8 @@
+import secrets
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
+from .storage import get_media_storage
 
 class User(AbstractUser):
     """Modèle utilisateur personnalisé pour le site de rencontres"""
@@ -27,7 +29,7 @@ class UserProfile(models.Model):
     location = models.CharField(max_length=100, blank=True)
     interests = models.TextField(max_length=300, blank=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='offline')
-    profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
+    profile_picture = models.ImageField(upload_to='profile_pics/', storage=get_media_storage, blank=True, null=True)
     is_verified = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -71,6 +73,56 @@ class Message(models.Model):
     def __str__(self):
         return f"Message de {self.sender.username} à {self.receiver.username}"
 
+class Conversation(models.Model):
+    """Fil de discussion de groupe : créé par un membre ou rattaché à une activité"""
+    KIND_CHOICES = [
+        ('group', 'Groupe'),
+        ('activity', 'Activité'),
+    ]
+    
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default='group')
+    title = models.CharField(max_length=200)
+    activity = models.OneToOneField('Activity', on_delete=models.CASCADE, null=True, blank=True, related_name='conversation')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='created_conversations')
+    last_message = models.ForeignKey('GroupMessage', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-last_message_at']
+    
+    def __str__(self):
+        return self.title
+
+class ConversationMember(models.Model):
+    """Boîte de réception d'un membre : pointeur de lecture et compteur de non-lus"""
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='members')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversation_memberships')
+    unread_count = models.PositiveIntegerField(default=0)
+    last_read_message = models.ForeignKey('GroupMessage', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    joined_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ('conversation', 'user')
+    
+    def __str__(self):
+        return f"{self.user.username} dans {self.conversation.title} ({self.unread_count} non lus)"
+
+class GroupMessage(models.Model):
+    """Message d'un fil de groupe, stocké une seule fois quel que soit le nombre de membres"""
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='messages')
+    sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='group_messages')
+    content = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-id']
+        # Pagination par curseur : WHERE conversation_id = ? AND id < ? ORDER BY id DESC
+        indexes = [models.Index(fields=['conversation', '-id'])]
+    
+    def __str__(self):
+        return f"Message de {self.sender.username} dans {self.conversation.title}"
+
 class Event(models.Model):
     """Modèle pour l'agenda/événements"""
     EVENT_TYPE_CHOICES = [
@@ -94,6 +146,7 @@ class Event(models.Model):
     
     class Meta:
         ordering = ['start_date']
+        indexes = [models.Index(fields=['start_date'])]
     
     def __str__(self):
         return f"{self.title} - {self.start_date.strftime('%d/%m/%Y')}"
@@ -105,6 +158,7 @@ class Review(models.Model):
     comment = models.TextField()
     is_approved = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-created_at']
@@ -117,10 +171,11 @@ class TutorialVideo(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
     video_url = models.URLField()
-    thumbnail = models.ImageField(upload_to='tutorial_thumbnails/', blank=True, null=True)
+    thumbnail = models.ImageField(upload_to='tutorial_thumbnails/', storage=get_media_storage, blank=True, null=True)
     order = models.IntegerField(default=0)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['order', 'created_at']
@@ -128,6 +183,20 @@ class TutorialVideo(models.Model):
     def __str__(self):
         return self.title
 
+class ActivityQuerySet(models.QuerySet):
+    def with_participation(self, user=None):
+        """Annoter le nombre d'inscrits confirmés (et l'inscription de user) en une seule requête"""
+        qs = self.select_related('organizer').annotate(
+            confirmed_participants=models.Count('registrations', filter=models.Q(registrations__status='confirmed'))
+        )
+        if user is not None and user.is_authenticated:
+            qs = qs.annotate(user_registered=models.Exists(
+                ActivityRegistration.objects.filter(
+                    activity=models.OuterRef('pk'), user=user, status='confirmed'
+                )
+            ))
+        return qs
+
 class Activity(models.Model):
     """Modèle pour les activités Age2meet (cuisine, balade, etc.)"""
     ACTIVITY_TYPE_CHOICES = [
@@ -163,22 +232,28 @@ class Activity(models.Model):
     price = models.DecimalField(max_digits=8, decimal_places=2, default=0.00)
     difficulty = models.CharField(max_length=10, choices=DIFFICULTY_CHOICES, default='facile')
     organizer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='organized_activities')
-    image = models.ImageField(upload_to='activity_images/', blank=True, null=True)
+    image = models.ImageField(upload_to='activity_images/', storage=get_media_storage, blank=True, null=True)
     requirements = models.TextField(blank=True, help_text="Matériel nécessaire, prérequis, etc.")
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ActivityQuerySet.as_manager()
+    
     class Meta:
         ordering = ['date']
         verbose_name_plural = "Activities"
+        indexes = [models.Index(fields=['date'])]
     
     def __str__(self):
         return f"{self.title} - {self.date.strftime('%d/%m/%Y')}"
     
     @property
     def participants_count(self):
-        return self.registrations.filter(status='confirmed').count()
+        # Annotation de with_participation() si présente, sinon une requête
+        if not hasattr(self, 'confirmed_participants'):
+            self.confirmed_participants = self.registrations.filter(status='confirmed').count()
+        return self.confirmed_participants
     
     @property
     def is_full(self):
@@ -235,10 +310,13 @@ class Notification(models.Model):
     action_url = models.CharField(max_length=500, blank=True, help_text="URL pour action liée à la notification")
     related_object_id = models.IntegerField(null=True, blank=True, help_text="ID de l'objet lié (message, activité, etc.)")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     read_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         ordering = ['-created_at']
+        # Regroupement des notifications d'une même activité (backend.notifications)
+        indexes = [models.Index(fields=['related_object_id', 'notification_type'])]
     
     def __str__(self):
         return f"Notification pour {self.user.username}: {self.title}"
@@ -248,6 +326,77 @@ class Notification(models.Model):
         self.read_at = timezone.now()
         self.save()
 
+class ScheduledReminder(models.Model):
+    """Rappel à envoyer à due_at : table de travaux lue par `manage.py run_reminders`"""
+    KIND_CHOICES = [
+        ('activity', 'Activité'),
+        ('event', 'Événement'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('sent', 'Envoyé'),
+        ('skipped', 'Ignoré'),
+    ]
+    
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.IntegerField(help_text="ID de l'activité ou de l'événement")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='scheduled_reminders')
+    lead_hours = models.PositiveIntegerField(help_text="Nombre d'heures avant le début")
+    due_at = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['due_at']
+        constraints = [
+            # Un rappel par personne et par échéance : replanifier ne crée pas de doublon
+            models.UniqueConstraint(fields=['kind', 'object_id', 'user', 'lead_hours'], name='unique_scheduled_reminder'),
+        ]
+        indexes = [
+            # Parcours des rappels dus par ordre chronologique, limité aux rappels en attente
+            models.Index(fields=['due_at'], condition=models.Q(status='pending'), name='reminder_pending_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Rappel {self.kind} {self.object_id} pour {self.user_id} ({self.status})"
+
+class BackgroundTask(models.Model):
+    """Tâche différée enregistrée par une vue, exécutée par `manage.py run_tasks`"""
+    STATUS_CHOICES = [
+        ('queued', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Terminée'),
+        ('failed', 'Échouée'),
+    ]
+
+    name = models.CharField(max_length=200, help_text="Nom enregistré de la tâche (module.fonction)")
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now, help_text="Pas exécutée avant cette date (nouvel essai)")
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True, help_text="Fin du bail du worker qui l'exécute")
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['run_at']
+        indexes = [
+            # File d'attente : tâches prêtes par ordre d'échéance, limitée aux tâches en attente
+            models.Index(fields=['run_at'], condition=models.Q(status='queued'), name='task_queued_run_at_idx'),
+            # Baux expirés (worker tué pendant l'exécution)
+            models.Index(fields=['locked_until'], condition=models.Q(status='running'), name='task_running_lock_idx'),
+            models.Index(fields=['status', 'finished_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
+
 class UserStatistics(models.Model):
     """Modèle pour les statistiques utilisateur"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='statistics')
@@ -261,3 +410,83 @@ class UserStatistics(models.Model):
     
     def __str__(self):
         return f"Stats de {self.user.username}"
+
+
+class MediaBlob(models.Model):
+    """Fichier media adressé par son contenu, avec le nombre de champs qui le référencent"""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [models.Index(fields=['ref_count', 'updated_at'])]
+    
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} réf.)"
+
+
+class AuthToken(models.Model):
+    """Token d'authentification par appareil, avec expiration glissante"""
+    key = models.CharField(max_length=40, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='auth_tokens')
+    device = models.CharField(max_length=100, blank=True, help_text="Appareil ou navigateur à l'origine de la connexion")
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Token de {self.user.username} ({self.device or 'appareil inconnu'})"
+    
+    @staticmethod
+    def generate_key():
+        return secrets.token_hex(20)
+    
+    def save(self, *args, **kwargs):
+        if not self.key:
+            self.key = self.generate_key()
+        super().save(*args, **kwargs)
+    
+    @property
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+    
+    @property
+    def is_valid(self):
+        return self.revoked_at is None and not self.is_expired
+
+
+class SlowQuery(models.Model):
+    """Requête SQL lente, agrégée par empreinte du SQL normalisé"""
+    fingerprint = models.CharField(max_length=40, unique=True)
+    normalized_sql = models.TextField()
+    sample_sql = models.TextField(help_text="Dernière occurrence, paramètres non substitués")
+    param_shapes = models.JSONField(default=list, blank=True, help_text="Types et tailles des paramètres, jamais leurs valeurs")
+    view_name = models.CharField(max_length=200, blank=True)
+    origin = models.CharField(max_length=255, blank=True, help_text="Ligne du code qui a déclenché la requête")
+    database = models.CharField(max_length=100, default='default')
+    calls = models.PositiveIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    max_ms = models.FloatField(default=0)
+    last_ms = models.FloatField(default=0)
+    explain = models.TextField(blank=True)
+    explain_analyzed = models.BooleanField(default=False)
+    explained_at = models.DateTimeField(null=True, blank=True)
+    first_seen = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        ordering = ['-total_ms']
+        verbose_name_plural = "Slow queries"
+    
+    def __str__(self):
+        return f"{self.view_name or '?'} : {self.normalized_sql[:80]}"
+    
+    @property
+    def avg_ms(self):
+        return self.total_ms / self.calls if self.calls else 0.0
@@ -0,0 +1,116 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .metrics import counter
+from .models import ActivityRegistration, Notification
+
+# ===== DIFFUSION GROUPÉE DES NOTIFICATIONS =====
+#
+# Une modification ou une annulation d'activité notifie tous les inscrits
+# confirmés en quelques requêtes, quel que soit leur nombre : bulk_create par
+# lots de NOTIFICATION_BULK_BATCH_SIZE. Les modifications successives dans la
+# fenêtre NOTIFICATION_COALESCE_SECONDS sont regroupées : une notification
+# non lue de la même activité est mise à jour au lieu d'en créer une nouvelle.
+
+notifications_fanout = counter(
+    'age2meet_notifications_fanout_total', "Notifications diffusées, par type et par issue",
+    ('type', 'outcome'),
+)
+
+# Champs dont la modification concerne les participants
+ACTIVITY_NOTIFIED_FIELDS = (
+    'title', 'description', 'location', 'address', 'date', 'end_date',
+    'price', 'difficulty', 'requirements',
+)
+
+
+def participant_ids(activity):
+    """Inscrits confirmés, sans l'organisateur"""
+    return list(
+        ActivityRegistration.objects.filter(activity=activity, status='confirmed')
+        .exclude(user_id=activity.organizer_id)
+        .values_list('user_id', flat=True)
+    )
+
+
+def bulk_notify(user_ids, notification_type, **fields):
+    """Une notification par utilisateur, insérées par lots"""
+    Notification.objects.bulk_create(
+        [Notification(user_id=user_id, notification_type=notification_type, **fields) for user_id in user_ids],
+        batch_size=settings.NOTIFICATION_BULK_BATCH_SIZE,
+    )
+    notifications_fanout.inc(len(user_ids), type=notification_type, outcome='created')
+    return len(user_ids)
+
+
+def activity_updated_content(activity):
+    # Toujours l'état courant : une notification regroupée reste juste après plusieurs modifications
+    when = timezone.localtime(activity.date).strftime('%d/%m/%Y à %H:%M')
+    return {
+        'title': 'Activité modifiée',
+        'message': f'L\'activité "{activity.title}" a été modifiée : rendez-vous le {when}, {activity.location}.',
+        'related_object_id': activity.id,
+    }
+
+
+def notify_activity_updated(activity):
+    """Notifier les inscrits d'une modification ; renvoie le nombre de notifications créées"""
+    recipients = participant_ids(activity)
+    if not recipients:
+        return 0
+    content = activity_updated_content(activity)
+    window_start = timezone.now() - timedelta(seconds=settings.NOTIFICATION_COALESCE_SECONDS)
+    with transaction.atomic():
+        # Fenêtre ancrée sur la première notification : pas de report sans fin
+        pending = Notification.objects.filter(
+            notification_type='activity_updated', related_object_id=activity.id,
+            is_read=False, created_at__gte=window_start,
+        )
+        covered = set(pending.values_list('user_id', flat=True))
+        if covered:
+            pending.update(title=content['title'], message=content['message'], updated_at=timezone.now())
+            notifications_fanout.inc(len(covered), type='activity_updated', outcome='coalesced')
+        return bulk_notify([user_id for user_id in recipients if user_id not in covered], 'activity_updated', **content)
+
+
+def notify_activity_cancelled(activity):
+    """Notifier les inscrits d'une annulation ; renvoie le nombre de notifications créées"""
+    recipients = participant_ids(activity)
+    if not recipients:
+        return 0
+    with transaction.atomic():
+        # Les modifications pas encore lues n'ont plus d'objet
+        Notification.objects.filter(
+            notification_type='activity_updated', related_object_id=activity.id, is_read=False,
+        ).delete()
+        already_notified = set(Notification.objects.filter(
+            notification_type='activity_cancelled', related_object_id=activity.id,
+        ).values_list('user_id', flat=True))
+        return bulk_notify(
+            [user_id for user_id in recipients if user_id not in already_notified], 'activity_cancelled',
+            title='Activité annulée',
+            message=f'L\'activité "{activity.title}" a été annulée par son organisateur.',
+            related_object_id=activity.id,
+        )
+
+
+def activity_change_kind(activity, changed_fields):
+    """'cancelled' si l'activité vient d'être désactivée, 'updated' si un champ notifié a changé, sinon None"""
+    if 'is_active' in changed_fields and not activity.is_active:
+        return 'cancelled'
+    if activity.is_active and any(field in ACTIVITY_NOTIFIED_FIELDS for field in changed_fields):
+        return 'updated'
+    return None
+
+
+def notify_activity_change(activity, changed_fields):
+    """Annulation ou modification selon activity_change_kind ; renvoie le nombre de notifications créées"""
+    kind = activity_change_kind(activity, changed_fields)
+    if kind == 'cancelled':
+        return notify_activity_cancelled(activity)
+    if kind == 'updated':
+        return notify_activity_updated(activity)
+    return 0
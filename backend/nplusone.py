@@ -0,0 +1,110 @@
+import logging
+import os
+import sys
+import traceback
+
+
+from .metrics import counter
+from .profiling import INSTRUMENTATION_FILES, PROJECT_ROOT, query_origin
+from .slow_queries import normalize_sql, fingerprint
+
+logger = logging.getLogger(__name__)
+
+# ===== DÉTECTION DES N+1 À L'EXÉCUTION =====
+#
+# Pendant une requête HTTP (config.middleware.NPlusOneMiddleware), chaque
+# requête SQL est ramenée à sa forme normalisée et à la ligne du projet qui
+# l'a déclenchée. La même forme répétée NPLUSONE_THRESHOLD fois depuis la même
+# ligne est un N+1 : typiquement `message.sender` ou `friend.profile` dans une
+# boucle. Le chargement paresseux en cause (Message.sender, User.profile...)
+# est identifié dans la pile d'appels de Django.
+
+nplusone_detected = counter(
+    'age2meet_nplusone_detected_total', "Requêtes N+1 détectées, par vue", ('view',),
+)
+
+_RELATED_DESCRIPTORS = os.path.join('django', 'db', 'models', 'fields', 'related_descriptors.py')
+
+
+class NPlusOneError(Exception):
+    """Levée en fin de requête en mode 'raise' (développement, tests)"""
+
+
+def lazy_relation():
+    """Relation chargée paresseusement dans la pile courante ('Message.sender'), sinon None"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        if frame.f_code.co_filename.endswith(_RELATED_DESCRIPTORS):
+            descriptor = frame.f_locals.get('self')
+            field = getattr(descriptor, 'field', None)
+            related = getattr(descriptor, 'related', None)
+            if field is not None and frame.f_code.co_name == '__get__':
+                return f'{field.model.__name__}.{field.name}'
+            if related is not None and frame.f_code.co_name == '__get__':
+                return f'{related.model.__name__}.{related.get_accessor_name()}'
+            if hasattr(descriptor, 'prefetch_cache_name') and hasattr(descriptor, 'instance'):
+                return f'{type(descriptor.instance).__name__}.{descriptor.prefetch_cache_name}'
+        frame = frame.f_back
+    return None
+
+
+def project_stack():
+    """Pile d'appels limitée au code du projet (lisible dans un log)"""
+    frames = [
+        frame for frame in traceback.extract_stack(sys._getframe(2))
+        if frame.filename.startswith(PROJECT_ROOT) and 'site-packages' not in frame.filename
+        and os.path.abspath(frame.filename) not in INSTRUMENTATION_FILES
+    ]
+    return ''.join(traceback.format_list(frames)).replace(PROJECT_ROOT, '')
+
+
+class QueryShapeTracker:
+    """Wrapper d'exécution SQL qui compte les formes de requêtes par ligne d'origine"""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.counts = {}     # (origine, empreinte) -> nombre
+        self.offenders = []  # un rapport par N+1, au franchissement du seuil
+
+    def __call__(self, execute, sql, params, many, context):
+        origin = query_origin()
+        normalized = normalize_sql(sql)
+        key = (origin, fingerprint(normalized))
+        count = self.counts.get(key, 0) + 1
+        self.counts[key] = count
+        if count == self.threshold:
+            self.offenders.append({
+                'origin': origin,
+                'relation': lazy_relation(),
+                'sql': normalized,
+                'key': key,
+                'traceback': project_stack(),
+            })
+        return execute(sql, params, many, context)
+
+    def report(self):
+        """N+1 de la requête avec leur nombre final de répétitions"""
+        return [dict(offender, count=self.counts[offender['key']]) for offender in self.offenders]
+
+
+def describe(view_name, offender):
+    return (
+        f"N+1 dans {view_name} : {offender['count']} requêtes identiques depuis "
+        f"{offender['origin'] or '?'}"
+        + (f" (chargement paresseux de {offender['relation']})" if offender['relation'] else '')
+        + f"\n  SQL : {offender['sql']}\n{offender['traceback']}"
+    )
+
+
+def handle_offenders(view_name, offenders, mode):
+    """Journaliser (modes 'log' et 'sample') ou lever NPlusOneError (mode 'raise')"""
+    messages = []
+    for offender in offenders:
+        nplusone_detected.inc(view=view_name)
+        messages.append(describe(view_name, offender))
+    if not messages:
+        return
+    if mode == 'raise':
+        raise NPlusOneError('\n\n'.join(messages))
+    for message in messages:
+        logger.warning(message)
@@ -0,0 +1,24 @@
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+try:
+    import orjson
+except ImportError:  # paquet optionnel : API_JSON_BACKEND='stdlib'
+    orjson = None
+
+
+class ORJSONParser(JSONParser):
+    """JSONParser de DRF sur orjson (REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'])"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            body = stream.read()
+            # orjson ne lit que l'UTF-8
+            if encoding.lower().replace('-', '') != 'utf8':
+                body = body.decode(encoding)
+            return orjson.loads(body)
+        except (ValueError, LookupError) as exc:
+            raise ParseError(f'JSON parse error - {exc}')
@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+# ===== PRÉSENCE EN LIGNE (ÉPHÉMÈRE) =====
+#
+# La présence est entretenue par les heartbeats des clients et stockée dans le
+# cache avec une expiration : un client qui disparaît sans se déconnecter passe
+# hors ligne tout seul après PRESENCE_TTL secondes. Seuls les statuts choisis
+# explicitement ("busy", "away") sont écrits dans UserProfile.status.
+
+EXPLICIT_STATUSES = ('busy', 'away')
+
+
+def _cache():
+    return caches[getattr(settings, 'PRESENCE_CACHE_ALIAS', 'default')]
+
+
+def _key(user_id):
+    return f'presence:{user_id}'
+
+
+def heartbeat(user_id):
+    """Marquer l'utilisateur en ligne pour PRESENCE_TTL secondes"""
+    _cache().set(_key(user_id), int(time.time()), timeout=settings.PRESENCE_TTL)
+
+
+def go_offline(user_id):
+    _cache().delete(_key(user_id))
+
+
+def is_online(user_id):
+    return _cache().get(_key(user_id)) is not None
+
+
+def online_user_ids(user_ids):
+    """Utilisateurs en ligne parmi user_ids (un seul get_many)"""
+    keys = {_key(user_id): user_id for user_id in user_ids}
+    if not keys:
+        return set()
+    return {keys[key] for key in _cache().get_many(list(keys))}
+
+
+def effective_status(stored_status, online):
+    """Statut affiché : hors ligne sans heartbeat, sinon le choix explicite ou 'online'"""
+    if not online:
+        return 'offline'
+    return stored_status if stored_status in EXPLICIT_STATUSES else 'online'
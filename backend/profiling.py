@@ -0,0 +1,229 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+# ===== PROFILAGE DE REQUÊTES À LA DEMANDE =====
+#
+# Utilisé par config.middleware.RequestProfilingMiddleware : une requête est
+# exécutée sous cProfile (déterministe, précis mais coûteux) ou sous un
+# échantillonneur de pile (quelques % de surcoût, adapté à la production).
+# Chaque requête SQL est chronométrée et rattachée à la ligne du projet qui
+# l'a déclenchée. Les rapports sont conservés dans le cache pour être relus.
+
+PROFILERS = ('cprofile', 'sampling')
+
+PROJECT_ROOT = str(settings.BASE_DIR) + os.sep
+
+# Modules d'instrumentation (wrappers SQL, middlewares) : jamais l'origine d'une requête
+INSTRUMENTATION_FILES = {
+    os.path.abspath(__file__),
+    os.path.join(PROJECT_ROOT, 'config', 'middleware.py'),
+    os.path.join(PROJECT_ROOT, 'backend', 'nplusone.py'),
+    os.path.join(PROJECT_ROOT, 'backend', 'memory_profiling.py'),
+}
+
+
+def _cache():
+    return caches[getattr(settings, 'PROFILING_CACHE_ALIAS', 'default')]
+
+
+# ----- SQL -----
+
+def query_origin():
+    """Première ligne du projet (hors bibliothèques et profilage) dans la pile courante"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if (filename.startswith(PROJECT_ROOT) and filename not in INSTRUMENTATION_FILES
+                and 'site-packages' not in filename):
+            return f'{os.path.relpath(filename, PROJECT_ROOT)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+class SqlRecorder:
+    """Wrapper d'exécution SQL qui garde chaque requête, sa durée et son origine"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'ms': round((time.perf_counter() - start) * 1000, 3),
+                'origin': query_origin(),
+                'alias': context['connection'].alias,
+            })
+
+    @property
+    def total_ms(self):
+        return round(sum(query['ms'] for query in self.queries), 3)
+
+
+# ----- Échantillonneur de pile -----
+
+class StackSampler:
+    """
+    Relève la pile d'un thread toutes les `interval` secondes depuis un thread
+    voisin (sys._current_frames) : le code profilé n'est pas instrumenté.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._target = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._target = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({_short_path(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def call_tree(self, min_fraction=0.01):
+        """Arbre d'appels textuel : part des échantillons passés dans chaque appel"""
+        if not self.samples:
+            return '(aucun échantillon : requête plus courte que l\'intervalle)'
+        tree = {}
+        for stack, count in self.stacks.items():
+            node = tree
+            for frame in stack:
+                entry = node.setdefault(frame, [0, {}])
+                entry[0] += count
+                node = entry[1]
+
+        lines = [f'{self.samples} échantillons toutes les {self.interval * 1000:g} ms']
+
+        def walk(node, depth):
+            for frame, (count, children) in sorted(node.items(), key=lambda item: -item[1][0]):
+                if count / self.samples < min_fraction:
+                    continue
+                lines.append(f'{count / self.samples:6.1%}  {"  " * depth}{frame}')
+                walk(children, depth + 1)
+
+        walk(tree, 0)
+        return '\n'.join(lines)
+
+
+def _short_path(filename):
+    filename = os.path.abspath(filename)
+    if filename.startswith(PROJECT_ROOT):
+        return os.path.relpath(filename, PROJECT_ROOT)
+    marker = 'site-packages' + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    return os.path.basename(filename)
+
+
+# ----- Exécution profilée -----
+
+def profile_call(func, profiler='cprofile', limit=40):
+    """Exécuter func() sous le profileur choisi : (résultat, arbre d'appels textuel)"""
+    if profiler == 'sampling':
+        with StackSampler(getattr(settings, 'PROFILING_SAMPLE_INTERVAL', 0.005)) as sampler:
+            result = func()
+        return result, sampler.call_tree()
+
+    profile = cProfile.Profile()
+    result = profile.runcall(func)
+    stream = io.StringIO()
+    stats = pstats.Stats(profile, stream=stream)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+    return result, stream.getvalue().replace(PROJECT_ROOT, '')
+
+
+def build_report(request, response, profiler, trigger, elapsed, call_tree, recorder):
+    # DRF recopie l'utilisateur authentifié sur la requête Django
+    user = getattr(request, 'user', None)
+    return {
+        'id': uuid.uuid4().hex[:16],
+        'created_at': timezone.now().isoformat(),
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'user_id': user.pk if user is not None and user.is_authenticated else None,
+        'profiler': profiler,
+        'trigger': trigger,
+        'total_ms': round(elapsed * 1000, 3),
+        'sql': {
+            'count': len(recorder.queries),
+            'total_ms': recorder.total_ms,
+            'queries': recorder.queries,
+        },
+        'call_tree': call_tree,
+    }
+
+
+def render_text(report):
+    """Rapport lisible (réponse text/plain de ?__profile=1)"""
+    sql = report['sql']
+    lines = [
+        f"{report['method']} {report['path']} -> {report['status']}  "
+        f"{report['total_ms']:.1f} ms  ({report['profiler']}, id {report['id']})",
+        f"SQL : {sql['count']} requêtes, {sql['total_ms']:.1f} ms",
+        '',
+    ]
+    for index, query in enumerate(sql['queries'], 1):
+        lines.append(f"{index:>3}. {query['ms']:8.2f} ms  {query['origin'] or '?'}")
+        lines.append(f"      {query['sql']}")
+    lines += ['', report['call_tree']]
+    return '\n'.join(lines) + '\n'
+
+
+# ----- Stockage -----
+
+INDEX_KEY = 'profiling:index'
+
+
+def store_report(report):
+    """Conserver un rapport (PROFILING_STORE_TTL secondes, PROFILING_STORE_SIZE derniers)"""
+    cache = _cache()
+    ttl = getattr(settings, 'PROFILING_STORE_TTL', 3600)
+    size = getattr(settings, 'PROFILING_STORE_SIZE', 50)
+    cache.set(f"profiling:{report['id']}", report, timeout=ttl)
+    summary = {key: report[key] for key in ('id', 'created_at', 'method', 'path', 'status',
+                                            'user_id', 'profiler', 'trigger', 'total_ms')}
+    summary['sql_count'] = report['sql']['count']
+    summary['sql_ms'] = report['sql']['total_ms']
+    # Index approximatif : deux workers simultanés peuvent perdre une entrée, pas un rapport
+    index = [entry for entry in cache.get(INDEX_KEY, []) if entry['id'] != report['id']]
+    cache.set(INDEX_KEY, ([summary] + index)[:size], timeout=ttl)
+
+
+def get_report(report_id):
+    return _cache().get(f'profiling:{report_id}')
+
+
+def recent_reports():
+    return _cache().get(INDEX_KEY, [])
@@ -0,0 +1,190 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .metrics import counter
+from .models import Activity, ActivityRegistration, Event, Notification, ScheduledReminder
+
+# ===== RAPPELS D'ACTIVITÉS ET D'ÉVÉNEMENTS =====
+#
+# Deux étapes, exécutées par `python manage.py run_reminders` :
+#   plan()         crée une ligne ScheduledReminder par participant et par
+#                  échéance (REMINDER_LEAD_HOURS avant le début) pour ce qui
+#                  commence bientôt ; la contrainte d'unicité rend l'opération
+#                  idempotente et une date déplacée met à jour l'échéance.
+#   process_due()  lit les rappels échus par l'index partiel (status, due_at)
+#                  par lots, vérifie l'état courant (annulation, désinscription,
+#                  date déplacée) et crée les notifications dans la même
+#                  transaction que le passage à 'sent' : un redémarrage ne
+#                  renvoie ni ne perd rien. Sur PostgreSQL, SKIP LOCKED répartit
+#                  les lots entre plusieurs workers ; SQLite sérialise les
+#                  écritures et le lot perdant est simplement rejoué.
+
+reminders_processed = counter(
+    'age2meet_reminders_total', "Rappels traités, par type et par issue", ('kind', 'outcome'),
+)
+
+REMINDER_TYPES = {'activity': 'activity_reminder', 'event': 'event_reminder'}
+
+
+def _lead_hours():
+    return sorted(set(settings.REMINDER_LEAD_HOURS), reverse=True)
+
+
+def upcoming_participants(now, horizon):
+    """(type, id, user_id, début) de tous les participants de ce qui commence avant horizon"""
+    yield from (
+        ('activity', activity_id, user_id, start)
+        for activity_id, user_id, start in ActivityRegistration.objects.filter(
+            status='confirmed', activity__is_active=True,
+            activity__date__gt=now, activity__date__lte=horizon,
+        ).values_list('activity_id', 'user_id', 'activity__date').iterator()
+    )
+    yield from (
+        ('activity', activity_id, organizer_id, start)
+        for activity_id, organizer_id, start in Activity.objects.filter(
+            is_active=True, date__gt=now, date__lte=horizon,
+        ).values_list('id', 'organizer_id', 'date').iterator()
+    )
+    yield from (
+        ('event', event_id, user_id, start)
+        for event_id, user_id, start in Event.objects.filter(
+            start_date__gt=now, start_date__lte=horizon,
+        ).values_list('id', 'user_id', 'start_date').iterator()
+    )
+    yield from (
+        ('event', event_id, user_id, start)
+        for event_id, user_id, start in Event.attendees.through.objects.filter(
+            event__start_date__gt=now, event__start_date__lte=horizon,
+        ).values_list('event_id', 'user_id', 'event__start_date').iterator()
+    )
+
+
+def plan(now=None, batch_size=None):
+    """Créer (ou replanifier) les rappels de ce qui commence dans les prochaines heures"""
+    now = now or timezone.now()
+    batch_size = batch_size or settings.REMINDER_BATCH_SIZE
+    leads = _lead_hours()
+    # Une inscription tardive n'a pas le rappel de la veille, seulement les suivants
+    grace = timedelta(minutes=settings.REMINDER_GRACE_MINUTES)
+    # Tout ce dont un rappel peut échoir avant la prochaine planification
+    horizon = now + timedelta(hours=leads[0], seconds=settings.REMINDER_PLAN_INTERVAL) + grace
+
+    planned = 0
+    # Clé unique -> rappel : un organisateur inscrit à sa propre activité n'apparaît
+    # qu'une fois par lot (PostgreSQL refuse deux conflits sur la même ligne)
+    batch = {}
+    for kind, object_id, user_id, start in upcoming_participants(now, horizon):
+        for lead in leads:
+            due_at = start - timedelta(hours=lead)
+            if due_at < now - grace:
+                continue
+            batch[kind, object_id, user_id, lead] = ScheduledReminder(
+                kind=kind, object_id=object_id, user_id=user_id, lead_hours=lead, due_at=due_at,
+            )
+        if len(batch) >= batch_size:
+            planned += _save_plan(batch.values())
+            batch = {}
+    if batch:
+        planned += _save_plan(batch.values())
+    return planned
+
+
+def _save_plan(reminders):
+    # Déjà planifié : seule l'échéance est mise à jour (date de l'activité déplacée)
+    reminders = list(reminders)
+    ScheduledReminder.objects.bulk_create(
+        reminders, update_conflicts=True,
+        unique_fields=['kind', 'object_id', 'user', 'lead_hours'], update_fields=['due_at'],
+    )
+    return len(reminders)
+
+
+def _current_state(reminders):
+    """{(type, id): début} des objets encore valides et {(type, id, user_id)} des participants actuels"""
+    activity_ids = {reminder.object_id for reminder in reminders if reminder.kind == 'activity'}
+    event_ids = {reminder.object_id for reminder in reminders if reminder.kind == 'event'}
+    starts, titles, participants = {}, {}, set()
+
+    if activity_ids:
+        for activity in Activity.objects.filter(id__in=activity_ids, is_active=True).only(
+                'id', 'title', 'location', 'date', 'organizer_id'):
+            starts['activity', activity.id] = activity.date
+            titles['activity', activity.id] = (activity.title, activity.location)
+            participants.add(('activity', activity.id, activity.organizer_id))
+        participants.update(
+            ('activity', activity_id, user_id)
+            for activity_id, user_id in ActivityRegistration.objects.filter(
+                activity_id__in=activity_ids, status='confirmed',
+            ).values_list('activity_id', 'user_id')
+        )
+    if event_ids:
+        for event in Event.objects.filter(id__in=event_ids).only('id', 'title', 'location', 'start_date', 'user_id'):
+            starts['event', event.id] = event.start_date
+            titles['event', event.id] = (event.title, event.location)
+            participants.add(('event', event.id, event.user_id))
+        participants.update(
+            ('event', event_id, user_id)
+            for event_id, user_id in Event.attendees.through.objects.filter(
+                event_id__in=event_ids,
+            ).values_list('event_id', 'user_id')
+        )
+    return starts, titles, participants
+
+
+def reminder_notification(reminder, start, title, location):
+    when = timezone.localtime(start).strftime('%d/%m/%Y à %H:%M')
+    what = 'Votre activité' if reminder.kind == 'activity' else 'Votre événement'
+    place = f' ({location})' if location else ''
+    return Notification(
+        user_id=reminder.user_id,
+        notification_type=REMINDER_TYPES[reminder.kind],
+        title=f'Rappel : {title}',
+        message=f'{what} "{title}" commence le {when}{place}.',
+        related_object_id=reminder.object_id,
+    )
+
+
+def process_due(now=None, batch_size=None):
+    """Envoyer un lot de rappels échus ; renvoie le nombre de rappels traités"""
+    now = now or timezone.now()
+    batch_size = batch_size or settings.REMINDER_BATCH_SIZE
+    with transaction.atomic():
+        reminders = list(
+            ScheduledReminder.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', due_at__lte=now)
+            .order_by('due_at')[:batch_size]
+        )
+        if not reminders:
+            return 0
+
+        starts, titles, participants = _current_state(reminders)
+        leads = _lead_hours()
+        notifications = []
+        for reminder in reminders:
+            key = (reminder.kind, reminder.object_id)
+            start = starts.get(key)
+            if start is None or start <= now or (*key, reminder.user_id) not in participants:
+                # Annulé, déjà commencé ou participant désinscrit
+                reminder.status = 'skipped'
+                outcome = 'skipped'
+            elif any(lead < reminder.lead_hours and start - timedelta(hours=lead) <= now for lead in leads):
+                # Worker arrêté un moment : seul le rappel le plus proche du début est envoyé
+                reminder.status = 'skipped'
+                outcome = 'superseded'
+            elif start - timedelta(hours=reminder.lead_hours) > now:
+                # Date repoussée depuis la planification : nouvelle échéance
+                reminder.due_at = start - timedelta(hours=reminder.lead_hours)
+                outcome = 'rescheduled'
+            else:
+                notifications.append(reminder_notification(reminder, start, *titles[key]))
+                reminder.status = 'sent'
+                reminder.sent_at = now
+                outcome = 'sent'
+            reminders_processed.inc(kind=reminder.kind, outcome=outcome)
+
+        Notification.objects.bulk_create(notifications, batch_size=settings.NOTIFICATION_BULK_BATCH_SIZE)
+        ScheduledReminder.objects.bulk_update(reminders, ['status', 'sent_at', 'due_at'])
+    return len(reminders)
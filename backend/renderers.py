@@ -0,0 +1,39 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # paquet optionnel : API_JSON_BACKEND='stdlib'
+    orjson = None
+
+# ===== RENDU JSON RAPIDE (orjson) =====
+#
+# Choisi par API_JSON_BACKEND (REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES']).
+# orjson sérialise nativement dict, list (ReturnDict/ReturnList des
+# serializers compris), datetime, date, time et UUID : les vues peuvent
+# renvoyer les datetimes tels quels, sans .isoformat(). Les autres types
+# (Decimal, timedelta, chaînes traduites, QuerySet...) passent par le
+# JSONEncoder de DRF : même sortie que JSONRenderer.
+# Benchmark par endpoint : python manage.py benchmark_json
+
+_fallback = JSONEncoder().default
+
+
+def default(obj):
+    """Types non gérés par orjson : conversion du JSONEncoder de DRF (Decimal -> float...)"""
+    return _fallback(obj)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer de DRF sur orjson (UTF-8, datetimes UTC en 'Z' comme DRF)"""
+
+    options = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        options = self.options
+        # API navigable ou `Accept: application/json; indent=4` : orjson n'indente que sur 2 espaces
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            options |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=default, option=options)
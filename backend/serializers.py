@@ -175,6 +175,8 @@ class ActivitySerializer(serializers.ModelSerializer):
     
     def get_is_registered(self, obj):
         """Vérifier si l'utilisateur actuel est inscrit à cette activité"""
+        if hasattr(obj, 'user_registered'):
+            return obj.user_registered
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return ActivityRegistration.objects.filter(
@@ -0,0 +1,99 @@
+from django.apps import apps
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from . import conversations
+from .authentication import token_cache
+from .db_pool import connections_opened
+from .models import AuthToken, ActivityRegistration
+from .storage import TRACKED_IMAGE_FIELDS, adjust_ref_count, file_name
+
+# ===== COMPTEURS DE RÉFÉRENCES MEDIA =====
+
+def _tracked_fields_by_model():
+    """{modèle: [champs ImageField suivis]}"""
+    fields_by_model = {}
+    for app_label, model_name, field_name in TRACKED_IMAGE_FIELDS:
+        model = apps.get_model(app_label, model_name)
+        fields_by_model.setdefault(model, []).append(field_name)
+    return fields_by_model
+
+
+def _make_media_receivers(field_names):
+    def remember_media_names(sender, instance, **kwargs):
+        """Mémoriser les noms chargés depuis la base (sans déclencher de requête)"""
+        # Un champ différé vaut None : inconnu, il ne sera pas réécrit par save()
+        instance._media_names = {
+            field: file_name(instance.__dict__[field]) if field in instance.__dict__ else None
+            for field in field_names
+        }
+
+    def update_media_refs(sender, instance, created, update_fields=None, **kwargs):
+        """Incrémenter le nouveau fichier et décrémenter l'ancien"""
+        previous = getattr(instance, '_media_names', {})
+        for field in field_names:
+            if update_fields is not None and field not in update_fields:
+                continue
+            old_name = '' if created else previous.get(field)
+            if old_name is None:
+                continue
+            new_name = file_name(getattr(instance, field))
+            if new_name != old_name:
+                adjust_ref_count(new_name, 1)
+                adjust_ref_count(old_name, -1)
+                previous[field] = new_name
+        instance._media_names = previous
+
+    def release_media_refs(sender, instance, **kwargs):
+        """Libérer les références d'une instance supprimée"""
+        for field in field_names:
+            adjust_ref_count(file_name(instance.__dict__.get(field)), -1)
+
+    return remember_media_names, update_media_refs, release_media_refs
+
+
+def connect_media_refcounts():
+    for model, field_names in _tracked_fields_by_model().items():
+        remember, update, release = _make_media_receivers(field_names)
+        uid = f'media_refs_{model._meta.label_lower}'
+        post_init.connect(remember, sender=model, weak=False, dispatch_uid=uid)
+        post_save.connect(update, sender=model, weak=False, dispatch_uid=uid)
+        post_delete.connect(release, sender=model, weak=False, dispatch_uid=uid)
+
+
+connect_media_refcounts()
+
+
+# ===== INVALIDATION DU CACHE DES TOKENS =====
+
+@receiver(post_delete, sender=AuthToken, dispatch_uid='token_cache_delete')
+def invalidate_deleted_token(sender, instance, **kwargs):
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL, dispatch_uid='token_cache_user_save')
+def invalidate_user_tokens(sender, instance, **kwargs):
+    # is_active, mot de passe ou nom modifiés : recharger l'utilisateur au prochain appel
+    token_cache.invalidate_user(instance.pk)
+
+
+# ===== MEMBRES DES FILS D'ACTIVITÉ =====
+
+@receiver(post_save, sender=ActivityRegistration, dispatch_uid='activity_conversation_sync')
+def sync_activity_conversation(sender, instance, **kwargs):
+    conversations.sync_activity_member(instance)
+
+
+@receiver(post_delete, sender=ActivityRegistration, dispatch_uid='activity_conversation_leave')
+def leave_activity_conversation(sender, instance, **kwargs):
+    conversations.remove_activity_member(instance)
+
+
+# ===== CONNEXIONS À LA BASE =====
+
+@receiver(connection_created, dispatch_uid='db_connection_opened')
+def count_opened_connection(sender, connection, **kwargs):
+    # Une connexion persistante n'est comptée qu'à sa création, une connexion de pool à chaque emprunt
+    connections_opened.inc(database=connection.alias)
@@ -0,0 +1,172 @@
+import hashlib
+import logging
+import queue
+import re
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, connections
+from django.db.models import F, Q, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .metrics import counter
+
+logger = logging.getLogger(__name__)
+
+# ===== JOURNAL DES REQUÊTES LENTES =====
+#
+# Les requêtes au-delà de SLOW_QUERY_THRESHOLD_MS sont repérées pendant la
+# requête HTTP (config.middleware.SlowQueryLogMiddleware) puis confiées à un
+# thread d'arrière-plan qui agrège par empreinte et capture l'EXPLAIN : la
+# requête HTTP ne paie ni l'EXPLAIN ni l'écriture en base.
+
+slow_queries_total = counter(
+    'age2meet_slow_queries_total', "Requêtes SQL lentes détectées, par vue", ('view',),
+)
+slow_queries_dropped = counter(
+    'age2meet_slow_queries_dropped_total', "Requêtes lentes ignorées (file d'attente pleine)",
+)
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACES_RE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """SQL sans valeurs : littéraux et paramètres -> ?, listes IN (?, ?, ...) -> (...)"""
+    sql = sql.replace('%s', '?')
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _PLACEHOLDER_LIST_RE.sub('(...)', sql)
+    return _SPACES_RE.sub(' ', sql).strip()
+
+
+def fingerprint(normalized_sql):
+    return hashlib.sha1(normalized_sql.encode()).hexdigest()
+
+
+def param_shape(value):
+    """Type (et taille) d'un paramètre, sans sa valeur"""
+    if value is None:
+        return 'null'
+    if isinstance(value, (str, bytes, list, tuple)):
+        return f'{type(value).__name__}[{len(value)}]'
+    return type(value).__name__
+
+
+def param_shapes(params, many=False):
+    if params is None:
+        return []
+    if many:
+        # executemany : forme de la première ligne et nombre de lignes
+        params = list(params)
+        return [f'{len(params)} lignes'] + (param_shapes(params[0]) if params else [])
+    if isinstance(params, dict):
+        return {name: param_shape(value) for name, value in params.items()}
+    return [param_shape(value) for value in params]
+
+
+class SlowQueryLog:
+    """File bornée + thread d'arrière-plan qui agrège les requêtes lentes et capture l'EXPLAIN"""
+
+    def __init__(self, max_pending=1000):
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, entry):
+        """Appelé pendant la requête HTTP : ne bloque jamais"""
+        slow_queries_total.inc(view=entry['view_name'])
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            slow_queries_dropped.inc()
+
+    def flush(self):
+        """Attendre le traitement des entrées en attente (tests, arrêt du worker)"""
+        self._queue.join()
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='slow-query-log', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            entry = self._queue.get()
+            try:
+                close_old_connections()
+                record(entry)
+            except Exception:
+                logger.exception("Impossible d'enregistrer la requête lente %s", entry['fingerprint'])
+            finally:
+                self._queue.task_done()
+
+
+def record(entry):
+    """Agréger une occurrence et capturer l'EXPLAIN si besoin (thread d'arrière-plan)"""
+    from .models import SlowQuery
+
+    now = timezone.now()
+    latest = {
+        'sample_sql': entry['sql'],
+        'param_shapes': entry['param_shapes'],
+        'view_name': entry['view_name'],
+        'origin': entry['origin'] or '',
+        'database': entry['alias'],
+        'last_ms': entry['ms'],
+        'last_seen': now,
+    }
+    aggregate = {
+        'calls': F('calls') + 1,
+        'total_ms': F('total_ms') + entry['ms'],
+        'max_ms': Greatest('max_ms', Value(entry['ms'])),
+    }
+    queryset = SlowQuery.objects.filter(fingerprint=entry['fingerprint'])
+    if not queryset.update(**latest, **aggregate):
+        try:
+            SlowQuery.objects.create(
+                fingerprint=entry['fingerprint'], normalized_sql=entry['normalized_sql'],
+                calls=1, total_ms=entry['ms'], max_ms=entry['ms'], **latest,
+            )
+        except IntegrityError:
+            # Un autre worker a créé l'entrée entre-temps
+            queryset.update(**latest, **aggregate)
+
+    if entry['params_for_explain'] is None:
+        return
+    # Un plan par empreinte, rafraîchi au plus toutes les SLOW_QUERY_EXPLAIN_INTERVAL secondes
+    refresh_after = now - timedelta(seconds=settings.SLOW_QUERY_EXPLAIN_INTERVAL)
+    if queryset.filter(Q(explained_at__isnull=True) | Q(explained_at__lt=refresh_after)).exists():
+        plan, analyzed = explain(entry)
+        queryset.update(explain=plan, explain_analyzed=analyzed, explained_at=now)
+
+
+def explain(entry):
+    """EXPLAIN (ANALYZE si SLOW_QUERY_EXPLAIN_ANALYZE, sur PostgreSQL) : (plan, analysé)"""
+    connection = connections[entry['alias']]
+    analyze = settings.SLOW_QUERY_EXPLAIN_ANALYZE
+    try:
+        prefix = connection.ops.explain_query_prefix(analyze=True) if analyze else None
+    except ValueError:
+        # Option non gérée par ce moteur (SQLite) : EXPLAIN simple
+        prefix = None
+        analyze = False
+    if prefix is None:
+        prefix = connection.ops.explain_query_prefix()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"{prefix} {entry['sql']}", entry['params_for_explain'])
+            rows = cursor.fetchall()
+    except DatabaseError as e:
+        return f'EXPLAIN impossible : {e}', False
+    return '\n'.join(' '.join(str(column) for column in row) for row in rows), analyze
+
+
+slow_query_log = SlowQueryLog(max_pending=getattr(settings, 'SLOW_QUERY_QUEUE_SIZE', 1000))
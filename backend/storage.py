@@ -0,0 +1,111 @@
+import hashlib
+import os
+import re
+import uuid
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+# ===== STOCKAGE MEDIA ADRESSÉ PAR LE CONTENU =====
+
+# Champs ImageField dont les fichiers sont comptés (app_label, modèle, champ)
+TRACKED_IMAGE_FIELDS = (
+    ('backend', 'UserProfile', 'profile_picture'),
+    ('backend', 'Activity', 'image'),
+    ('backend', 'TutorialVideo', 'thumbnail'),
+)
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+# <dossier>/<2 premiers caractères>/<sha256>.<ext>
+CONTENT_ADDRESSED_NAME_RE = re.compile(r'(?:^|/)[0-9a-f]{2}/[0-9a-f]{64}(?:\.[A-Za-z0-9]+)?$')
+
+
+def is_content_addressed(name):
+    """Indique si un nom de fichier a été produit par ContentAddressedStorage"""
+    return bool(name) and CONTENT_ADDRESSED_NAME_RE.search(name) is not None
+
+
+def file_name(value):
+    """Nom stocké d'une valeur de FileField (FieldFile, str ou None)"""
+    return getattr(value, 'name', value) or ''
+
+
+def adjust_ref_count(name, delta):
+    """Ajuster le compteur de références d'un fichier (sans effet si inconnu)"""
+    if not name or not delta:
+        return 0
+    MediaBlob = apps.get_model('backend', 'MediaBlob')
+    return MediaBlob.objects.filter(name=name).update(ref_count=F('ref_count') + delta)
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stockage qui nomme chaque fichier par le SHA-256 de son contenu.
+    Un contenu déjà présent n'est jamais réécrit : le fichier existant est réutilisé.
+    """
+
+    def content_hash(self, content):
+        """Calculer le SHA-256 du contenu par blocs"""
+        digest = hashlib.sha256()
+        for chunk in content.chunks(HASH_CHUNK_SIZE):
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            digest.update(chunk)
+        content.seek(0)
+        return digest.hexdigest()
+
+    def hashed_name(self, name, digest):
+        """profile_pics/photo.JPG -> profile_pics/ab/abcd....jpg"""
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, digest[:2], digest + extension).replace('\\', '/')
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, self.content_hash(content))
+
+        # Déduplication : le même contenu est déjà sur le disque
+        reused = self.exists(name)
+        if reused:
+            self.touch(name)
+        else:
+            # Écrit sous un nom temporaire puis lié sous le nom définitif : le fichier n'apparaît
+            # que complet, et si un upload concurrent du même contenu l'a lié entre-temps
+            # (FileExistsError), son fichier est réutilisé au lieu d'une copie suffixée
+            temporary = super()._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+            try:
+                os.link(self.path(temporary), self.path(name))
+            except FileExistsError:
+                reused = True
+                self.touch(name)
+            finally:
+                os.remove(self.path(temporary))
+
+        # Un fichier réutilisé repart pour un délai de grâce complet de sweep_media
+        # (updated_at), le temps que le modèle qui l'attend soit enregistré
+        MediaBlob = apps.get_model('backend', 'MediaBlob')
+        blobs = MediaBlob.objects.filter(name=name)
+        if not (reused and blobs.update(updated_at=timezone.now())):
+            blob, created = MediaBlob.objects.get_or_create(name=name, defaults={'size': content.size or 0})
+            if not created:
+                blobs.update(updated_at=timezone.now())
+        return name
+
+    def touch(self, name):
+        """Rajeunir un fichier réutilisé (date de modification, repli de sweep_media sans MediaBlob)"""
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            pass
+
+
+media_storage = ContentAddressedStorage()
+
+
+def get_media_storage():
+    """Stockage utilisé par les ImageField suivis (référencé par les migrations)"""
+    return media_storage
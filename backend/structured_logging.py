@@ -0,0 +1,227 @@
+import atexit
+import contextvars
+import json
+import logging
+import multiprocessing.util
+import os
+import queue
+import re
+import sys
+import time
+import uuid
+import weakref
+import zlib
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from .metrics import counter
+
+# ===== JOURNALISATION STRUCTURÉE NON BLOQUANTE =====
+#
+# Le thread de la requête ne fait que filtrer l'enregistrement et le mettre en
+# file : la sérialisation JSON et l'écriture sur stdout se font dans le thread
+# d'un QueueListener. Chaque ligne porte l'identifiant de la requête HTTP
+# (en-tête X-Request-ID, repris du proxy ou généré), ce qui permet de suivre
+# une requête à travers tous les loggers. Configuration : LOGGING dans settings.
+
+log_records_dropped = counter(
+    'age2meet_log_records_dropped_total', "Enregistrements de log perdus (file pleine)",
+)
+
+# ----- Contexte de requête -----
+
+request_id_var = contextvars.ContextVar('request_id', default=None)
+request_method_var = contextvars.ContextVar('request_method', default=None)
+request_path_var = contextvars.ContextVar('request_path', default=None)
+
+REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+def new_request_id(incoming=None):
+    """Reprendre l'identifiant fourni par le proxy s'il est sûr, sinon en générer un"""
+    if incoming and REQUEST_ID_RE.match(incoming):
+        return incoming
+    return uuid.uuid4().hex
+
+
+def bind_request(request_id, method, path):
+    """Associer le contexte de requête au thread courant ; renvoie de quoi le retirer"""
+    return (
+        request_id_var.set(request_id),
+        request_method_var.set(method),
+        request_path_var.set(path),
+    )
+
+
+def unbind_request(tokens):
+    for var, token in zip((request_id_var, request_method_var, request_path_var), tokens):
+        var.reset(token)
+
+
+# ----- Filtres -----
+
+class RequestContextFilter(logging.Filter):
+    """Ajoute request_id, method et path à l'enregistrement (dans le thread de la requête)"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        record.method = request_method_var.get()
+        record.path = request_path_var.get()
+        # django.request journalise après la sortie des middlewares, avec extra={'request': ...}
+        request = getattr(record, 'request', None)
+        if record.request_id is None and request is not None:
+            record.request_id = getattr(request, 'id', None)
+            record.method = request.method
+            record.path = request.path
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Garde une fraction des enregistrements par niveau, ex. {'DEBUG': 0.1}.
+    L'échantillonnage se fait par requête : une requête retenue garde tous ses
+    logs. WARNING et au-delà sont toujours conservés.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = {logging.getLevelName(level): float(rate) for level, rate in (rates or {}).items()}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.levelno, 1.0)
+        if rate >= 1.0:
+            return True
+        if rate <= 0.0:
+            return False
+        key = getattr(record, 'request_id', None) or request_id_var.get() or uuid.uuid4().hex
+        return zlib.crc32(key.encode()) / 0xFFFFFFFF < rate
+
+
+# ----- Formatage -----
+
+# Attributs standard d'un LogRecord : tout le reste vient de extra={...}
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id', 'method', 'path', 'request'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Une ligne JSON par enregistrement"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key in ('request_id', 'method', 'path'):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Format lisible pour le développement, avec l'identifiant de requête"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+    def format(self, record):
+        if getattr(record, 'request_id', None) is None:
+            record.request_id = '-'
+        return super().format(record)
+
+
+# ----- Handler -----
+
+class BackgroundQueueHandler(QueueHandler):
+    """
+    Met les enregistrements dans une file bornée ; un QueueListener les formate
+    et les écrit sur `stream`. Si la file est pleine, l'enregistrement est
+    perdu (et compté) plutôt que de bloquer la requête.
+
+    Le thread du listener n'existe que dans le processus qui l'a démarré : après
+    un fork (workers de run_tasks, gunicorn --preload), le processus enfant
+    repart avec une file et un listener neufs (os.register_at_fork).
+    """
+
+    # Au plus une alerte sur stderr par intervalle quand des enregistrements sont perdus
+    drop_report_interval = 10.0
+
+    def __init__(self, stream=None, format='json', queue_size=10000):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.queue_size = queue_size
+        self.target = logging.StreamHandler(stream)
+        self.target.setFormatter(JsonFormatter() if format == 'json' else TextFormatter())
+        self._dropped = 0
+        self._drop_reported_at = 0.0
+        self.start_listener()
+        _handlers.add(self)
+        atexit.register(self.stop_listener)
+        # Un processus multiprocessing se termine par os._exit, sans atexit : vider la file avant
+        multiprocessing.util.register_after_fork(self, BackgroundQueueHandler.flush_at_process_exit)
+
+    def start_listener(self):
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+
+    def after_fork(self):
+        """Processus enfant : la file héritée peut être verrouillée et personne ne la lit"""
+        self.queue = queue.Queue(maxsize=self.queue_size)
+        self._dropped = 0
+        self.start_listener()
+
+    def flush_at_process_exit(self):
+        multiprocessing.util.Finalize(self, self.stop_listener, exitpriority=0)
+
+    def prepare(self, record):
+        # Seulement ce qui doit être figé dans ce thread : le message (les arguments
+        # peuvent être modifiés ensuite). JSON et traceback sont faits par le listener.
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_records_dropped.inc()
+            self._dropped += 1
+            now = time.monotonic()
+            if now - self._drop_reported_at >= self.drop_report_interval:
+                # Hors de la file (pleine) : directement sur stderr, sans passer par logging
+                dropped, self._dropped, self._drop_reported_at = self._dropped, 0, now
+                sys.stderr.write(
+                    f'{dropped} enregistrements de log perdus (file pleine, LOG_QUEUE_SIZE={self.queue_size}, '
+                    f'processus {os.getpid()})\n'
+                )
+
+    def stop_listener(self):
+        """Vider la file puis arrêter le thread d'écriture (idempotent)"""
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def close(self):
+        self.stop_listener()
+        super().close()
+
+
+_handlers = weakref.WeakSet()
+
+
+def _restart_listeners():
+    for handler in list(_handlers):
+        handler.after_fork()
+
+
+os.register_at_fork(after_in_child=_restart_listeners)
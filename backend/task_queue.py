@@ -0,0 +1,222 @@
+import json
+import logging
+import os
+import random
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .metrics import counter, histogram
+from .models import BackgroundTask
+
+# ===== FILE DE TÂCHES EN BASE =====
+#
+# Les vues confient leurs effets de bord non essentiels à la réponse
+# (notifications, diffusions) à une table BackgroundTask au lieu de les
+# exécuter pendant la requête :
+#   enqueue()        insère la tâche par transaction.on_commit : rien n'est mis
+#                    en file si la transaction de la vue est annulée, et un
+#                    worker ne peut pas lire la tâche avant les données qu'elle
+#                    concerne.
+#   claim()          réserve un lot de tâches prêtes (index partiel sur run_at)
+#                    avec un bail de TASK_LEASE_SECONDS ; SKIP LOCKED sur
+#                    PostgreSQL, écritures sérialisées sur SQLite, et un UPDATE
+#                    conditionnel garantit qu'une tâche n'a qu'un seul worker.
+#   execute()        exécute la fonction dans la même transaction que le passage
+#                    à 'done' : un échec annule ses écritures, puis la tâche est
+#                    replanifiée avec un délai exponentiel (avec gigue) jusqu'à
+#                    max_attempts, et reste ensuite en 'failed' pour l'admin.
+#   requeue_expired() remet en file les tâches dont le worker est mort.
+#
+# Les workers sont lancés par `python manage.py run_tasks` (pool de processus) ;
+# les fonctions sont déclarées avec @task dans les modules `tasks` des applications.
+
+logger = logging.getLogger(__name__)
+
+tasks_processed = counter(
+    'age2meet_tasks_total', "Tâches de fond traitées, par tâche et par issue", ('task', 'outcome'),
+)
+task_duration = histogram(
+    'age2meet_task_duration_seconds', "Durée d'exécution des tâches de fond", ('task',),
+)
+
+# Nom -> Task, rempli à l'import des modules `tasks`
+registry = {}
+
+
+class LeaseLost(Exception):
+    """Bail expiré pendant l'exécution : la tâche a été reprise par un autre worker"""
+
+
+class Task:
+    """Fonction enregistrée : appelable directement, ou mise en file avec .enqueue()"""
+
+    def __init__(self, func, name, max_attempts=None):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, *args, **kwargs):
+        return enqueue(self.name, args, kwargs, max_attempts=self.max_attempts)
+
+    def __repr__(self):
+        return f'<Task {self.name}>'
+
+
+def task(func=None, *, name=None, max_attempts=None):
+    """Déclarer une tâche de fond : @task ou @task(max_attempts=3)"""
+    def register(func):
+        registered = Task(func, name or f'{func.__module__}.{func.__qualname__}', max_attempts)
+        registry[registered.name] = registered
+        return registered
+    return register(func) if func is not None else register
+
+
+def enqueue(name, args=(), kwargs=None, delay=0, max_attempts=None):
+    """Mettre une tâche en file après le commit de la transaction courante"""
+    if name not in registry:
+        raise LookupError(f'Tâche inconnue : {name}')
+    args, kwargs = list(args), dict(kwargs or {})
+    # Erreur de sérialisation levée dans la vue, pas après le commit
+    json.dumps([args, kwargs])
+
+    def insert():
+        BackgroundTask.objects.create(
+            name=name, args=args, kwargs=kwargs,
+            max_attempts=max_attempts or settings.TASK_MAX_ATTEMPTS,
+            run_at=timezone.now() + timedelta(seconds=delay),
+        )
+        tasks_processed.inc(task=name, outcome='queued')
+
+    transaction.on_commit(insert)
+
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'[:100]
+
+
+def retry_delay(attempts):
+    """Délai avant le nouvel essai : exponentiel, plafonné, avec gigue"""
+    delay = min(settings.TASK_RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0), settings.TASK_RETRY_MAX_DELAY)
+    return random.uniform(delay / 2, delay)
+
+
+def claim(worker, batch_size=None, now=None):
+    """Réserver un lot de tâches prêtes pour ce worker ; le bail couvre tout le lot"""
+    now = now or timezone.now()
+    batch_size = batch_size or settings.TASK_BATCH_SIZE
+    with transaction.atomic():
+        ids = list(
+            BackgroundTask.objects.select_for_update(skip_locked=True)
+            .filter(status='queued', run_at__lte=now)
+            .order_by('run_at').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+        # Conditionnel : une tâche prise entre-temps par un autre worker n'est pas reprise
+        BackgroundTask.objects.filter(id__in=ids, status='queued').update(
+            status='running', locked_by=worker, attempts=F('attempts') + 1,
+            locked_until=now + timedelta(seconds=settings.TASK_LEASE_SECONDS),
+        )
+    return list(BackgroundTask.objects.filter(id__in=ids, status='running', locked_by=worker).order_by('run_at'))
+
+
+def execute(background_task, worker):
+    """Exécuter une tâche réservée ; renvoie l'issue ('done', 'retry', 'failed' ou 'lease_lost')"""
+    name = background_task.name
+    started = time.perf_counter()
+    try:
+        registered = registry.get(name)
+        if registered is None:
+            raise LookupError(f'Tâche inconnue : {name}')
+        with transaction.atomic():
+            registered.func(*background_task.args, **background_task.kwargs)
+            if not BackgroundTask.objects.filter(id=background_task.id, locked_by=worker).update(
+                    status='done', finished_at=timezone.now(), locked_until=None, last_error=''):
+                # Ses écritures sont annulées : l'autre worker les refera
+                raise LeaseLost(name)
+        outcome = 'done'
+    except LeaseLost:
+        outcome = 'lease_lost'
+    except Exception:
+        outcome = _failed(background_task, worker, traceback.format_exc())
+    task_duration.observe(time.perf_counter() - started, task=name)
+    tasks_processed.inc(task=name, outcome=outcome)
+    return outcome
+
+
+def _failed(background_task, worker, error):
+    attempts = background_task.attempts
+    if attempts < background_task.max_attempts:
+        delay = retry_delay(attempts)
+        BackgroundTask.objects.filter(id=background_task.id, locked_by=worker).update(
+            status='queued', run_at=timezone.now() + timedelta(seconds=delay),
+            locked_by='', locked_until=None, last_error=error,
+        )
+        logger.warning('Tâche en échec, nouvel essai planifié', extra={
+            'task': background_task.name, 'task_id': background_task.id,
+            'attempts': attempts, 'retry_in': round(delay, 1),
+        })
+        return 'retry'
+    BackgroundTask.objects.filter(id=background_task.id, locked_by=worker).update(
+        status='failed', finished_at=timezone.now(), locked_until=None, last_error=error,
+    )
+    logger.error('Tâche abandonnée après %s essais', attempts, extra={
+        'task': background_task.name, 'task_id': background_task.id,
+    })
+    return 'failed'
+
+
+def work(worker=None, batch_size=None, should_stop=None):
+    """Exécuter les tâches prêtes par lots jusqu'à épuisement ; renvoie le nombre de tâches traitées"""
+    worker = worker or worker_id()
+    processed = 0
+    while not (should_stop and should_stop()):
+        claimed = claim(worker, batch_size)
+        if not claimed:
+            break
+        for index, background_task in enumerate(claimed):
+            if should_stop and should_stop():
+                release(claimed[index:], worker)
+                break
+            execute(background_task, worker)
+            processed += 1
+    return processed
+
+
+def release(background_tasks, worker):
+    """Rendre à la file des tâches réservées mais pas commencées (arrêt du worker)"""
+    BackgroundTask.objects.filter(
+        id__in=[background_task.id for background_task in background_tasks], status='running', locked_by=worker,
+    ).update(status='queued', locked_by='', locked_until=None, attempts=F('attempts') - 1)
+
+
+def requeue_expired(now=None):
+    """Remettre en file (ou abandonner) les tâches dont le bail a expiré"""
+    now = now or timezone.now()
+    expired = BackgroundTask.objects.filter(status='running', locked_until__lt=now)
+    failed = expired.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', finished_at=now, locked_until=None, last_error='Bail expiré (worker arrêté)',
+    )
+    requeued = expired.update(status='queued', run_at=now, locked_by='', locked_until=None)
+    if failed or requeued:
+        tasks_processed.inc(failed + requeued, task='*', outcome='expired')
+    return requeued
+
+
+def purge_finished(now=None):
+    """Supprimer les tâches terminées depuis plus de TASK_RESULT_TTL_HOURS (les échecs restent)"""
+    now = now or timezone.now()
+    deleted, _ = BackgroundTask.objects.filter(
+        status='done', finished_at__lt=now - timedelta(hours=settings.TASK_RESULT_TTL_HOURS),
+    ).delete()
+    return deleted
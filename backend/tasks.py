@@ -0,0 +1,35 @@
+from . import notifications
+from .models import Activity, ActivityRegistration, Notification
+from .task_queue import task
+
+# ===== TÂCHES DE FOND =====
+#
+# Effets de bord des vues exécutés par `python manage.py run_tasks`. Les
+# arguments sont des identifiants : la tâche relit l'état courant, qui peut
+# avoir changé depuis la mise en file (inscription annulée, activité supprimée).
+
+
+@task
+def notify_organizer_of_registration(registration_id):
+    """Prévenir l'organisateur d'une nouvelle inscription, si elle tient toujours"""
+    registration = ActivityRegistration.objects.select_related('user', 'activity').filter(
+        id=registration_id, status='confirmed',
+    ).first()
+    if registration is None:
+        return
+    user, activity = registration.user, registration.activity
+    Notification.objects.create(
+        user_id=activity.organizer_id,
+        title='Nouvelle inscription',
+        message=f'{user.first_name} {user.last_name} s\'est inscrit à votre activité "{activity.title}"',
+        notification_type='activity_reminder',
+        related_object_id=activity.id
+    )
+
+
+@task
+def notify_activity_change(activity_id, changed_fields):
+    """Diffuser la modification ou l'annulation d'une activité à ses inscrits"""
+    activity = Activity.objects.filter(id=activity_id).first()
+    if activity is not None:
+        notifications.notify_activity_change(activity, changed_fields)
@@ -1,3 +1,1634 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db import DatabaseError, connection
+from django.db.models import Count, Q
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from config.middleware import CompressionMiddleware, NPlusOneMiddleware, RequestIdMiddleware, SlowQueryLogMiddleware
+from . import aggregates, compression, conversations, db_pool, db_routing, nplusone, presence, profiling, reminders, slow_queries, storage, task_queue, throttling
+from .authentication import TokenCache, issue_token, revoke_token, token_cache, revocation_index
+from .metrics import registry as metrics_registry
+from .parsers import ORJSONParser
+from .renderers import ORJSONRenderer
+from .structured_logging import BackgroundQueueHandler, RequestContextFilter, log_records_dropped, request_id_var
+from .models import User, UserProfile, MediaBlob, SlowQuery, Contact, Message, Activity, ActivityRegistration, Event, Notification, ScheduledReminder, BackgroundTask, AuthToken
+from .throttling import SlidingWindowThrottle, get_counter, throttle_requests
+
+# ===== BUDGETS DE REQUÊTES PAR ENDPOINT =====
+#
+# Chaque endpoint est appelé sur un jeu de données généré (generate_dataset) :
+# le nombre de requêtes SQL ne doit pas dépendre du volume de données, donc un
+# N+1 réintroduit fait échouer le test avec la liste des requêtes exécutées,
+# et le détecteur de N+1 (mode 'raise') désigne la ligne et la relation en cause.
+#
+#   QUERY_BUDGET_PROFILE=small python manage.py test backend
+#   QUERY_BUDGET_LATENCY_MS=500 python manage.py test backend
+
+DATASET_PROFILE = os.environ.get('QUERY_BUDGET_PROFILE', 'tiny')
+LATENCY_CEILING_MS = float(os.environ.get('QUERY_BUDGET_LATENCY_MS', 1500))
+
+# 1x1 pixel GIF
+TINY_GIF = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00'
+    b'\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+)
+
+
+@override_settings(NPLUSONE_MODE='raise')
+class QueryBudgetTestCase(APITestCase):
+    """Budget de requêtes SQL et plafond de latence pour chaque endpoint de l'API"""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_dataset', profile=DATASET_PROFILE, seed=7, prefix='budget', stdout=StringIO())
+
+        # L'utilisateur le plus connecté : c'est lui qui révèle les N+1
+        cls.user = User.objects.annotate(
+            friends=Count('sent_requests', filter=Q(sent_requests__status='accepted'), distinct=True)
+        ).order_by('-friends', 'id').first()
+        cls.token = issue_token(cls.user, device='query-budget')
+
+        contact = Contact.objects.filter(user=cls.user, status='accepted').first()
+        cls.friend = contact.contact
+        cls.friend_token = issue_token(cls.friend, device='query-budget')
+
+        # Une activité à venir avec des places libres, où l'utilisateur n'est pas inscrit
+        cls.open_activity = Activity.objects.create(
+            title='Atelier budget', description='Activité de test', activity_type='culture',
+            location='Paris', date=timezone.now() + timedelta(days=10), max_participants=50,
+            organizer=cls.friend,
+        )
+        cls.registration = ActivityRegistration.objects.create(
+            user=cls.user, activity=Activity.objects.create(
+                title='Sortie budget', description='Activité de test', activity_type='sport',
+                location='Lyon', date=timezone.now() + timedelta(days=5), max_participants=20,
+                organizer=cls.friend,
+            ), status='confirmed',
+        )
+        cls.notification = Notification.objects.create(
+            user=cls.user, title='Test', message='Notification de test', notification_type='system',
+        )
+        friend_ids = Contact.objects.filter(user=cls.user, status='accepted').values_list('contact_id', flat=True)
+        cls.group = conversations.create_group(cls.user, 'Groupe budget', list(friend_ids[:10]))
+        for index in range(30):
+            conversations.post_message(cls.group, cls.friend if index % 2 else cls.user, f'Message {index}')
+        cls.stranger = User.objects.exclude(
+            Q(sent_requests__contact=cls.user) | Q(received_requests__user=cls.user) | Q(id=cls.user.id)
+        ).first()
+
+    def setUp(self):
+        cache.clear()
+        get_counter().clear()
+        # Token déjà en cache : l'authentification ne coûte aucune requête
+        token_cache.clear()
+        token_cache.set(self.token.key, self.user, self.token)
+        revocation_index.clear()
+        revocation_index.sync()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def login_as_friend(self):
+        """Appels suivants en tant qu'organisateur des activités de test"""
+        token_cache.set(self.friend_token.key, self.friend, self.friend_token)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.friend_token.key}')
+
+    def assertQueryBudget(self, method, url, max_queries, data=None, format='json',
+                          expected_status=200, **extra):
+        """Appeler l'endpoint et vérifier le nombre de requêtes SQL et la latence"""
+        call = getattr(self.client, method)
+        # Les callbacks on_commit (mise en file des tâches de fond) comptent dans le budget
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            started = time.perf_counter()
+            response = call(url, data, format=format, **extra)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+        self.assertEqual(
+            response.status_code, expected_status,
+            f'{method.upper()} {url} -> {response.status_code} : {response.content[:500]!r}'
+        )
+        if len(queries) > max_queries:
+            executed = '\n'.join(
+                f'{index}. {query["sql"]}' for index, query in enumerate(queries.captured_queries, 1)
+            )
+            self.fail(
+                f'{method.upper()} {url} : {len(queries)} requêtes SQL pour un budget de '
+                f'{max_queries}\n{executed}'
+            )
+        self.assertLessEqual(
+            elapsed_ms, LATENCY_CEILING_MS,
+            f'{method.upper()} {url} : {elapsed_ms:.0f} ms (plafond {LATENCY_CEILING_MS:.0f} ms)'
+        )
+        return response
+
+    # ===== AUTHENTIFICATION =====
+
+    def test_register(self):
+        self.client.credentials()
+        self.assertQueryBudget('post', '/api/auth/register/', 5, {
+            'username': 'budget_new', 'email': 'budget_new@example.com',
+            'password': 'motdepasse-solide', 'first_name': 'Nouvel', 'last_name': 'Inscrit',
+        }, expected_status=201)
+
+    def test_login(self):
+        self.client.credentials()
+        self.assertQueryBudget('post', '/api/auth/login/', 3, {
+            'email': self.user.email, 'password': 'age2meet-bench',
+        })
+
+    def test_logout(self):
+        self.assertQueryBudget('post', '/api/auth/logout/', 1)
+
+    # ===== PROFIL ET PRÉSENCE =====
+
+    def test_profile_get(self):
+        self.assertQueryBudget('get', '/api/profile/', 1)
+
+    def test_profile_put(self):
+        self.assertQueryBudget('put', '/api/profile/', 3, {'bio': 'Nouvelle bio', 'status': 'busy'})
+
+    def test_profile_picture_upload(self):
+        media_root = tempfile.mkdtemp(prefix='age2meet-budget-')
+        self.addCleanup(shutil.rmtree, media_root, True)
+        upload = SimpleUploadedFile('photo.gif', TINY_GIF, content_type='image/gif')
+        with self.settings(MEDIA_ROOT=media_root):
+            self.assertQueryBudget('post', '/api/profile/upload-picture/', 7,
+                                   {'profile_picture': upload}, format='multipart')
+
+    def test_presence_heartbeat(self):
+        self.assertQueryBudget('post', '/api/presence/heartbeat/', 1)
+
+    # ===== MESSAGERIE =====
+
+    def test_messages_inbox(self):
+        self.assertQueryBudget('get', '/api/messages/', 1)
+
+    def test_messages_conversation(self):
+        self.assertQueryBudget('get', f'/api/messages/?user_id={self.friend.id}', 2)
+
+    def test_message_send(self):
+        self.assertQueryBudget('post', '/api/messages/', 3, {
+            'receiver_id': self.friend.id, 'content': 'Bonjour !',
+        }, expected_status=201)
+
+    def test_messages_batch_read(self):
+        message_ids = list(Message.objects.filter(receiver=self.user).values_list('id', flat=True)[:20])
+        self.assertQueryBudget('post', '/api/messages/batch/read/', 1, {
+            'message_ids': message_ids, 'user_ids': [self.friend.id],
+        })
+
+    def test_messages_batch_delete(self):
+        message_ids = list(Message.objects.filter(sender=self.user).values_list('id', flat=True)[:20])
+        received = Message.objects.filter(receiver=self.user).first()
+        response = self.assertQueryBudget('post', '/api/messages/batch/delete/', 1,
+                                          {'message_ids': message_ids + [received.id]})
+        self.assertEqual(response.data['deleted'], len(message_ids))
+        # Le message reçu reste chez son expéditeur
+        self.assertTrue(Message.objects.filter(id=received.id).exists())
+
+    def test_messages_batch_send(self):
+        friend_ids = [
+            contact.contact_id if contact.user_id == self.user.id else contact.user_id
+            for contact in Contact.objects.filter(Q(user=self.user) | Q(contact=self.user), status='accepted')[:20]
+        ]
+        response = self.assertQueryBudget('post', '/api/messages/batch/send/', 4, {
+            'receiver_ids': friend_ids, 'content': 'Bonjour à tous !',
+        }, expected_status=201)
+        self.assertEqual(len(response.data['message_ids']), len(friend_ids))
+
+    def test_messages_batch_send_stranger(self):
+        self.assertQueryBudget('post', '/api/messages/batch/send/', 1, {
+            'receiver_ids': [self.friend.id, self.stranger.id], 'content': 'Bonjour !',
+        }, expected_status=403)
+
+    # ===== CONVERSATIONS DE GROUPE =====
+
+    def test_conversations_list(self):
+        self.assertQueryBudget('get', '/api/conversations/', 1)
+
+    def test_conversation_create(self):
+        self.assertQueryBudget('post', '/api/conversations/', 5, {
+            'title': 'Balade du dimanche', 'member_ids': [self.friend.id],
+        }, expected_status=201)
+
+    def test_conversation_messages(self):
+        # Membre, page de messages, pointeur de lecture
+        response = self.assertQueryBudget('get', f'/api/conversations/{self.group.id}/messages/?limit=10', 3)
+        self.assertEqual(len(response.data['messages']), 10)
+        self.assertIsNotNone(response.data['next_before'])
+        self.assertQueryBudget(
+            'get', f'/api/conversations/{self.group.id}/messages/?before={response.data["next_before"]}', 2,
+        )
+
+    def test_conversation_post(self):
+        # Membre, puis INSERT et deux UPDATE dans une transaction, quel que soit le nombre de membres
+        self.assertQueryBudget('post', f'/api/conversations/{self.group.id}/messages/', 6, {
+            'content': 'On se retrouve à 10 h ?',
+        }, expected_status=201)
+
+    def test_activity_conversation(self):
+        self.login_as_friend()
+        response = self.client.get(f'/api/activities/{self.open_activity.id}/conversation/')
+        self.assertEqual(response.status_code, 200)
+        # L'inscription suivante rejoint le fil existant
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.client.post('/api/activities/register/', {'activity_id': self.open_activity.id}, format='json')
+        self.assertQueryBudget('get', f'/api/activities/{self.open_activity.id}/conversation/', 4)
+
+    # ===== CONTACTS =====
+
+    def test_contacts_list(self):
+        # + 1 : version de la liste (ETag)
+        self.assertQueryBudget('get', '/api/contacts/', 4)
+
+    def test_contact_request(self):
+        self.assertQueryBudget('post', '/api/contacts/', 4, {'contact_id': self.stranger.id},
+                               expected_status=201)
+
+    def test_contact_accept(self):
+        request = Contact.objects.create(user=self.stranger, contact=self.user, status='pending')
+        self.assertQueryBudget('put', f'/api/contacts/{request.id}/action/', 2, {'action': 'accept'})
+
+    def test_contact_delete(self):
+        contact = Contact.objects.filter(user=self.user, status='accepted').first()
+        self.assertQueryBudget('delete', f'/api/contacts/{contact.id}/', 3)
+
+    # ===== AGENDA =====
+
+    def test_events_list(self):
+        # + 2 : version des événements visibles et des participations (ETag)
+        self.assertQueryBudget('get', '/api/events/', 4)
+
+    def test_event_create(self):
+        start = timezone.now() + timedelta(days=3)
+        self.assertQueryBudget('post', '/api/events/', 1, {
+            'title': 'Café', 'start_date': start.isoformat(),
+            'end_date': (start + timedelta(hours=2)).isoformat(),
+        }, expected_status=201)
+
+    # ===== ACTIVITÉS =====
+
+    def test_activities_list(self):
+        # + 1 : version de la liste (ETag)
+        self.assertQueryBudget('get', '/api/activities/', 2)
+
+    def test_activity_create(self):
+        self.assertQueryBudget('post', '/api/activities/', 1, {
+            'title': 'Promenade', 'description': 'Au parc', 'activity_type': 'sport',
+            'location': 'Nantes', 'date': (timezone.now() + timedelta(days=8)).isoformat(),
+            'max_participants': 12,
+        }, expected_status=201)
+
+    def test_activity_detail(self):
+        self.assertQueryBudget('get', f'/api/activities/{self.open_activity.id}/', 2)
+
+    def test_activity_register(self):
+        # + 1 : recherche du fil de l'activité pour y ajouter l'inscrit ; la notification
+        # de l'organisateur est une tâche de fond (une insertion)
+        self.assertQueryBudget('post', '/api/activities/register/', 6, {
+            'activity_id': self.open_activity.id,
+        }, expected_status=201)
+
+    def test_activity_registration_cancel(self):
+        # + 1 : retrait du fil de l'activité
+        self.assertQueryBudget('delete', f'/api/activities/registration/{self.registration.id}/', 4)
+
+    def test_activity_update_notifies_participants(self):
+        activity = self.registration.activity
+        participants = ActivityRegistration.objects.bulk_create([
+            ActivityRegistration(user=user, activity=activity, status='confirmed')
+            for user in User.objects.exclude(id__in=[self.user.id, self.friend.id])[:30]
+        ])
+        self.login_as_friend()
+        # Lecture, UPDATE, mise en file : la diffusion est faite par le worker
+        self.assertQueryBudget('put', f'/api/activities/{activity.id}/', 3, {'location': 'Annecy'})
+        self.assertQueryBudget('put', f'/api/activities/{activity.id}/', 3, {'title': 'Sortie au lac'})
+        self.assertEqual(task_queue.work(), 2)
+
+        # Deux modifications rapprochées : une seule notification par inscrit, à jour
+        notifications = Notification.objects.filter(notification_type='activity_updated', related_object_id=activity.id)
+        self.assertEqual(notifications.count(), len(participants) + 1)
+        self.assertIn('Annecy', notifications.first().message)
+        self.assertIn('Sortie au lac', notifications.first().message)
+
+    def test_activity_cancel_notifies_participants(self):
+        activity = self.registration.activity
+        self.login_as_friend()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(f'/api/activities/{activity.id}/', {'location': 'Annecy'}, format='json')
+        self.assertQueryBudget('delete', f'/api/activities/{activity.id}/', 3)
+        self.assertEqual(task_queue.work(), 2)
+
+        notifications = Notification.objects.filter(related_object_id=activity.id, user=self.user)
+        self.assertEqual(
+            list(notifications.values_list('notification_type', flat=True)), ['activity_cancelled'],
+        )
+
+    def test_user_activities(self):
+        self.assertQueryBudget('get', '/api/user/activities/', 3)
+
+    # ===== NOTIFICATIONS =====
+
+    def test_notifications_list(self):
+        # Version de la liste et nombre de non lues dans la même requête
+        self.assertQueryBudget('get', '/api/notifications/', 2)
+
+    def test_notification_read(self):
+        self.assertQueryBudget('put', f'/api/notifications/{self.notification.id}/read/', 2)
+
+    def test_notifications_mark_all_read(self):
+        self.assertQueryBudget('put', '/api/notifications/mark-all-read/', 1)
+
+    # ===== TABLEAU DE BORD, ACCUEIL, AVIS =====
+
+    def test_dashboard(self):
+        self.assertQueryBudget('get', '/api/dashboard/', 7)
+
+    def test_home(self):
+        # + 3 : version de chaque section (ETag) ; - 1 : suggestions en une requête
+        self.assertQueryBudget('get', '/api/home/', 6)
+
+    def test_review_create(self):
+        self.user.reviews.all().delete()
+        self.assertQueryBudget('post', '/api/reviews/', 2, {'rating': 5, 'comment': 'Très bien'},
+                               expected_status=201)
+
+    def test_api_docs(self):
+        self.client.credentials()
+        self.assertQueryBudget('get', '/api/docs/', 0)
+
+    # ===== GET CONDITIONNELS =====
+
+    def assertNotModified(self, url, max_queries):
+        """Nouvel appel avec l'ETag reçu : 304 sans construire la réponse"""
+        etag = self.client.get(url)['ETag']
+        response = self.assertQueryBudget('get', url, max_queries, expected_status=304, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response['ETag'], etag)
+        self.assertIn('Authorization', response['Vary'])
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(response.content, b'')
+        return etag
+
+    def test_lists_not_modified(self):
+        self.assertNotModified('/api/activities/', 1)
+        self.assertNotModified('/api/activities/?type=sport', 1)
+        self.assertNotModified('/api/events/', 2)
+        self.assertNotModified('/api/contacts/', 1)
+        self.assertNotModified('/api/notifications/', 1)
+        self.assertNotModified('/api/home/', 3)
+
+    def test_etag_changes_with_data(self):
+        etag = self.assertNotModified('/api/notifications/', 1)
+        self.client.put(f'/api/notifications/{self.notification.id}/read/')
+        response = self.client.get('/api/notifications/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Last-Modified', response)
+
+        # Une inscription change le nombre d'inscrits de la liste
+        etag = self.assertNotModified('/api/activities/', 1)
+        self.client.post('/api/activities/register/', {'activity_id': self.open_activity.id}, format='json')
+        self.assertEqual(self.client.get('/api/activities/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Même URL, autre membre : autre version
+        etag = self.assertNotModified('/api/home/', 3)
+        self.login_as_friend()
+        self.assertEqual(self.client.get('/api/home/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_activities_etag_same_confirmed_sum(self):
+        # Annuler deux inscriptions et en confirmer une dont l'identifiant est leur somme
+        members = list(User.objects.exclude(id=self.user.id).order_by('id')[:3])
+        first, second = (
+            ActivityRegistration.objects.create(user=member, activity=self.open_activity, status='confirmed')
+            for member in members[:2]
+        )
+        etag = self.assertNotModified('/api/activities/', 1)
+        ActivityRegistration.objects.filter(id__in=[first.id, second.id]).update(status='cancelled')
+        ActivityRegistration.objects.create(
+            id=first.id + second.id, user=members[2], activity=self.open_activity, status='confirmed',
+        )
+        self.assertEqual(self.client.get('/api/activities/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    # ===== MÉTRIQUES =====
+
+    @override_settings(DEBUG=True, METRICS_TOKEN='')
+    def test_metrics(self):
+        self.client.credentials()
+        self.assertQueryBudget('get', '/metrics', 0)
+
+    @override_settings(METRICS_TOKEN='jeton-metriques')
+    def test_metrics_token(self):
+        self.client.credentials()
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer autre').status_code, 401)
+        self.assertQueryBudget('get', '/metrics', 0, HTTP_AUTHORIZATION='Bearer jeton-metriques')
+
+
+# ===== TÂCHES DE FOND =====
+
+attempts_seen = []
+
+
+@task_queue.task(name='tests.flaky', max_attempts=3)
+def flaky(user_id, fail_until):
+    """Écrit une notification puis échoue tant que fail_until n'est pas atteint"""
+    attempts_seen.append(user_id)
+    Notification.objects.create(user_id=user_id, title='Essai', message='Essai', notification_type='system')
+    if len(attempts_seen) < fail_until:
+        raise RuntimeError('échec simulé')
+
+
+@override_settings(TASK_RETRY_BASE_DELAY=10, TASK_RETRY_MAX_DELAY=60, TASK_LEASE_SECONDS=300)
+class TaskQueueTestCase(TestCase):
+    """Mise en file après commit, nouveaux essais avec délai et reprise des baux expirés"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tache', 'tache@example.com', 'secret')
+
+    def setUp(self):
+        attempts_seen.clear()
+
+    def enqueue(self, fail_until):
+        with self.captureOnCommitCallbacks(execute=True):
+            flaky.enqueue(self.user.id, fail_until)
+        return BackgroundTask.objects.get()
+
+    def run_due(self):
+        """Rendre les tâches replanifiées immédiatement exécutables, puis les exécuter"""
+        BackgroundTask.objects.filter(status='queued').update(run_at=timezone.now())
+        return task_queue.work(worker='test')
+
+    def test_not_queued_before_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            flaky.enqueue(self.user.id, 1)
+        self.assertFalse(BackgroundTask.objects.exists())
+        self.assertEqual(len(callbacks), 1)
+
+    def test_retry_with_backoff_then_success(self):
+        background_task = self.enqueue(fail_until=2)
+        self.assertEqual(task_queue.work(worker='test'), 1)
+
+        background_task.refresh_from_db()
+        self.assertEqual((background_task.status, background_task.attempts), ('queued', 1))
+        self.assertGreaterEqual(background_task.run_at, timezone.now() + timedelta(seconds=4))
+        self.assertIn('échec simulé', background_task.last_error)
+        # L'essai échoué n'a rien écrit
+        self.assertFalse(Notification.objects.exists())
+
+        self.assertEqual(self.run_due(), 1)
+        background_task.refresh_from_db()
+        self.assertEqual((background_task.status, background_task.attempts), ('done', 2))
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_failed_after_max_attempts(self):
+        background_task = self.enqueue(fail_until=10)
+        for _ in range(4):
+            self.run_due()
+        background_task.refresh_from_db()
+        self.assertEqual((background_task.status, background_task.attempts), ('failed', 3))
+        self.assertEqual(len(attempts_seen), 3)
+
+    def test_expired_lease_is_requeued(self):
+        background_task = self.enqueue(fail_until=1)
+        self.assertEqual(len(task_queue.claim('worker-mort')), 1)
+        self.assertEqual(task_queue.requeue_expired(), 0)
+        self.assertEqual(task_queue.requeue_expired(now=timezone.now() + timedelta(seconds=301)), 1)
+
+        self.assertEqual(self.run_due(), 1)
+        background_task.refresh_from_db()
+        self.assertEqual((background_task.status, background_task.attempts), ('done', 2))
+
+    def test_run_tasks_once(self):
+        self.enqueue(fail_until=1)
+        out = StringIO()
+        call_command('run_tasks', '--once', stdout=out)
+        self.assertIn('1 tâches exécutées', out.getvalue())
+        self.assertEqual(Notification.objects.count(), 1)
+
+
+class RunTasksWorkerTestCase(SimpleTestCase):
+    """Processus du pool run_tasks : ses logs sont écrits malgré le fork"""
+
+    def test_worker_log_is_written(self):
+        from .management.commands import run_tasks
+
+        fd, path = tempfile.mkstemp(prefix='age2meet-worker-log-')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        stop = multiprocessing.get_context('fork').Event()
+
+        def contested_batch(worker, batch_size, should_stop):
+            stop.set()
+            raise DatabaseError('database is locked')
+
+        with open(path, 'a') as stream:
+            handler = BackgroundQueueHandler(stream=stream, format='json')
+            self.addCleanup(handler.close)
+            with mock.patch.object(run_tasks.logger, 'handlers', [handler]), \
+                    mock.patch.object(run_tasks.logger, 'propagate', False), \
+                    mock.patch.object(task_queue, 'work', side_effect=contested_batch):
+                process = multiprocessing.get_context('fork').Process(
+                    target=run_tasks.worker_loop, args=(stop, 1, 0.1), daemon=True,
+                )
+                process.start()
+                process.join(10)
+            self.assertEqual(process.exitcode, 0)
+
+        with open(path) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([record['message'] for record in records], ['Réservation de tâches interrompue'])
+        self.assertEqual(records[0]['level'], 'WARNING')
+
+# ===== ENDPOINTS AGRÉGÉS =====
+
+@override_settings(AGGREGATE_SECTION_WORKERS=4)
+class AggregateSectionsTestCase(SimpleTestCase):
+    """Sections des endpoints agrégés exécutées en parallèle (hors transaction)"""
+
+    def test_latency_is_the_slowest_section(self):
+        def section(name, delay):
+            def load():
+                time.sleep(delay)
+                return name
+            return load
+
+        started = time.perf_counter()
+        data = aggregates.load_sections({name: section(name, 0.2) for name in ('a', 'b', 'c', 'd')})
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(list(data.items()), [('a', 'a'), ('b', 'b'), ('c', 'c'), ('d', 'd')])
+        self.assertLess(elapsed, 0.6)
+
+    @override_settings(AGGREGATE_SECTION_WORKERS=0)
+    def test_sequential_when_disabled(self):
+        threads = aggregates.load_sections({'a': lambda: threading.get_ident()})
+        self.assertEqual(threads['a'], threading.get_ident())
+
+    def test_sections_see_the_request_context(self):
+        token = request_id_var.set('requete-agregee')
+        self.addCleanup(request_id_var.reset, token)
+        data = aggregates.load_sections({name: request_id_var.get for name in ('a', 'b')})
+        self.assertEqual(data, {'a': 'requete-agregee', 'b': 'requete-agregee'})
+
+    def test_sections_close_their_connections(self):
+        closed = []
+        with mock.patch.object(aggregates.connections, 'close_all',
+                               side_effect=lambda: closed.append(threading.get_ident())):
+            data = aggregates.load_sections({name: threading.get_ident for name in ('a', 'b', 'c')})
+        self.assertEqual(sorted(closed), sorted(data.values()))
+        self.assertNotIn(threading.get_ident(), closed)
+
+# ===== COMPRESSION DES RÉPONSES =====
+
+@override_settings(COMPRESSION_ENABLED=True, COMPRESSION_MIN_SIZE=1024, COMPRESSION_PATHS=['/api/'],
+                   COMPRESSION_EXCLUDED_PATHS=['/api/auth/'])
+class CompressionTestCase(SimpleTestCase):
+    """Compression négociée des réponses de l'API"""
+
+    payload = [{'id': index, 'bio': 'Passionnée de randonnée et de jardinage.'} for index in range(200)]
+
+    def call(self, response, path='/api/contacts/', accept='gzip, deflate'):
+        request = RequestFactory().get(path, HTTP_ACCEPT_ENCODING=accept)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_gzip_json(self):
+        before = compression.compression_bytes.value(encoding='gzip', body='original')
+        response = self.call(JsonResponse(self.payload, safe=False, headers={'ETag': '"v1"'}))
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(response['ETag'], 'W/"v1"')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(json.loads(gzip.decompress(response.content)), self.payload)
+        self.assertGreater(compression.compression_bytes.value(encoding='gzip', body='original'), before)
+
+    def test_skipped(self):
+        small = self.call(JsonResponse({'ok': True}))
+        self.assertFalse(small.has_header('Content-Encoding'))
+        image = self.call(HttpResponse(b'\x89PNG' * 1000, content_type='image/png'))
+        self.assertFalse(image.has_header('Content-Encoding'))
+        not_accepted = self.call(JsonResponse(self.payload, safe=False), accept='identity')
+        self.assertFalse(not_accepted.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', not_accepted['Vary'])
+        token = self.call(JsonResponse(self.payload, safe=False), path='/api/auth/login/')
+        self.assertFalse(token.has_header('Content-Encoding'))
+
+    def test_streaming(self):
+        chunks = [json.dumps(item).encode() + b'\n' for item in self.payload]
+        response = self.call(StreamingHttpResponse(iter(chunks), content_type='application/json'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        parts = list(response.streaming_content)
+        self.assertEqual(gzip.decompress(b''.join(parts)), b''.join(chunks))
+
+        # Chaque morceau est vidé : le client peut le décompresser dès sa réception
+        self.assertEqual(len(parts), len(chunks) + 1)
+        decompressor = zlib.decompressobj(31)
+        for part, chunk in zip(parts, chunks):
+            self.assertEqual(decompressor.decompress(part), chunk)
+
+    def test_negotiation(self):
+        self.assertEqual(compression.negotiate('gzip, br', ('br', 'gzip')), 'br')
+        self.assertEqual(compression.negotiate('br;q=0.5, gzip', ('br', 'gzip')), 'gzip')
+        self.assertEqual(compression.negotiate('br', ('gzip',)), None)
+        self.assertEqual(compression.negotiate('*', ('gzip',)), 'gzip')
+        self.assertEqual(compression.negotiate('gzip;q=0, *', ('gzip',)), None)
+        self.assertEqual(compression.negotiate('', ('br', 'gzip')), None)
+
+# ===== RENDU JSON =====
+
+class ORJSONRendererTestCase(SimpleTestCase):
+    """Rendu et lecture orjson : même JSON que DRF"""
+
+    def test_same_output_as_drf(self):
+        data = {
+            'created_at': timezone.now(),
+            'date': timezone.now().date(),
+            'price': Decimal('12.50'),
+            'id': uuid.uuid4(),
+            'label': gettext_lazy('Bonjour'),
+            'counts': {1: 'un', 2: 'deux'},
+            'items': [{'name': 'Café', 'ok': True, 'value': None}],
+        }
+        self.assertEqual(json.loads(ORJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+    def test_indent(self):
+        self.assertIn(b'\n', ORJSONRenderer().render({'a': 1}, 'application/json; indent=4'))
+        self.assertNotIn(b'\n', ORJSONRenderer().render({'a': 1}, 'application/json'))
+
+    def test_parser(self):
+        parser = ORJSONParser()
+        self.assertEqual(parser.parse(io.BytesIO('{"ville": "Besançon"}'.encode())), {'ville': 'Besançon'})
+        self.assertEqual(
+            parser.parse(io.BytesIO('{"ville": "Besançon"}'.encode('latin-1')), parser_context={'encoding': 'latin-1'}),
+            {'ville': 'Besançon'},
+        )
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{"ville": '))
+
+# ===== CONNEXIONS À LA BASE =====
+
+class DatabasePoolMetricsTestCase(SimpleTestCase):
+    """Métriques des pools psycopg lues au moment du scrape"""
+
+    def test_pool_gauges(self):
+        pool = mock.Mock()
+        pool.get_stats.return_value = {
+            'pool_size': 4, 'pool_available': 1, 'pool_max': 10, 'requests_waiting': 2,
+            'requests_num': 120, 'requests_wait_ms': 1500,
+        }
+        with mock.patch.object(db_pool, 'pools', return_value=[('default', pool)]):
+            exposition = metrics_registry.render()
+        pid = os.getpid()
+        self.assertIn(f'age2meet_db_pool_connections{{pid="{pid}",database="default",state="open"}} 4', exposition)
+        self.assertIn(f'age2meet_db_pool_requests_waiting{{pid="{pid}",database="default"}} 2', exposition)
+        self.assertIn(f'age2meet_db_pool_stats{{pid="{pid}",database="default",stat="requests_wait_seconds"}} 1.5', exposition)
+
+    def test_no_pool_no_series(self):
+        self.assertNotIn('age2meet_db_pool_connections{', metrics_registry.render())
+
+    def test_series_carry_the_process_pid(self):
+        # Registre hérité par fork (worker gunicorn) : les séries de l'enfant portent son pid
+        log_records_dropped.inc(0)
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.close(read_end)
+                os.write(write_end, metrics_registry.render().encode())
+            finally:
+                os._exit(0)
+        os.close(write_end)
+        with os.fdopen(read_end, 'rb') as pipe:
+            exposition = pipe.read().decode()
+        os.waitpid(pid, 0)
+        self.assertIn(f'age2meet_log_records_dropped_total{{pid="{pid}"}} ', exposition)
+        self.assertNotIn(f'pid="{os.getpid()}"', exposition)
+
+# ===== RÉPLICAS EN LECTURE =====
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'], REPLICA_STICKY_SECONDS=10,
+                   REPLICA_MAX_LAG_SECONDS=5, REPLICA_HEALTH_INTERVAL=3600)
+class ReplicaRoutingTestCase(TestCase):
+    """Choix de la base par ReplicaRouter (décisions seulement : aucune requête sur les réplicas)"""
+
+    def setUp(self):
+        cache.clear()
+        self.router = db_routing.ReplicaRouter()
+        self.lags = {'replica1': 0.2, 'replica2': 0.5}
+        db_routing.replica_health.measure = self.lags.get
+        db_routing.replica_health.reset()
+        self.addCleanup(setattr, db_routing.replica_health, 'measure', db_routing.measure_lag)
+        self.addCleanup(db_routing.replica_health.reset)
+
+    def write(self):
+        User.objects.filter(pk=0).update(first_name='Réplica')
+
+    def test_get_reads_from_replica_until_it_writes(self):
+        with db_routing.routing('GET'):
+            self.assertIn(self.router.db_for_read(Message), ('replica1', 'replica2'))
+            self.assertEqual(self.router.db_for_read(AuthToken), 'default')
+            self.assertEqual(self.router.db_for_write(Message), 'default')
+            self.assertIn(self.router.db_for_read(Message), ('replica1', 'replica2'))
+            self.write()
+            self.assertEqual(self.router.db_for_read(Message), 'default')
+
+    def test_write_requests_and_commands_read_primary(self):
+        with db_routing.routing('POST'):
+            self.assertEqual(self.router.db_for_read(Message), 'default')
+        self.assertEqual(self.router.db_for_read(Message), 'default')
+
+    def test_member_reads_own_writes(self):
+        with db_routing.routing('POST') as state:
+            db_routing.bind_user(42)
+            self.write()
+            db_routing.stick_to_primary(state)
+
+        with db_routing.routing('GET'):
+            db_routing.bind_user(42)
+            self.assertEqual(self.router.db_for_read(Message), 'default')
+        with db_routing.routing('GET'):
+            db_routing.bind_user(7)
+            self.assertIn(self.router.db_for_read(Message), ('replica1', 'replica2'))
+
+        cache.delete('db-primary:42')  # fenêtre écoulée
+        with db_routing.routing('GET'):
+            db_routing.bind_user(42)
+            self.assertIn(self.router.db_for_read(Message), ('replica1', 'replica2'))
+
+    def test_dashboard_without_writes_does_not_stick(self):
+        user = User.objects.create_user('replique', 'replique@example.com', 'secret')
+        token = issue_token(user, device='replica')
+        # Aucun réplica sain : les lectures restent sur 'default', seule la décision de coller est vérifiée
+        self.lags.update(replica1=30, replica2=30)
+
+        # Première visite : get_or_create crée les statistiques du membre
+        self.assertEqual(self.client.get('/api/dashboard/', HTTP_AUTHORIZATION=f'Token {token.key}').status_code, 200)
+        self.assertTrue(cache.get(f'db-primary:{user.id}'))
+
+        cache.delete(f'db-primary:{user.id}')
+        self.assertEqual(self.client.get('/api/dashboard/', HTTP_AUTHORIZATION=f'Token {token.key}').status_code, 200)
+        self.assertIsNone(cache.get(f'db-primary:{user.id}'))
+
+    def test_lagging_replica_is_skipped(self):
+        self.lags['replica2'] = 30
+        with db_routing.routing('GET'):
+            self.assertEqual({self.router.db_for_read(Message) for _ in range(20)}, {'replica1'})
+        self.lags['replica1'] = 30
+        db_routing.replica_health.reset()
+        with db_routing.routing('GET'):
+            self.assertEqual(self.router.db_for_read(Message), 'default')
+
+    def test_migrations_only_on_primary(self):
+        self.assertFalse(self.router.allow_migrate('replica1', 'backend'))
+        self.assertIsNone(self.router.allow_migrate('default', 'backend'))
+
+# ===== RAPPELS =====
+
+@override_settings(REMINDER_LEAD_HOURS=[24, 2], REMINDER_GRACE_MINUTES=30, REMINDER_PLAN_INTERVAL=300)
+class ReminderTestCase(TestCase):
+    """Planification idempotente et envoi des rappels d'activités et d'événements"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organizer = User.objects.create_user('organisatrice', 'orga@example.com', 'secret', first_name='Odile')
+        cls.member = User.objects.create_user('membre', 'membre@example.com', 'secret', first_name='Marcel')
+        cls.start = timezone.now().replace(microsecond=0) + timedelta(hours=20)
+        cls.activity = Activity.objects.create(
+            title='Balade au lac', description='Tour du lac', activity_type='balade', location='Annecy',
+            date=cls.start, organizer=cls.organizer,
+        )
+        ActivityRegistration.objects.create(user=cls.member, activity=cls.activity, status='confirmed')
+        cls.event = Event.objects.create(
+            user=cls.member, title='Dentiste', start_date=cls.start + timedelta(minutes=20),
+            end_date=cls.start + timedelta(hours=1),
+        )
+
+    def test_plan_is_idempotent(self):
+        now = self.start - timedelta(hours=24, minutes=10)
+        reminders.plan(now=now)
+        reminders.plan(now=now)
+        # Organisatrice et membre pour l'activité, membre pour l'événement ; deux échéances chacun
+        self.assertEqual(ScheduledReminder.objects.count(), 6)
+
+    def test_late_registration_skips_past_lead(self):
+        reminders.plan(now=self.start - timedelta(hours=10))
+        self.assertEqual(set(ScheduledReminder.objects.values_list('lead_hours', flat=True)), {2})
+
+    def test_process_due_sends_once(self):
+        reminders.plan(now=self.start - timedelta(hours=24, minutes=10))
+        now = self.start - timedelta(hours=23, minutes=50)
+        reminders.process_due(now=now)
+        reminders.process_due(now=now)
+        sent = Notification.objects.filter(notification_type='activity_reminder')
+        self.assertEqual(sorted(sent.values_list('user__username', flat=True)), ['membre', 'organisatrice'])
+        self.assertIn('Balade au lac', sent.first().message)
+        self.assertEqual(Notification.objects.filter(notification_type='event_reminder').count(), 0)
+
+    def test_late_worker_sends_closest_reminder_only(self):
+        reminders.plan(now=self.start - timedelta(hours=24, minutes=10))
+        reminders.process_due(now=self.start - timedelta(hours=1))
+        self.assertEqual(Notification.objects.filter(user=self.member).count(), 2)  # activité + événement
+        self.assertEqual(ScheduledReminder.objects.filter(status='sent').count(), 3)
+
+    def test_cancelled_activity_and_moved_event(self):
+        reminders.plan(now=self.start - timedelta(hours=24, minutes=10))
+        Activity.objects.filter(id=self.activity.id).update(is_active=False)
+        Event.objects.filter(id=self.event.id).update(start_date=self.start + timedelta(days=2))
+        reminders.process_due(now=self.start - timedelta(hours=22))
+
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(
+            set(ScheduledReminder.objects.filter(kind='activity', lead_hours=24).values_list('status', flat=True)),
+            {'skipped'},
+        )
+        event_reminder = ScheduledReminder.objects.get(kind='event', lead_hours=24)
+        self.assertEqual(event_reminder.status, 'pending')
+        self.assertEqual(event_reminder.due_at, self.start + timedelta(days=1))
+
+    def test_run_reminders_once(self):
+        out = StringIO()
+        call_command('run_reminders', '--once', stdout=out)
+        self.assertIn('rappels planifiés', out.getvalue())
+
+# ===== THROTTLING =====
+
+class SlidingWindowCounterTestCase(SimpleTestCase):
+    """Estimation à deux fenêtres et délai avant la prochaine requête acceptée"""
+
+    def setUp(self):
+        cache.clear()
+
+    def assertSlidingWindow(self, counter):
+        for second in range(10):
+            self.assertEqual(counter.hit('k', 10, 60, now=second), (True, None))
+        allowed, wait = counter.hit('k', 10, 60, now=30)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 30)
+        # Fenêtre suivante, à mi-parcours : 10 * 0.5 requêtes estimées
+        self.assertEqual(counter.hit('k', 10, 60, now=90), (True, None))
+        self.assertEqual(counter.hit('autre', 10, 60, now=30), (True, None))
+
+    def test_local_counter(self):
+        self.assertSlidingWindow(throttling.LocalSlidingWindowCounter())
+
+    def test_cache_counter(self):
+        self.assertSlidingWindow(throttling.CacheSlidingWindowCounter())
+        # Compteurs partagés entre workers
+        self.assertFalse(throttling.CacheSlidingWindowCounter().hit('k', 5, 60, now=91)[0])
+
+    def test_zero_limit(self):
+        self.assertEqual(throttling.LocalSlidingWindowCounter().hit('k', 0, 60), (False, 60.0))
+        self.assertEqual(throttling.CacheSlidingWindowCounter().hit('k', 0, 60), (False, 60.0))
+
+
+@mock.patch.dict(SlidingWindowThrottle.THROTTLE_RATES, {'auth': '2/min'})
+class ThrottleTestCase(APITestCase):
+    """429 et Retry-After au-delà du budget d'un endpoint"""
+
+    credentials = {'email': 'inconnu@example.com', 'password': 'secret'}
+
+    def setUp(self):
+        cache.clear()
+        get_counter().clear()
+
+    def login(self):
+        return self.client.post('/api/auth/login/', self.credentials, format='json')
+
+    def assertThrottled(self):
+        allowed = throttle_requests.value(scope='auth', outcome='allowed')
+        throttled = throttle_requests.value(scope='auth', outcome='throttled')
+        self.assertEqual([self.login().status_code for _ in range(2)], [401, 401])
+        response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(1 <= int(response['Retry-After']) <= 60)
+        self.assertEqual(throttle_requests.value(scope='auth', outcome='allowed'), allowed + 2)
+        self.assertEqual(throttle_requests.value(scope='auth', outcome='throttled'), throttled + 1)
+
+    def test_retry_after(self):
+        self.assertThrottled()
+
+    @override_settings(THROTTLE_COUNTER_BACKEND='cache')
+    def test_cache_backend(self):
+        with mock.patch.object(throttling, '_counter', None):
+            self.assertThrottled()
+            self.assertIsInstance(get_counter(), throttling.CacheSlidingWindowCounter)
+            cache.clear()
+            self.assertEqual(self.login().status_code, 401)
+
+# ===== PRÉSENCE =====
+
+class PresenceTestCase(APITestCase):
+    """Présence éphémère dans le cache : expiration, statut affiché, aucune écriture du profil"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('presence', 'presence@example.com', 'secret')
+        cls.friend = User.objects.create_user('amie', 'amie@example.com', 'secret')
+        for user in (cls.user, cls.friend):
+            UserProfile.objects.create(user=user)
+        Contact.objects.create(user=cls.user, contact=cls.friend, status='accepted')
+
+    def setUp(self):
+        cache.clear()
+        get_counter().clear()
+        token_cache.clear()
+        revocation_index.clear()
+        revocation_index.sync()
+        self.token = issue_token(self.user, device='presence')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def set_stored_status(self, user, status):
+        UserProfile.objects.filter(user=user).update(status=status)
+
+    def test_heartbeat_expires_after_ttl(self):
+        presence.heartbeat(self.user.id)
+        self.assertTrue(presence.is_online(self.user.id))
+        with mock.patch('django.core.cache.backends.locmem.time.time',
+                        return_value=time.time() + settings.PRESENCE_TTL + 1):
+            self.assertFalse(presence.is_online(self.user.id))
+
+    def test_online_user_ids(self):
+        presence.heartbeat(self.user.id)
+        presence.heartbeat(self.friend.id)
+        presence.go_offline(self.friend.id)
+        self.assertEqual(presence.online_user_ids([self.user.id, self.friend.id, 0]), {self.user.id})
+        self.assertEqual(presence.online_user_ids([]), set())
+
+    def test_effective_status(self):
+        self.assertEqual(presence.effective_status('busy', False), 'offline')
+        self.assertEqual(presence.effective_status('busy', True), 'busy')
+        self.assertEqual(presence.effective_status('away', True), 'away')
+        self.assertEqual(presence.effective_status('offline', True), 'online')
+        self.assertEqual(presence.effective_status('online', True), 'online')
+
+    def test_login_and_logout_leave_the_profile_untouched(self):
+        self.set_stored_status(self.user, 'busy')
+        self.client.credentials()
+        response = self.client.post('/api/auth/login/', {'email': 'presence@example.com', 'password': 'secret'},
+                                    format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(presence.is_online(self.user.id))
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {response.data["token"]}')
+        self.assertEqual(self.client.post('/api/auth/logout/').status_code, 200)
+        self.assertFalse(presence.is_online(self.user.id))
+        self.assertEqual(UserProfile.objects.get(user=self.user).status, 'busy')
+
+    def test_profile_status(self):
+        presence.heartbeat(self.user.id)
+        self.assertEqual(self.client.get('/api/profile/').data['profile']['status'], 'online')
+        self.set_stored_status(self.user, 'away')
+        self.assertEqual(self.client.get('/api/profile/').data['profile']['status'], 'away')
+        presence.go_offline(self.user.id)
+        self.assertEqual(self.client.get('/api/profile/').data['profile']['status'], 'offline')
+
+    def test_contact_status(self):
+        def friend_status():
+            contacts = self.client.get('/api/contacts/').data['accepted_contacts']
+            return [(contact['id'], contact['status']) for contact in contacts]
+
+        self.assertEqual(friend_status(), [(self.friend.id, 'offline')])
+        presence.heartbeat(self.friend.id)
+        self.assertEqual(friend_status(), [(self.friend.id, 'online')])
+        self.set_stored_status(self.friend, 'busy')
+        self.assertEqual(friend_status(), [(self.friend.id, 'busy')])
+
+    def test_locmem_refused_with_several_workers(self):
+        environment = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'config.settings', 'WEB_CONCURRENCY': '2'}
+        environment.pop('CACHE_BACKEND', None)
+        result = subprocess.run(
+            [sys.executable, '-c', 'import django; django.setup()'], env=environment,
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('la présence demande un cache partagé', result.stderr)
+
+        environment['CACHE_BACKEND'] = 'django.core.cache.backends.dummy.DummyCache'
+        result = subprocess.run(
+            [sys.executable, '-c', 'import django; django.setup()'], env=environment,
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+# ===== TOKENS D'AUTHENTIFICATION =====
+
+class TokenCacheTestCase(TestCase):
+    """Cache LRU des tokens : éviction, expiration et invalidation par signaux"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cache', 'cache@example.com', 'secret')
+        UserProfile.objects.create(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        get_counter().clear()
+        token_cache.clear()
+        revocation_index.clear()
+        revocation_index.sync()
+
+    def test_lru_eviction(self):
+        tokens = TokenCache(max_entries=2)
+        tokens.set('a', self.user, 'jeton a')
+        tokens.set('b', self.user, 'jeton b')
+        tokens.get('a')  # 'b' devient le moins récemment utilisé
+        tokens.set('c', self.user, 'jeton c')
+
+        self.assertEqual(len(tokens), 2)
+        self.assertIsNone(tokens.get('b'))
+        self.assertEqual(tokens.get('a'), (self.user, 'jeton a'))
+        self.assertEqual(tokens.get('c'), (self.user, 'jeton c'))
+
+    def test_ttl(self):
+        tokens = TokenCache(ttl=60)
+        with mock.patch('backend.authentication.time.monotonic', return_value=1000.0):
+            tokens.set('a', self.user, 'jeton a')
+        with mock.patch('backend.authentication.time.monotonic', return_value=1059.0):
+            self.assertEqual(tokens.get('a'), (self.user, 'jeton a'))
+        with mock.patch('backend.authentication.time.monotonic', return_value=1061.0):
+            self.assertIsNone(tokens.get('a'))
+        self.assertEqual((tokens.hits, tokens.misses, len(tokens)), (1, 1, 0))
+
+    def test_signal_invalidation(self):
+        token = issue_token(self.user, device='tablette')
+        token_cache.set(token.key, self.user, token)
+        self.user.save()  # is_active, mot de passe... : utilisateur rechargé
+        self.assertIsNone(token_cache.get(token.key))
+
+        token_cache.set(token.key, self.user, token)
+        token.delete()
+        self.assertIsNone(token_cache.get(token.key))
+
+    def test_cached_token_costs_no_query(self):
+        token = issue_token(self.user, device='tablette')
+        headers = {'HTTP_AUTHORIZATION': f'Token {token.key}'}
+        self.assertEqual(self.client.get('/api/profile/', **headers).status_code, 200)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/api/profile/', **headers).status_code, 200)
+        self.assertEqual([query['sql'] for query in queries if 'backend_authtoken' in query['sql']], [])
+
+
+class TokenLifecycleTestCase(APITestCase):
+    """Expiration glissante, révocation et quota d'appareils des tokens"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('jeton', 'jeton@example.com', 'secret')
+        UserProfile.objects.create(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        get_counter().clear()
+        token_cache.clear()
+        revocation_index.clear()
+        revocation_index.sync()
+
+    def get_profile(self, token):
+        return self.client.get('/api/profile/', HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def test_expired_token(self):
+        token = issue_token(self.user, device='tablette')
+        AuthToken.objects.filter(pk=token.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.get_profile(token).status_code, 401)
+
+    def test_sliding_renewal(self):
+        token = issue_token(self.user, device='tablette')
+        self.assertEqual(self.get_profile(token).status_code, 200)
+        token.refresh_from_db()
+        self.assertIsNone(token.last_used_at)  # moins de la moitié de la durée de vie consommée
+
+        token_cache.clear()
+        AuthToken.objects.filter(pk=token.pk).update(expires_at=timezone.now() + timedelta(days=10))
+        self.assertEqual(self.get_profile(token).status_code, 200)
+        token.refresh_from_db()
+        self.assertGreater(token.expires_at, timezone.now() + timedelta(days=29))
+        self.assertIsNotNone(token.last_used_at)
+
+    def test_revoked_token_still_in_cache(self):
+        token = issue_token(self.user, device='tablette')
+        self.assertEqual(self.get_profile(token).status_code, 200)
+        self.assertIsNotNone(token_cache.get(token.key))
+
+        # Révoqué par un autre worker : le cache local n'est pas prévenu, l'index si
+        AuthToken.objects.filter(pk=token.pk).update(revoked_at=timezone.now())
+        revocation_index.sync()
+        self.assertIsNotNone(token_cache.get(token.key))
+        self.assertEqual(self.get_profile(token).status_code, 401)
+        self.assertIsNone(token_cache.get(token.key))
+
+    @override_settings(AUTH_TOKEN_MAX_PER_USER=2)
+    def test_max_per_user_evicts_oldest_device(self):
+        oldest, middle = issue_token(self.user, device='ordinateur'), issue_token(self.user, device='tablette')
+        newest = issue_token(self.user, device='téléphone')
+
+        self.assertEqual(
+            set(AuthToken.objects.filter(revoked_at__isnull=True).values_list('device', flat=True)),
+            {'tablette', 'téléphone'},
+        )
+        self.assertEqual(self.get_profile(oldest).status_code, 401)
+        self.assertEqual(self.get_profile(middle).status_code, 200)
+        self.assertEqual(self.get_profile(newest).status_code, 200)
+
+    def test_logout_all_devices(self):
+        tokens = [issue_token(self.user, device=device) for device in ('ordinateur', 'tablette')]
+        response = self.client.post('/api/auth/logout/', {'all_devices': True}, format='json',
+                                    HTTP_AUTHORIZATION=f'Token {tokens[0].key}')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertFalse(AuthToken.objects.filter(revoked_at__isnull=True).exists())
+        for token in tokens:
+            self.assertEqual(self.get_profile(token).status_code, 401)
+
+    def test_purge_tokens(self):
+        now = timezone.now()
+        active = issue_token(self.user, device='actif')
+        recently_revoked = issue_token(self.user, device='révoqué récemment')
+        revoke_token(recently_revoked)
+        expired = issue_token(self.user, device='expiré')
+        revoked = issue_token(self.user, device='révoqué')
+        AuthToken.objects.filter(pk=expired.pk).update(expires_at=now - timedelta(minutes=1))
+        AuthToken.objects.filter(pk=revoked.pk).update(revoked_at=now - timedelta(hours=2))
+
+        out = StringIO()
+        call_command('purge_tokens', '--batch-size', '1', stdout=out)
+        self.assertIn('2 tokens supprimés', out.getvalue())
+        self.assertEqual(set(AuthToken.objects.values_list('pk', flat=True)), {active.pk, recently_revoked.pk})
+
+# ===== STOCKAGE MEDIA =====
+
+class MediaStorageTestCase(TestCase):
+    """Fichiers adressés par leur contenu, compteurs de références et sweep_media"""
+
+    other_gif = TINY_GIF + b'\x00'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = UserProfile.objects.create(user=User.objects.create_user('alice', 'alice@example.com', 'secret'))
+        cls.bruno = UserProfile.objects.create(user=User.objects.create_user('bruno', 'bruno@example.com', 'secret'))
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp(prefix='age2meet-media-')
+        self.addCleanup(shutil.rmtree, media_root, True)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
+
+    def ref_count(self, name):
+        return MediaBlob.objects.get(name=name).ref_count
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(dirpath, filename), storage.media_storage.location)
+            for dirpath, _, filenames in os.walk(storage.media_storage.location) for filename in filenames
+        )
+
+    def test_same_content_stored_once(self):
+        self.alice.profile_picture.save('photo.gif', ContentFile(TINY_GIF))
+        self.bruno.profile_picture.save('autre.GIF', ContentFile(TINY_GIF))
+
+        name = self.alice.profile_picture.name
+        self.assertTrue(storage.is_content_addressed(name))
+        self.assertEqual(self.bruno.profile_picture.name, name)
+        self.assertEqual(self.stored_files(), [name])
+        self.assertEqual(self.ref_count(name), 2)
+
+    def test_concurrent_upload_reuses_hashed_name(self):
+        self.alice.profile_picture.save('photo.gif', ContentFile(TINY_GIF))
+        # Même contenu écrit par un autre upload entre exists() et l'écriture
+        with mock.patch.object(storage.ContentAddressedStorage, 'exists', return_value=False):
+            self.bruno.profile_picture.save('photo.gif', ContentFile(TINY_GIF))
+
+        self.assertEqual(self.bruno.profile_picture.name, self.alice.profile_picture.name)
+        self.assertEqual(self.stored_files(), [self.alice.profile_picture.name])
+
+    def test_replace_and_delete(self):
+        self.alice.profile_picture.save('photo.gif', ContentFile(TINY_GIF))
+        first = self.alice.profile_picture.name
+        self.alice.profile_picture.save('photo.gif', ContentFile(self.other_gif))
+        second = self.alice.profile_picture.name
+        self.assertEqual((self.ref_count(first), self.ref_count(second)), (0, 1))
+
+        UserProfile.objects.get(pk=self.alice.pk).delete()
+        self.assertEqual(self.ref_count(second), 0)
+
+    def test_sweep_media(self):
+        self.alice.profile_picture.save('photo.gif', ContentFile(TINY_GIF))
+        orphan = self.alice.profile_picture.name
+        self.alice.profile_picture.save('photo.gif', ContentFile(self.other_gif))
+        kept = self.alice.profile_picture.name
+        # Compteur faux : sweep_media vérifie auprès des modèles avant de supprimer
+        MediaBlob.objects.filter(name=kept).update(ref_count=0)
+
+        out = StringIO()
+        call_command('sweep_media', '--grace-hours', '0', '--dry-run', stdout=out)
+        self.assertIn(orphan, out.getvalue())
+        self.assertEqual(len(self.stored_files()), 2)
+
+        call_command('sweep_media', '--grace-hours', '0', stdout=StringIO())
+        self.assertEqual(self.stored_files(), [kept])
+        self.assertEqual(list(MediaBlob.objects.values_list('name', flat=True)), [kept])
+
+        call_command('sweep_media', '--recount', stdout=StringIO())
+        self.assertEqual(self.ref_count(kept), 1)
+
+    def test_sweep_grace_restarts_on_dedup_hit(self):
+        # Fichier écrit il y a deux jours, pas encore référencé par un modèle
+        name = storage.media_storage.save('profile_pics/photo.gif', ContentFile(TINY_GIF))
+        two_days_ago = timezone.now() - timedelta(days=2)
+        MediaBlob.objects.filter(name=name).update(updated_at=two_days_ago)
+        os.utime(storage.media_storage.path(name), (two_days_ago.timestamp(), two_days_ago.timestamp()))
+        out = StringIO()
+        call_command('sweep_media', '--dry-run', stdout=out)
+        self.assertIn(name, out.getvalue())
+
+        # Nouvel upload du même contenu, dont le modèle n'est pas encore enregistré
+        self.assertEqual(storage.media_storage.save('profile_pics/autre.gif', ContentFile(TINY_GIF)), name)
+        self.assertGreater(MediaBlob.objects.get(name=name).updated_at, two_days_ago)
+        self.assertGreater(storage.media_storage.get_modified_time(name), two_days_ago)
+
+        call_command('sweep_media', stdout=StringIO())
+        self.assertEqual(self.stored_files(), [name])
+
+        # Sans MediaBlob, la date de modification du fichier fait foi
+        MediaBlob.objects.all().delete()
+        call_command('sweep_media', stdout=StringIO())
+        self.assertEqual(self.stored_files(), [name])
+
+# ===== REQUÊTES LENTES =====
+
+@override_settings(SLOW_QUERY_LOG_ENABLED=True, SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_EXPLAIN_INTERVAL=3600)
+class SlowQueryLogTestCase(TestCase):
+    """Empreintes du SQL normalisé, agrégation et EXPLAIN des requêtes lentes"""
+
+    sql = 'SELECT "backend_user"."id" FROM "backend_user" WHERE "backend_user"."id" IN (%s, %s) AND username = %s'
+
+    def entry(self, ms, params=(1, 2, 'alice')):
+        normalized = slow_queries.normalize_sql(self.sql)
+        return {
+            'fingerprint': slow_queries.fingerprint(normalized), 'normalized_sql': normalized,
+            'sql': self.sql, 'params_for_explain': params, 'param_shapes': slow_queries.param_shapes(params),
+            'view_name': 'backend:contacts', 'origin': 'backend/views.py:1 in get', 'alias': 'default', 'ms': ms,
+        }
+
+    def test_normalize_sql(self):
+        self.assertEqual(
+            slow_queries.normalize_sql("SELECT *\n  FROM t WHERE id IN (1, 2, 3) AND name = 'l''île' AND x > 2.5"),
+            'SELECT * FROM t WHERE id IN (...) AND name = ? AND x > ?',
+        )
+        self.assertEqual(slow_queries.normalize_sql(self.sql).split('WHERE')[1],
+                         ' "backend_user"."id" IN (...) AND username = ?')
+        # Mêmes requêtes, autres valeurs ou autre nombre d'éléments : même empreinte
+        self.assertEqual(
+            slow_queries.fingerprint(slow_queries.normalize_sql('SELECT * FROM t WHERE id IN (%s, %s)')),
+            slow_queries.fingerprint(slow_queries.normalize_sql('SELECT * FROM t WHERE id IN (4, 5, 6)')),
+        )
+        self.assertNotEqual(
+            slow_queries.fingerprint(slow_queries.normalize_sql('SELECT * FROM t WHERE id = 1')),
+            slow_queries.fingerprint(slow_queries.normalize_sql('SELECT * FROM u WHERE id = 1')),
+        )
+
+    def test_param_shapes(self):
+        self.assertEqual(slow_queries.param_shapes((1, 'secret', None, [1, 2], 2.5)),
+                         ['int', 'str[6]', 'null', 'list[2]', 'float'])
+        self.assertEqual(slow_queries.param_shapes({'email': 'a@b.fr'}), {'email': 'str[6]'})
+        self.assertEqual(slow_queries.param_shapes([(1, 'a'), (2, 'b')], many=True), ['2 lignes', 'int', 'str[1]'])
+        self.assertEqual(slow_queries.param_shapes(None), [])
+
+    def test_aggregated_by_fingerprint(self):
+        slow_queries.record(self.entry(250))
+        slow_queries.record(self.entry(400, params=(7, 8, 'bruno')))
+
+        slow_query = SlowQuery.objects.get()
+        self.assertEqual((slow_query.calls, slow_query.total_ms, slow_query.max_ms, slow_query.last_ms),
+                         (2, 650, 400, 400))
+        self.assertEqual(slow_query.param_shapes, ['int', 'int', 'str[5]'])
+        self.assertNotIn('bruno', str(slow_query.param_shapes))
+        self.assertTrue(slow_query.explain)
+        self.assertIsNotNone(slow_query.explained_at)
+
+    def test_explain_refreshed_after_interval(self):
+        slow_queries.record(self.entry(250))
+        SlowQuery.objects.update(explain='ancien plan')
+        slow_queries.record(self.entry(250))
+        self.assertEqual(SlowQuery.objects.get().explain, 'ancien plan')
+
+        SlowQuery.objects.update(explained_at=timezone.now() - timedelta(seconds=3601))
+        slow_queries.record(self.entry(250))
+        self.assertNotEqual(SlowQuery.objects.get().explain, 'ancien plan')
+
+    def test_middleware_submits_slow_queries(self):
+        User.objects.create_user('lente', 'lente@example.com', 'secret')
+        request = RequestFactory().get('/api/contacts/')
+        middleware = SlowQueryLogMiddleware(lambda request: HttpResponse(str(User.objects.filter(
+            username__in=['lente', 'autre']).count())))
+        with mock.patch.object(slow_queries.slow_query_log, 'submit') as submit:
+            middleware(request)
+
+        entry = submit.call_args.args[0]
+        self.assertEqual(entry['normalized_sql'].count('(...)'), 1)
+        self.assertEqual(entry['param_shapes'], ['str[5]', 'str[5]'])
+        self.assertEqual(entry['params_for_explain'], ('lente', 'autre'))
+        self.assertTrue(entry['origin'].startswith('backend/tests.py:'))
+
+# ===== DÉTECTION DES N+1 =====
+
+def lazy_senders(request):
+    names = []
+    for message in Message.objects.order_by('id'):
+        names.append(message.sender.username)
+    return HttpResponse(', '.join(names))
+
+
+LAZY_SENDER_LINE = lazy_senders.__code__.co_firstlineno + 3
+
+
+def joined_senders(request):
+    return HttpResponse(', '.join(
+        message.sender.username for message in Message.objects.select_related('sender').order_by('id')
+    ))
+
+
+@override_settings(NPLUSONE_THRESHOLD=3)
+class NPlusOneTestCase(TestCase):
+    """Détection d'un chargement paresseux dans une boucle, selon NPLUSONE_MODE"""
+
+    @classmethod
+    def setUpTestData(cls):
+        receiver = User.objects.create_user('destinataire', 'destinataire@example.com', 'secret')
+        for index in range(4):
+            sender = User.objects.create_user(f'auteur{index}', f'auteur{index}@example.com', 'secret')
+            Message.objects.create(sender=sender, receiver=receiver, content=f'Message {index}')
+
+    def call(self, view):
+        return NPlusOneMiddleware(view)(RequestFactory().get('/api/messages/'))
+
+    @override_settings(NPLUSONE_MODE='raise')
+    def test_raise_reports_call_site_and_relation(self):
+        before = nplusone.nplusone_detected.value(view='unresolved')
+        with self.assertRaises(nplusone.NPlusOneError) as raised:
+            self.call(lazy_senders)
+
+        message = str(raised.exception)
+        self.assertIn(f'4 requêtes identiques depuis backend/tests.py:{LAZY_SENDER_LINE} in lazy_senders', message)
+        self.assertIn('chargement paresseux de Message.sender', message)
+        self.assertEqual(nplusone.nplusone_detected.value(view='unresolved'), before + 1)
+        self.assertEqual(self.call(joined_senders).status_code, 200)
+
+    @override_settings(NPLUSONE_MODE='log')
+    def test_log(self):
+        with self.assertLogs('backend.nplusone', 'WARNING') as logs:
+            self.assertEqual(self.call(lazy_senders).status_code, 200)
+        self.assertIn(f'backend/tests.py:{LAZY_SENDER_LINE}', logs.output[0])
+
+    @override_settings(NPLUSONE_MODE='sample', NPLUSONE_SAMPLE_RATE=0.5)
+    def test_sample(self):
+        with mock.patch('config.middleware.random.random', return_value=0.7), \
+                self.assertNoLogs('backend.nplusone', 'WARNING'):
+            self.call(lazy_senders)
+        with mock.patch('config.middleware.random.random', return_value=0.2), \
+                self.assertLogs('backend.nplusone', 'WARNING'):
+            self.call(lazy_senders)
+
+    @override_settings(NPLUSONE_MODE='off')
+    def test_off(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            NPlusOneMiddleware(lazy_senders)
+
+# ===== PROFILAGE À LA DEMANDE =====
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0.0, PROFILING_DEFAULT_PROFILER='cprofile')
+class RequestProfilingTestCase(APITestCase):
+    """?__profile réservé au staff : les autres membres reçoivent la réponse normale"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('equipe', 'equipe@example.com', 'secret', is_staff=True)
+        cls.member = User.objects.create_user('membre', 'membre@example.com', 'secret')
+        for user in (cls.staff, cls.member):
+            UserProfile.objects.create(user=user)
+
+    def setUp(self):
+        cache.clear()
+        get_counter().clear()
+        token_cache.clear()
+        revocation_index.clear()
+        revocation_index.sync()
+
+    def get_profile(self, user, mode):
+        token = issue_token(user, device='profilage')
+        return self.client.get(f'/api/profile/?__profile={mode}', HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def test_staff_gets_report(self):
+        response = self.get_profile(self.staff, 'json')
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual((report['path'], report['status'], report['trigger']),
+                         ('/api/profile/?__profile=json', 200, 'explicit'))
+        self.assertEqual(report['user_id'], self.staff.id)
+        self.assertGreater(report['sql']['count'], 0)
+        self.assertEqual(response['X-Profile-Id'], report['id'])
+        self.assertEqual(profiling.get_report(report['id'])['id'], report['id'])
+
+        text = self.get_profile(self.staff, '1')
+        self.assertTrue(text['Content-Type'].startswith('text/plain'))
+        self.assertIn('GET /api/profile/?__profile=1 -> 200', text.content.decode())
+
+    def test_staff_store_keeps_response(self):
+        response = self.get_profile(self.staff, 'store')
+        self.assertEqual(response.json()['user']['id'], self.staff.id)
+        self.assertIsNotNone(profiling.get_report(response['X-Profile-Id']))
+
+    def test_member_gets_normal_response(self):
+        response = self.get_profile(self.member, 'json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['id'], self.member.id)
+        self.assertFalse(response.has_header('X-Profile-Id'))
+        self.assertEqual(profiling.recent_reports(), [])
+
+        anonymous = self.client.get('/api/home/?__profile=json')
+        self.assertEqual(anonymous.status_code, 401)
+        self.assertFalse(anonymous.has_header('X-Profile-Id'))
+
+# ===== JOURNALISATION =====
+
+class RequestIdLoggingTestCase(SimpleTestCase):
+    """Identifiant X-Request-ID repris ou généré, présent sur chaque ligne JSON de la requête"""
+
+    def setUp(self):
+        self.stream = StringIO()
+        handler = BackgroundQueueHandler(stream=self.stream, format='json')
+        handler.addFilter(RequestContextFilter())
+        self.logger = logging.getLogger('backend.tests.request_id')
+        self.logger.addHandler(handler)
+        self.logger.propagate = False
+        self.addCleanup(setattr, self.logger, 'propagate', True)
+        self.addCleanup(self.logger.removeHandler, handler)
+        self.handler = handler
+
+    def call(self, **headers):
+        def view(request):
+            self.logger.warning('Vue appelée', extra={'user_id': 3})
+            return HttpResponse('ok')
+
+        response = RequestIdMiddleware(view)(RequestFactory().get('/api/contacts/', **headers))
+        self.logger.warning('Hors requête')
+        self.handler.close()  # vide la file du listener
+        return response, [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_incoming_request_id(self):
+        response, (inside, outside) = self.call(HTTP_X_REQUEST_ID='proxy-42.a')
+        self.assertEqual(response['X-Request-ID'], 'proxy-42.a')
+        self.assertEqual(
+            {key: inside[key] for key in ('request_id', 'method', 'path', 'message', 'user_id', 'level')},
+            {'request_id': 'proxy-42.a', 'method': 'GET', 'path': '/api/contacts/', 'message': 'Vue appelée',
+             'user_id': 3, 'level': 'WARNING'},
+        )
+        self.assertNotIn('request_id', outside)
+
+    def test_generated_request_id(self):
+        response, (inside, _) = self.call(HTTP_X_REQUEST_ID='pas sûr\nX-Injected: 1')
+        self.assertRegex(response['X-Request-ID'], r'^[0-9a-f]{32}$')
+        self.assertEqual(inside['request_id'], response['X-Request-ID'])
+
+    def test_django_request_logged_after_middleware(self):
+        request = RequestFactory().post('/api/messages/')
+        request.id = 'apres-sortie'
+        record = logging.makeLogRecord({'msg': 'Bad Request', 'request': request})
+        RequestContextFilter().filter(record)
+        self.assertEqual((record.request_id, record.method, record.path), ('apres-sortie', 'POST', '/api/messages/'))
+
+
+class BackgroundQueueHandlerTestCase(SimpleTestCase):
+    """Écriture des logs après un fork et enregistrements perdus quand la file est pleine"""
+
+    def test_forked_child_writes(self):
+        fd, path = tempfile.mkstemp(prefix='age2meet-log-')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        with open(path, 'a') as stream:
+            handler = BackgroundQueueHandler(stream=stream, format='json')
+            logger = logging.getLogger('backend.tests.fork')
+            logger.addHandler(handler)
+            logger.propagate = False
+            self.addCleanup(setattr, logger, 'propagate', True)
+            self.addCleanup(logger.removeHandler, handler)
+            self.addCleanup(handler.close)
+
+            pid = os.fork()
+            if pid == 0:
+                # Processus enfant : le listener du parent n'existe pas ici
+                try:
+                    logger.error('Depuis le processus enfant')
+                    handler.close()
+                finally:
+                    os._exit(0)
+            os.waitpid(pid, 0)
+            logger.error('Depuis le parent')
+            handler.close()
+
+        with open(path) as f:
+            messages = [json.loads(line)['message'] for line in f]
+        self.assertEqual(messages, ['Depuis le processus enfant', 'Depuis le parent'])
+
+    def test_dropped_records_are_counted(self):
+        handler = BackgroundQueueHandler(stream=StringIO(), queue_size=1)
+        handler.stop_listener()  # plus personne ne vide la file
+        self.addCleanup(handler.close)
+        before = log_records_dropped.value()
+        with mock.patch('backend.structured_logging.sys.stderr', new_callable=StringIO) as stderr:
+            for index in range(4):
+                handler.handle(logging.makeLogRecord({'msg': f'Message {index}'}))
+        self.assertEqual(log_records_dropped.value(), before + 3)
+        self.assertIn('1 enregistrements de log perdus (file pleine, LOG_QUEUE_SIZE=1', stderr.getvalue())
+        self.assertEqual(stderr.getvalue().count('\n'), 1)  # une alerte par intervalle
+
+# ===== PROFILAGE MÉMOIRE =====
+
+class MemoryReportTestCase(SimpleTestCase):
+    """memory_report : fusion des fichiers des processus, tri et sites d'allocation"""
+
+    MB = 1024 * 1024
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='age2meet-memory-')
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        site = {'origin': 'backend/views.py:300 in get', 'allocator': 'json/encoder.py:200 in iterencode',
+                'size_total': 6 * self.MB, 'size_max': 4 * self.MB, 'count_total': 900, 'seen': 2}
+        self.write(1, {
+            'backend:messages': {'requests': 3, 'peak_max': 8 * self.MB, 'peak_total': 12 * self.MB,
+                                 'net_total': 3 * self.MB, 'snapshots': 2, 'sites': {'a': site}},
+            'backend:home': {'requests': 1, 'peak_max': 5 * self.MB, 'peak_total': 5 * self.MB,
+                             'net_total': 0, 'snapshots': 0, 'sites': {}},
+        })
+        self.write(2, {
+            'backend:messages': {'requests': 1, 'peak_max': 2 * self.MB, 'peak_total': 2 * self.MB,
+                                 'net_total': self.MB, 'snapshots': 1, 'sites': {'a': dict(site, size_total=3 * self.MB)}},
+        })
+
+    def write(self, pid, views):
+        with open(os.path.join(self.directory, f'memory-{pid}.json'), 'w') as f:
+            json.dump({'pid': pid, 'updated_at': 0, 'views': views}, f)
+
+    def report(self, *args):
+        out = StringIO()
+        call_command('memory_report', '--dir', self.directory, *args, stdout=out)
+        return out.getvalue()
+
+    def test_json_merges_processes(self):
+        messages, home = json.loads(self.report('--json'))
+        self.assertEqual(
+            {key: messages[key] for key in ('view', 'requests', 'peak_max', 'peak_avg', 'net_avg')},
+            {'view': 'backend:messages', 'requests': 4, 'peak_max': 8 * self.MB, 'peak_avg': round(3.5 * self.MB),
+             'net_avg': self.MB},
+        )
+        self.assertEqual(messages['sites'], [{
+            'origin': 'backend/views.py:300 in get', 'allocator': 'json/encoder.py:200 in iterencode',
+            'size_avg': 3 * self.MB, 'size_max': 4 * self.MB, 'count_avg': 600,
+        }])
+        self.assertEqual((home['view'], home['sites']), ('backend:home', []))
+
+    def test_sort_and_filter(self):
+        self.assertEqual([view['view'] for view in json.loads(self.report('--json', '--sort', 'avg'))],
+                         ['backend:home', 'backend:messages'])
+        self.assertEqual([view['view'] for view in json.loads(self.report('--json', '--view', 'backend:home'))],
+                         ['backend:home'])
+
+    def test_text(self):
+        output = self.report('--limit', '1')
+        self.assertIn('backend:messages', output)
+        self.assertIn('4 requêtes  pic max     8.00 Mo  pic moyen     3.50 Mo', output)
+        self.assertIn('backend/views.py:300 in get  ->  json/encoder.py:200 in iterencode', output)
+        self.assertNotIn('backend:home', output)
+
+    def test_reset(self):
+        self.assertIn('2 fichiers de mesures supprimés', self.report('--reset'))
+        self.assertIn('Aucune mesure', self.report())
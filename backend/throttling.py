@@ -0,0 +1,181 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import SimpleRateThrottle
+
+from .metrics import counter
+
+# ===== COMPTEURS À FENÊTRE GLISSANTE =====
+#
+# Approximation classique à deux fenêtres fixes : le nombre de requêtes sur la
+# dernière période vaut  précédente * (1 - écoulé / durée) + courante.
+# Mémoire constante par clé, aucune liste d'horodatages à maintenir.
+
+throttle_requests = counter(
+    'age2meet_throttle_requests_total',
+    "Requêtes évaluées par les throttles, par scope et résultat",
+    ('scope', 'outcome'),
+)
+
+
+def sliding_window_wait(current, previous, limit, elapsed, duration):
+    """Secondes avant que l'estimation repasse sous la limite"""
+    if limit <= 0:
+        # Budget nul ('0/min') : tout est refusé, réessayer après une période
+        return float(duration)
+    remaining = duration - elapsed
+    if current >= limit:
+        # La fenêtre courante deviendra la précédente : attendre qu'elle pèse assez peu
+        return remaining + duration * (1 - limit / current)
+    return max(0.0, duration * (1 - (limit - current) / previous) - elapsed)
+
+
+class LocalSlidingWindowCounter:
+    """
+    Compteur en mémoire locale, sans verrou : une course entre deux threads
+    peut au pire perdre un incrément, ce qui est acceptable pour un throttle.
+    """
+    prune_every = 1000
+
+    def __init__(self):
+        self._windows = {}  # key -> [fenêtre, courante, précédente, durée]
+        self._hits = 0
+
+    def hit(self, key, limit, duration, now=None):
+        now = time.time() if now is None else now
+        window = int(now // duration)
+        state = self._windows.get(key)
+        if state is None or state[0] < window - 1:
+            state = self._windows[key] = [window, 0, 0, duration]
+        elif state[0] == window - 1:
+            state[:] = [window, 0, state[1], duration]
+
+        elapsed = now - window * duration
+        estimate = state[2] * (1 - elapsed / duration) + state[1]
+        if estimate >= limit:
+            return False, sliding_window_wait(state[1], state[2], limit, elapsed, duration)
+
+        state[1] += 1
+        self._hits += 1
+        if self._hits % self.prune_every == 0:
+            self.prune(now)
+        return True, None
+
+    def prune(self, now=None):
+        """Oublier les clés inactives depuis plus de deux fenêtres"""
+        now = time.time() if now is None else now
+        for key, state in list(self._windows.items()):
+            if (state[0] + 2) * state[3] <= now:
+                self._windows.pop(key, None)
+
+    def clear(self):
+        self._windows.clear()
+
+
+class CacheSlidingWindowCounter:
+    """Compteur partagé entre workers via le cache Django (Redis, Memcached, base...)"""
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def hit(self, key, limit, duration, now=None):
+        now = time.time() if now is None else now
+        window = int(now // duration)
+        current_key = f'throttle:{key}:{window}'
+        previous_key = f'throttle:{key}:{window - 1}'
+        values = self.cache.get_many([current_key, previous_key])
+        current = values.get(current_key, 0)
+        previous = values.get(previous_key, 0)
+
+        elapsed = now - window * duration
+        estimate = previous * (1 - elapsed / duration) + current
+        if estimate >= limit:
+            return False, sliding_window_wait(current, previous, limit, elapsed, duration)
+
+        timeout = 2 * duration + 1
+        if not self.cache.add(current_key, 1, timeout=timeout):
+            try:
+                self.cache.incr(current_key)
+            except ValueError:
+                # Clé expirée entre add() et incr()
+                self.cache.set(current_key, 1, timeout=timeout)
+        return True, None
+
+    def clear(self):
+        pass
+
+
+_counter = None
+
+
+def get_counter():
+    """Compteur configuré par THROTTLE_COUNTER_BACKEND ('local' ou 'cache')"""
+    global _counter
+    if _counter is None:
+        if getattr(settings, 'THROTTLE_COUNTER_BACKEND', 'local') == 'cache':
+            _counter = CacheSlidingWindowCounter(getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default'))
+        else:
+            _counter = LocalSlidingWindowCounter()
+    return _counter
+
+
+# ===== THROTTLES DRF =====
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """
+    Throttle dont le scope est déterminé à chaque requête (voir get_scope) et
+    dont les budgets viennent de REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'].
+    DRF ajoute l'en-tête Retry-After à partir de wait().
+    """
+
+    def __init__(self):
+        # Le taux dépend du scope, connu seulement dans allow_request()
+        self._wait = None
+
+    def get_scope(self, request, view):
+        raise NotImplementedError('.get_scope() must be overridden')
+
+    def get_ident_for(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        self.scope = self.get_scope(request, view)
+        if not self.scope or self.scope not in self.THROTTLE_RATES:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        if self.rate is None:
+            return True
+
+        key = self.cache_format % {'scope': self.scope, 'ident': self.get_ident_for(request)}
+        allowed, self._wait = get_counter().hit(key, self.num_requests, self.duration)
+        throttle_requests.inc(scope=self.scope, outcome='allowed' if allowed else 'throttled')
+        return allowed
+
+    def wait(self):
+        return math.ceil(self._wait) if self._wait is not None else None
+
+
+class UserBudgetThrottle(SlidingWindowThrottle):
+    """Budget global par utilisateur (scope 'user') ou par IP pour les anonymes ('anon')"""
+
+    def get_scope(self, request, view):
+        return 'user' if request.user and request.user.is_authenticated else 'anon'
+
+
+class EndpointRateThrottle(SlidingWindowThrottle):
+    """
+    Budget par endpoint, déclaré sur la vue :
+        throttle_scope = 'auth'
+        throttle_scope = {'GET': 'messages_read', 'POST': 'messages_write'}
+    """
+
+    def get_scope(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if isinstance(scope, dict):
+            return scope.get(request.method)
+        return scope
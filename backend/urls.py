@@ -16,8 +16,16 @@ urlpatterns = [
     # NOUVELLE ROUTE pour l'upload de photo (si solution 2)
     path('profile/upload-picture/', views.ProfilePictureUploadView.as_view(), name='profile_picture_upload'),
     
+    # ===== PRÉSENCE =====
+    path('presence/heartbeat/', views.PresenceHeartbeatView.as_view(), name='presence_heartbeat'),
+    
     # ===== MESSAGERIE =====
     path('messages/', views.MessageView.as_view(), name='messages'),
+    path('messages/batch/read/', views.MessageBatchReadView.as_view(), name='messages_batch_read'),
+    path('messages/batch/delete/', views.MessageBatchDeleteView.as_view(), name='messages_batch_delete'),
+    path('messages/batch/send/', views.MessageBatchSendView.as_view(), name='messages_batch_send'),
+    path('conversations/', views.ConversationView.as_view(), name='conversations'),
+    path('conversations/<int:conversation_id>/messages/', views.ConversationMessageView.as_view(), name='conversation_messages'),
     
     # ===== CONTACTS =====
     path('contacts/', views.ContactView.as_view(), name='contacts'),
@@ -32,6 +40,7 @@ urlpatterns = [
     path('activities/<int:activity_id>/', views.ActivityDetailView.as_view(), name='activity_detail'),
     path('activities/register/', views.ActivityRegistrationView.as_view(), name='activity_register'),
     path('activities/registration/<int:registration_id>/', views.ActivityRegistrationView.as_view(), name='activity_registration_cancel'),
+    path('activities/<int:activity_id>/conversation/', views.ActivityConversationView.as_view(), name='activity_conversation'),
     path('user/activities/', views.UserActivityView.as_view(), name='user_activities'),
     
     # ===== NOTIFICATIONS =====
@@ -48,6 +57,10 @@ urlpatterns = [
     # ===== AVIS =====
     path('reviews/', views.ReviewView.as_view(), name='reviews'),
     
+    # ===== PROFILAGE (STAFF) =====
+    path('debug/profiles/', views.RequestProfileListView.as_view(), name='request_profiles'),
+    path('debug/profiles/<str:profile_id>/', views.RequestProfileDetailView.as_view(), name='request_profile_detail'),
+    
     # ===== DOCUMENTATION =====
     path('docs/', APIDocsView.as_view(), name='api_docs'),
 ] 
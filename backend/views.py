@@ -1,30 +1,39 @@
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST, require_GET
 from django.utils.decorators import method_decorator
 from django.views import View
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Q, F, Count, Sum, Exists, OuterRef, Prefetch
 from django.utils import timezone
+from django.conf import settings
 from rest_framework import status, viewsets, generics, permissions
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
-from rest_framework.authtoken.models import Token
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.views import APIView
+import hmac
 import json
+import logging
 from datetime import datetime, timedelta
-from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
-from .models import User, UserProfile, Contact, Message, Event, Review, TutorialVideo, Activity, ActivityRegistration, Notification, UserStatistics
+from rest_framework.parsers import MultiPartParser, FormParser
+from .models import User, UserProfile, Contact, Message, ConversationMember, Event, Review, Activity, ActivityRegistration, Notification
 from .serializers import *
+from .authentication import issue_token, revoke_token
+from . import aggregates, conditional, conversations, notifications, presence, profiling, tasks
+from .metrics import registry as metrics_registry
+
+logger = logging.getLogger(__name__)
 
 # ===== VUES D'AUTHENTIFICATION =====
 
 class RegisterView(APIView):
     """Vue pour l'inscription"""
     permission_classes = [AllowAny]
+    throttle_scope = 'auth'
     
     def post(self, request):
         try:
@@ -49,12 +58,13 @@ class RegisterView(APIView):
             # Créer le profil utilisateur
             profile = UserProfile.objects.create(user=user)
             
-            # Créer le token
-            token, created = Token.objects.get_or_create(user=user)
+            # Créer le token (un par appareil, avec expiration)
+            token = issue_token(user, device=request.META.get('HTTP_USER_AGENT', ''))
             
             return Response({
                 'message': 'Inscription réussie',
                 'token': token.key,
+                'expires_at': token.expires_at,
                 'user_id': user.id,
                 'username': user.username
             }, status=status.HTTP_201_CREATED)
@@ -65,6 +75,7 @@ class RegisterView(APIView):
 class LoginView(APIView):
     """Vue pour la connexion"""
     permission_classes = [AllowAny]
+    throttle_scope = 'auth'
     
     def post(self, request):
         try:
@@ -73,23 +84,16 @@ class LoginView(APIView):
             
             user = authenticate(username=email, password=password)
             if user:
-                token, created = Token.objects.get_or_create(user=user)
-                
-                # Option 1: Ne pas forcer le statut - garder le statut précédent
-                # profile = user.profile
-                # profile.status = 'online'  # Commenté pour garder le statut choisi
-                # profile.save()
+                # Nouveau token pour cet appareil : les autres appareils restent connectés
+                token = issue_token(user, device=request.data.get('device') or request.META.get('HTTP_USER_AGENT', ''))
                 
-                # Option 2: Mettre 'online' seulement si c'était 'offline'
-                profile = user.profile
-                if profile.status == 'offline':
-                    profile.status = 'online'
-                    profile.save()
-                # Si c'était 'busy' ou 'away', on garde ce statut
+                # Présence éphémère : aucune écriture en base, 'busy'/'away' restent choisis
+                presence.heartbeat(user.id)
                 
                 return Response({
                     'message': 'Connexion réussie',
                     'token': token.key,
+                    'expires_at': token.expires_at,
                     'user_id': user.id,
                     'username': user.username
                 }, status=status.HTTP_200_OK)
@@ -106,15 +110,15 @@ class LogoutView(APIView):
     
     def post(self, request):
         try:
-            # Option: Ne forcer 'offline' que si l'utilisateur était 'online'
-            profile = request.user.profile
-            if profile.status == 'online':
-                profile.status = 'offline'
-                profile.save()
-            # Si c'était 'busy' ou 'away', on garde ce statut même déconnecté
+            # Hors ligne immédiatement (le statut choisi 'busy'/'away' est conservé)
+            presence.go_offline(request.user.id)
             
-            # Supprimer le token
-            request.user.auth_token.delete()
+            # Révoquer le token de cet appareil (ou de tous avec all_devices)
+            if request.data.get('all_devices'):
+                for token in request.user.auth_tokens.filter(revoked_at__isnull=True):
+                    revoke_token(token)
+            elif request.auth is not None:
+                revoke_token(request.auth)
             
             return Response({'message': 'Déconnexion réussie'}, status=status.HTTP_200_OK)
             
@@ -126,14 +130,15 @@ class LogoutView(APIView):
 class ProfileView(APIView):
     """Vue pour gérer le profil utilisateur"""
     permission_classes = [IsAuthenticated]
+    throttle_scope = {'PUT': 'uploads'}
     
-    # AJOUTEZ ces parsers pour accepter les fichiers
-    parser_classes = [MultiPartParser, FormParser, JSONParser]
+    # Parsers par défaut (REST_FRAMEWORK) : JSON, formulaires et fichiers
     
     def get(self, request):
         """Récupérer les informations du profil"""
         try:
             profile = request.user.profile
+            online = presence.is_online(request.user.id)
             data = {
                 'user': {
                     'id': request.user.id,
@@ -148,7 +153,7 @@ class ProfileView(APIView):
                     'bio': profile.bio,
                     'location': profile.location,
                     'interests': profile.interests,
-                    'status': profile.status,
+                    'status': presence.effective_status(profile.status, online),
                     'profile_picture': profile.profile_picture.url if profile.profile_picture else None,
                     'is_verified': profile.is_verified,
                 }
@@ -164,23 +169,28 @@ class ProfileView(APIView):
             user = request.user
             profile = user.profile
             
-            print(f"📤 Content-Type: {request.content_type}")
-            print(f"📤 Données reçues: {request.data}")
-            print(f"📤 Fichiers reçus: {request.FILES}")
+            # Noms des champs seulement : jamais les valeurs saisies par le membre
+            logger.debug('Mise à jour du profil', extra={
+                'user_id': user.id,
+                'content_type': request.content_type,
+                'fields': sorted(request.data.keys()),
+                'files': sorted(request.FILES.keys()),
+            })
             
             # Déterminer si c'est un upload de fichier ou une mise à jour de données
             if 'profile_picture' in request.FILES:
                 # C'est un upload de photo
-                print("📸 Upload de photo détecté")
-                
                 uploaded_file = request.FILES['profile_picture']
-                print(f"📤 Fichier: {uploaded_file.name}, Taille: {uploaded_file.size}, Type: {uploaded_file.content_type}")
+                logger.debug('Upload de photo de profil', extra={
+                    'user_id': user.id,
+                    'size': uploaded_file.size,
+                    'file_content_type': uploaded_file.content_type,
+                })
                 
                 # Sauvegarder la photo
                 profile.profile_picture = uploaded_file
                 profile.save()
-                
-                print(f"✅ Photo sauvée: {profile.profile_picture.url}")
+                logger.info('Photo de profil mise à jour', extra={'user_id': user.id})
                 
                 # Retourner seulement les infos de profil mises à jour
                 response_data = {
@@ -189,7 +199,7 @@ class ProfileView(APIView):
                         'bio': profile.bio,
                         'location': profile.location,
                         'interests': profile.interests,
-                        'status': profile.status,
+                        'status': presence.effective_status(profile.status, presence.is_online(user.id)),
                         'profile_picture': profile.profile_picture.url if profile.profile_picture else None,
                         'is_verified': profile.is_verified,
                     }
@@ -197,8 +207,6 @@ class ProfileView(APIView):
                 
             else:
                 # C'est une mise à jour de données textuelles
-                print("📝 Mise à jour de données textuelles")
-                
                 # Mettre à jour les informations utilisateur
                 user.first_name = request.data.get('first_name', user.first_name)
                 user.last_name = request.data.get('last_name', user.last_name)
@@ -209,7 +217,18 @@ class ProfileView(APIView):
                 profile.bio = request.data.get('bio', profile.bio)
                 profile.location = request.data.get('location', profile.location)
                 profile.interests = request.data.get('interests', profile.interests)
-                profile.status = request.data.get('status', profile.status)
+                
+                # Seul un choix explicite ('busy', 'away') est persisté ;
+                # 'online'/'offline' reviennent à la présence automatique
+                requested_status = request.data.get('status')
+                if requested_status in presence.EXPLICIT_STATUSES:
+                    profile.status = requested_status
+                elif requested_status in ('online', 'offline'):
+                    profile.status = 'offline'
+                    if requested_status == 'online':
+                        presence.heartbeat(user.id)
+                    else:
+                        presence.go_offline(user.id)
                 profile.save()
                 
                 # Retourner les données complètes
@@ -228,26 +247,38 @@ class ProfileView(APIView):
                         'bio': profile.bio,
                         'location': profile.location,
                         'interests': profile.interests,
-                        'status': profile.status,
+                        'status': presence.effective_status(profile.status, presence.is_online(user.id)),
                         'profile_picture': profile.profile_picture.url if profile.profile_picture else None,
                         'is_verified': profile.is_verified,
                     }
                 }
             
-            print(f"📦 Réponse: {response_data}")
             return Response(response_data, status=status.HTTP_200_OK)
             
         except Exception as e:
-            print(f"❌ Erreur: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception('Échec de la mise à jour du profil', extra={'user_id': request.user.id})
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+# ===== VUES DE PRÉSENCE =====
+
+class PresenceHeartbeatView(APIView):
+    """Vue pour signaler que le client est toujours connecté"""
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        """Heartbeat : à envoyer toutes les PRESENCE_TTL / 3 secondes environ"""
+        presence.heartbeat(request.user.id)
+        return Response({
+            'status': presence.effective_status(request.user.profile.status, True),
+            'ttl': settings.PRESENCE_TTL,
+        }, status=status.HTTP_200_OK)
+
 # ===== VUES DE MESSAGERIE =====
 
 class MessageView(APIView):
     """Vue pour la messagerie"""
     permission_classes = [IsAuthenticated]
+    throttle_scope = {'GET': 'messages_read', 'POST': 'messages_write'}
     
     def get(self, request):
         """Récupérer les messages de l'utilisateur"""
@@ -259,18 +290,20 @@ class MessageView(APIView):
                 messages = Message.objects.filter(
                     Q(sender=request.user, receiver_id=user_id) |
                     Q(sender_id=user_id, receiver=request.user)
-                ).order_by('created_at')
+                ).select_related('sender', 'receiver').order_by('created_at')
                 
-                # Marquer les messages reçus comme lus
-                Message.objects.filter(
-                    sender_id=user_id, 
-                    receiver=request.user, 
-                    is_read=False
-                ).update(is_read=True)
+                # Marquer les messages reçus comme lus (?mark_read=0 : lecture seule,
+                # le client marque ensuite via /api/messages/batch/read/)
+                if request.GET.get('mark_read', '1') != '0':
+                    Message.objects.filter(
+                        sender_id=user_id, 
+                        receiver=request.user, 
+                        is_read=False
+                    ).update(is_read=True)
                 
             else:
                 # Tous les messages reçus
-                messages = Message.objects.filter(receiver=request.user)
+                messages = Message.objects.filter(receiver=request.user).select_related('sender', 'receiver')
             
             data = []
             for message in messages:
@@ -290,7 +323,7 @@ class MessageView(APIView):
                     },
                     'content': message.content,
                     'is_read': message.is_read,
-                    'created_at': message.created_at.isoformat(),
+                    'created_at': message.created_at,
                 })
             
             return Response(data, status=status.HTTP_200_OK)
@@ -334,36 +367,336 @@ class MessageView(APIView):
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+def parse_id_list(data, key):
+    """Liste d'identifiants entiers (sans doublons) de data[key], ou ValueError"""
+    values = data.get(key) or []
+    if not isinstance(values, list):
+        raise ValueError(f'{key} doit être une liste')
+    if len(values) > settings.MESSAGE_BATCH_MAX:
+        raise ValueError(f'{settings.MESSAGE_BATCH_MAX} éléments maximum par lot')
+    return list(dict.fromkeys(int(value) for value in values))
+
+
+def accepted_contact_ids(user, user_ids):
+    """Parmi user_ids, les amis de l'utilisateur (demande acceptée dans un sens ou l'autre) : une requête"""
+    pairs = Contact.objects.filter(
+        Q(user=user, contact_id__in=user_ids) | Q(contact=user, user_id__in=user_ids),
+        status='accepted',
+    ).values_list('user_id', 'contact_id')
+    return {contact_id if user_id == user.id else user_id for user_id, contact_id in pairs}
+
+
+class MessageBatchReadView(APIView):
+    """Marquer comme lus des messages et/ou des conversations entières en une requête"""
+    permission_classes = [IsAuthenticated]
+    throttle_scope = {'POST': 'messages_write'}
+    
+    def post(self, request):
+        """Body : {"message_ids": [...], "user_ids": [...]} (messages reçus uniquement)"""
+        try:
+            message_ids = parse_id_list(request.data, 'message_ids')
+            user_ids = parse_id_list(request.data, 'user_ids')
+            if not message_ids and not user_ids:
+                return Response({'error': 'message_ids ou user_ids requis'},
+                              status=status.HTTP_400_BAD_REQUEST)
+            
+            updated = Message.objects.filter(
+                Q(id__in=message_ids) | Q(sender_id__in=user_ids),
+                receiver=request.user,
+                is_read=False,
+            ).update(is_read=True, updated_at=timezone.now())
+            
+            return Response({
+                'message': f'{updated} messages marqués comme lus',
+                'updated': updated,
+            }, status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class MessageBatchDeleteView(APIView):
+    """Supprimer plusieurs messages envoyés par l'utilisateur en une requête"""
+    permission_classes = [IsAuthenticated]
+    throttle_scope = {'POST': 'messages_write'}
+    
+    def post(self, request):
+        """Body : {"message_ids": [...]} ; les messages reçus ou d'autres conversations sont ignorés"""
+        try:
+            message_ids = parse_id_list(request.data, 'message_ids')
+            if not message_ids:
+                return Response({'error': 'message_ids requis'}, status=status.HTTP_400_BAD_REQUEST)
+            
+            # Seulement les messages envoyés : un message reçu appartient aussi à son expéditeur.
+            # Ni relation dépendante ni signal sur Message : Django émet un seul DELETE
+            deleted, _ = Message.objects.filter(sender=request.user, id__in=message_ids).delete()
+            
+            return Response({
+                'message': f'{deleted} messages supprimés',
+                'deleted': deleted,
+            }, status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class MessageBatchSendView(APIView):
+    """Envoyer un même message à plusieurs contacts acceptés"""
+    permission_classes = [IsAuthenticated]
+    throttle_scope = {'POST': 'messages_write'}
+    
+    def post(self, request):
+        """Body : {"receiver_ids": [...], "content": "..."} ; tout ou rien si un destinataire n'est pas ami"""
+        try:
+            receiver_ids = parse_id_list(request.data, 'receiver_ids')
+            content = request.data.get('content')
+            
+            if not receiver_ids or not content:
+                return Response({'error': 'Destinataires et contenu requis'},
+                              status=status.HTTP_400_BAD_REQUEST)
+            
+            friends = accepted_contact_ids(request.user, receiver_ids)
+            not_friends = [receiver_id for receiver_id in receiver_ids if receiver_id not in friends]
+            if not_friends:
+                return Response({
+                    'error': 'Vous devez être amis pour envoyer un message',
+                    'not_friends': not_friends,
+                }, status=status.HTTP_403_FORBIDDEN)
+            
+            with transaction.atomic():
+                messages = Message.objects.bulk_create([
+                    Message(sender=request.user, receiver_id=receiver_id, content=content)
+                    for receiver_id in receiver_ids
+                ])
+            
+            return Response({
+                'message': f'{len(messages)} messages envoyés avec succès',
+                'message_ids': [message.id for message in messages],
+            }, status=status.HTTP_201_CREATED)
+            
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+# ===== VUES CONVERSATIONS DE GROUPE =====
+
+def user_summary(user):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+    }
+
+
+def group_message_data(message):
+    return {
+        'id': message.id,
+        'sender': user_summary(message.sender),
+        'content': message.content,
+        'created_at': message.created_at,
+    }
+
+
+def conversation_data(member):
+    """Fil vu depuis la boîte de réception du membre (non-lus, dernier message)"""
+    conversation = member.conversation
+    last_message = conversation.last_message
+    return {
+        'id': conversation.id,
+        'kind': conversation.kind,
+        'title': conversation.title,
+        'activity_id': conversation.activity_id,
+        'unread_count': member.unread_count,
+        'last_message': group_message_data(last_message) if last_message else None,
+        'last_message_at': conversation.last_message_at,
+    }
+
+
+class ConversationView(APIView):
+    """Vue pour les conversations de groupe de l'utilisateur"""
+    permission_classes = [IsAuthenticated]
+    throttle_scope = {'GET': 'messages_read', 'POST': 'messages_write'}
+    
+    def get(self, request):
+        """Conversations du membre, la plus récemment active d'abord (une requête)"""
+        try:
+            members = ConversationMember.objects.filter(user=request.user).select_related(
+                'conversation__last_message__sender'
+            ).order_by(F('conversation__last_message_at').desc(nulls_last=True), '-conversation_id')
+            
+            data = [conversation_data(member) for member in members]
+            return Response({
+                'conversations': data,
+                'unread_count': sum(conversation['unread_count'] for conversation in data),
+            }, status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    def post(self, request):
+        """Créer un groupe : {"title": "...", "member_ids": [...]} (contacts acceptés uniquement)"""
+        try:
+            title = request.data.get('title')
+            member_ids = parse_id_list(request.data, 'member_ids')
+            
+            if not title or not member_ids:
+                return Response({'error': 'Titre et membres requis'}, status=status.HTTP_400_BAD_REQUEST)
+            
+            friends = accepted_contact_ids(request.user, member_ids)
+            not_friends = [member_id for member_id in member_ids if member_id not in friends]
+            if not_friends:
+                return Response({
+                    'error': 'Les membres d\'un groupe doivent être vos amis',
+                    'not_friends': not_friends,
+                }, status=status.HTTP_403_FORBIDDEN)
+            
+            conversation = conversations.create_group(request.user, title, member_ids)
+            
+            return Response({
+                'message': 'Groupe créé avec succès',
+                'conversation_id': conversation.id,
+            }, status=status.HTTP_201_CREATED)
+            
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ConversationMessageView(APIView):
+    """Vue pour lire (par pages) et écrire dans une conversation de groupe"""
+    permission_classes = [IsAuthenticated]
+    throttle_scope = {'GET': 'messages_read', 'POST': 'messages_write'}
+    
+    def get(self, request, conversation_id):
+        """Messages du plus récent au plus ancien ; ?before=<id> pour la page suivante"""
+        try:
+            member = get_object_or_404(
+                ConversationMember.objects.select_related('conversation__last_message__sender'),
+                conversation_id=conversation_id, user=request.user,
+            )
+            before = request.GET.get('before')
+            limit = min(int(request.GET.get('limit', settings.CONVERSATION_PAGE_SIZE)), settings.CONVERSATION_PAGE_MAX)
+            
+            messages, next_before = conversations.page(
+                member.conversation, before=int(before) if before else None, limit=max(limit, 1),
+            )
+            # Première page lue : tout le fil est considéré comme lu
+            if before is None and messages:
+                conversations.mark_read(member, messages[0].id)
+            
+            return Response({
+                'conversation': conversation_data(member),
+                'messages': [group_message_data(message) for message in messages],
+                'next_before': next_before,
+            }, status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    def post(self, request, conversation_id):
+        """Poster un message : une écriture, quel que soit le nombre de membres"""
+        try:
+            content = request.data.get('content')
+            if not content:
+                return Response({'error': 'Contenu requis'}, status=status.HTTP_400_BAD_REQUEST)
+            
+            member = get_object_or_404(
+                ConversationMember.objects.select_related('conversation'),
+                conversation_id=conversation_id, user=request.user,
+            )
+            message = conversations.post_message(member.conversation, request.user, content)
+            
+            return Response({
+                'message': 'Message envoyé avec succès',
+                'message_id': message.id,
+            }, status=status.HTTP_201_CREATED)
+            
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ActivityConversationView(APIView):
+    """Fil automatique d'une activité : organisateur et inscrits confirmés"""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, activity_id):
+        """Récupérer (et créer au premier accès) le fil de l'activité"""
+        try:
+            activity = get_object_or_404(Activity, id=activity_id)
+            if activity.organizer_id != request.user.id and not ActivityRegistration.objects.filter(
+                activity=activity, user=request.user, status='confirmed'
+            ).exists():
+                return Response({'error': 'Réservé aux participants de l\'activité'},
+                              status=status.HTTP_403_FORBIDDEN)
+            
+            conversation = conversations.activity_conversation(activity)
+            member = get_object_or_404(
+                ConversationMember.objects.select_related('conversation__last_message__sender'),
+                conversation=conversation, user=request.user,
+            )
+            
+            return Response(conversation_data(member), status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
 # ===== VUES DE CONTACTS =====
 
 class ContactView(APIView):
     """Vue pour gérer les contacts/amis"""
     permission_classes = [IsAuthenticated]
+    throttle_scope = {'POST': 'contact_requests'}
     
     def get(self, request):
         """Récupérer la liste des contacts"""
         try:
+            # Version : relations affichées, fiches des deux côtés et présence en ligne
+            # (les identifiants des amis sont nécessaires pour lire la présence)
+            relations = list(Contact.objects.filter(
+                Q(user=request.user) | Q(contact=request.user), status__in=['accepted', 'pending']
+            ).values_list(
+                'id', 'user_id', 'contact_id', 'status', 'updated_at',
+                'user__updated_at', 'user__profile__updated_at', 'contact__updated_at', 'contact__profile__updated_at',
+            ).order_by('id'))
+            validators = conditional.Validators(request, 'contacts')
+            validators.add(relations, sorted(presence.online_user_ids(
+                [contact_id if user_id == request.user.id else user_id for _, user_id, contact_id, *_ in relations]
+            )))
+            validators.modified(*(timestamp for relation in relations for timestamp in relation[4:]))
+            not_modified = validators.not_modified()
+            if not_modified:
+                return not_modified
+            
             # Contacts acceptés
             accepted_contacts = Contact.objects.filter(
                 Q(user=request.user, status='accepted') |
                 Q(contact=request.user, status='accepted')
-            )
+            ).select_related('user__profile', 'contact__profile')
             
             # Demandes REÇUES (en attente)
             pending_requests = Contact.objects.filter(
                 contact=request.user,
                 status='pending'
-            )
+            ).select_related('user')
             
             # Demandes ENVOYÉES (en attente)
             sent_requests = Contact.objects.filter(
                 user=request.user,
                 status='pending'
+            ).select_related('contact__profile')
+            
+            # Présence de tous les amis et demandes envoyées en une seule lecture du cache
+            friendships = [
+                (contact, contact.contact if contact.user_id == request.user.id else contact.user)
+                for contact in accepted_contacts
+            ]
+            sent_requests = list(sent_requests)
+            online_ids = presence.online_user_ids(
+                [friend.id for _, friend in friendships] +
+                [request_obj.contact_id for request_obj in sent_requests]
             )
             
             contacts_data = []
-            for contact in accepted_contacts:
-                friend = contact.contact if contact.user == request.user else contact.user
+            for contact, friend in friendships:
                 contacts_data.append({
                     'id': friend.id,
                     'username': friend.username,
@@ -373,7 +706,7 @@ class ContactView(APIView):
                     'bio': friend.profile.bio or '',
                     'location': friend.profile.location or '',
                     'interests': friend.profile.interests or '',
-                    'status': friend.profile.status,
+                    'status': presence.effective_status(friend.profile.status, friend.id in online_ids),
                     'profile_picture': friend.profile.profile_picture.url if friend.profile.profile_picture else None,
                     'contact_relation_id': contact.id,
                 })
@@ -388,7 +721,7 @@ class ContactView(APIView):
                         'first_name': request_obj.user.first_name,
                         'last_name': request_obj.user.last_name,
                     },
-                    'created_at': request_obj.created_at.isoformat(),
+                    'created_at': request_obj.created_at,
                 })
             
             sent_requests_data = []
@@ -404,17 +737,17 @@ class ContactView(APIView):
                         'bio': request_obj.contact.profile.bio or '',
                         'location': request_obj.contact.profile.location or '',
                         'interests': request_obj.contact.profile.interests or '',
-                        'status': request_obj.contact.profile.status,
+                        'status': presence.effective_status(request_obj.contact.profile.status, request_obj.contact_id in online_ids),
                         'profile_picture': request_obj.contact.profile.profile_picture.url if request_obj.contact.profile.profile_picture else None,
                     },
-                    'created_at': request_obj.created_at.isoformat(),
+                    'created_at': request_obj.created_at,
                 })
             
-            return Response({
+            return validators.apply(Response({
                 'accepted_contacts': contacts_data,
                 'pending_requests': requests_data,
                 'sent_requests': sent_requests_data
-            }, status=status.HTTP_200_OK)
+            }, status=status.HTTP_200_OK))
             
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -544,9 +877,26 @@ class EventView(APIView):
     def get(self, request):
         """Récupérer les événements de l'utilisateur"""
         try:
+            # Version : événements visibles, puis participations (la somme des
+            # identifiants change à chaque inscription ou désinscription)
+            visible = Event.objects.filter(Q(user=request.user) | Q(is_public=True))
+            validators = conditional.Validators(request, 'events')
+            validators.aggregate(visible, timestamps=('updated_at', 'user__updated_at'))
+            validators.aggregate(Event.attendees.through.objects.filter(event__in=visible), timestamps=())
+            not_modified = validators.not_modified()
+            if not_modified:
+                return not_modified
+            
             # Événements de l'utilisateur + événements publics
-            user_events = Event.objects.filter(user=request.user)
-            public_events = Event.objects.filter(is_public=True).exclude(user=request.user)
+            # (organisateur, nombre de participants et participation annotés : pas de N+1)
+            events = Event.objects.select_related('user').annotate(
+                attendees_total=Count('attendees', distinct=True),
+                user_attending=Exists(
+                    Event.attendees.through.objects.filter(event=OuterRef('pk'), user=request.user)
+                ),
+            )
+            user_events = events.filter(user=request.user)
+            public_events = events.filter(is_public=True).exclude(user=request.user)
             
             # Combiner les querysets manuellement pour éviter l'erreur SQL
             all_events = list(user_events) + list(public_events)
@@ -559,21 +909,21 @@ class EventView(APIView):
                     'description': event.description,
                     'event_type': event.event_type,
                     'location': event.location,
-                    'start_date': event.start_date.isoformat(),
-                    'end_date': event.end_date.isoformat(),
+                    'start_date': event.start_date,
+                    'end_date': event.end_date,
                     'is_public': event.is_public,
-                    'is_owner': event.user == request.user,
+                    'is_owner': event.user_id == request.user.id,
                     'organizer': {
                         'id': event.user.id,
                         'username': event.user.username,
                         'first_name': event.user.first_name,
                         'last_name': event.user.last_name,
                     },
-                    'attendees_count': event.attendees.count(),
-                    'is_attending': request.user in event.attendees.all(),
+                    'attendees_count': event.attendees_total,
+                    'is_attending': event.user_attending,
                 })
             
-            return Response(events_data, status=status.HTTP_200_OK)
+            return validators.apply(Response(events_data, status=status.HTTP_200_OK))
             
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -609,68 +959,16 @@ class HomeView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        """Récupérer les données de la page d'accueil"""
+        """Récupérer les données de la page d'accueil (sections chargées en parallèle)"""
         try:
-            # Nouveaux contacts suggérés (utilisateurs pas encore ajoutés)
-            existing_contacts = Contact.objects.filter(
-                Q(user=request.user) | Q(contact=request.user)
-            ).values_list('user_id', 'contact_id')
-            
-            excluded_ids = set()
-            for user_id, contact_id in existing_contacts:
-                excluded_ids.add(user_id)
-                excluded_ids.add(contact_id)
-            excluded_ids.add(request.user.id)
-            
-            suggested_contacts = User.objects.exclude(id__in=excluded_ids)[:10]
-            
-            # Vidéos tutoriels
-            tutorial_videos = TutorialVideo.objects.filter(is_active=True)[:5]
-            
-            # Avis approuvés
-            reviews = Review.objects.filter(is_approved=True)[:5]
-            
-            # Données de réponse
-            data = {
-                'suggested_contacts': [
-                    {
-                        'id': user.id,
-                        'username': user.username,
-                        'first_name': user.first_name,
-                        'last_name': user.last_name,
-                        'profile_picture': user.profile.profile_picture.url if user.profile.profile_picture else None,
-                        'location': user.profile.location,
-                        'interests': user.profile.interests,
-                    }
-                    for user in suggested_contacts
-                ],
-                'tutorial_videos': [
-                    {
-                        'id': video.id,
-                        'title': video.title,
-                        'description': video.description,
-                        'video_url': video.video_url,
-                        'thumbnail': video.thumbnail.url if video.thumbnail else None,
-                    }
-                    for video in tutorial_videos
-                ],
-                'reviews': [
-                    {
-                        'id': review.id,
-                        'user': {
-                            'username': review.user.username,
-                            'first_name': review.user.first_name,
-                            'last_name': review.user.last_name,
-                        },
-                        'rating': review.rating,
-                        'comment': review.comment,
-                        'created_at': review.created_at.isoformat(),
-                    }
-                    for review in reviews
-                ]
-            }
+            validators = conditional.Validators(request, 'home')
+            aggregates.home_validators(validators, request.user)
+            not_modified = validators.not_modified()
+            if not_modified:
+                return not_modified
             
-            return Response(data, status=status.HTTP_200_OK)
+            data = aggregates.load_sections(aggregates.home_sections(request.user))
+            return validators.apply(Response(data, status=status.HTTP_200_OK))
             
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -729,8 +1027,25 @@ class ActivityView(APIView):
             if date_to:
                 activities = activities.filter(date__lte=datetime.fromisoformat(date_to))
             
+            # Version de la liste : les inscriptions changent le nombre d'inscrits et is_registered.
+            # La somme des identifiants confirmés seule peut retomber sur la même valeur
+            # (annuler 2 et 3, inscrire 5) : les nombres d'inscriptions, toutes et
+            # confirmées, distinguent chaque combinaison d'inscriptions et d'annulations.
+            confirmed = Q(registrations__status='confirmed')
+            validators = conditional.Validators(request, 'activities')
+            validators.aggregate(
+                activities, timestamps=('updated_at', 'organizer__updated_at'),
+                confirmed=Sum('registrations__id', filter=confirmed),
+                confirmed_count=Count('registrations', filter=confirmed),
+                registrations=Count('registrations'),
+            )
+            not_modified = validators.not_modified()
+            if not_modified:
+                return not_modified
+            
+            activities = activities.with_participation(request.user)
             serializer = ActivitySerializer(activities, many=True, context={'request': request})
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return validators.apply(Response(serializer.data, status=status.HTTP_200_OK))
             
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -757,7 +1072,7 @@ class ActivityDetailView(APIView):
     def get(self, request, activity_id):
         """Récupérer les détails d'une activité"""
         try:
-            activity = get_object_or_404(Activity, id=activity_id, is_active=True)
+            activity = get_object_or_404(Activity.objects.with_participation(request.user), id=activity_id, is_active=True)
             serializer = ActivitySerializer(activity, context={'request': request})
             
             # Ajouter la liste des participants
@@ -771,7 +1086,7 @@ class ActivityDetailView(APIView):
                 'username': reg.user.username,
                 'first_name': reg.user.first_name,
                 'last_name': reg.user.last_name,
-                'registration_date': reg.registration_date.isoformat(),
+                'registration_date': reg.registration_date,
             } for reg in participants]
             
             data = serializer.data
@@ -781,10 +1096,53 @@ class ActivityDetailView(APIView):
             
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    def put(self, request, activity_id):
+        """Modifier une activité (organisateur) et prévenir les inscrits"""
+        try:
+            activity = get_object_or_404(Activity, id=activity_id, organizer=request.user, is_active=True)
+            serializer = ActivityCreateSerializer(activity, data=request.data, partial=True, context={'request': request})
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            
+            changed_fields = [
+                field for field, value in serializer.validated_data.items()
+                if getattr(activity, field) != value
+            ]
+            activity = serializer.save()
+            notifying = notifications.activity_change_kind(activity, changed_fields) is not None
+            if notifying:
+                tasks.notify_activity_change.enqueue(activity.id, changed_fields)
+            
+            return Response({
+                'message': 'Activité modifiée avec succès',
+                'changed_fields': changed_fields,
+                'notifying': notifying,
+            }, status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    def delete(self, request, activity_id):
+        """Annuler une activité (organisateur) : elle est désactivée et les inscrits prévenus"""
+        try:
+            activity = get_object_or_404(Activity, id=activity_id, organizer=request.user, is_active=True)
+            activity.is_active = False
+            activity.save(update_fields=['is_active', 'updated_at'])
+            tasks.notify_activity_change.enqueue(activity.id, ['is_active'])
+            
+            return Response({
+                'message': 'Activité annulée',
+                'notifying': True,
+            }, status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 class ActivityRegistrationView(APIView):
     """Vue pour les inscriptions aux activités"""
     permission_classes = [IsAuthenticated]
+    throttle_scope = {'POST': 'activity_register'}
     
     def post(self, request):
         """S'inscrire à une activité"""
@@ -810,14 +1168,8 @@ class ActivityRegistrationView(APIView):
                 status='confirmed'
             )
             
-            # Créer une notification pour l'organisateur
-            Notification.objects.create(
-                user=activity.organizer,
-                title='Nouvelle inscription',
-                message=f'{request.user.first_name} {request.user.last_name} s\'est inscrit à votre activité "{activity.title}"',
-                notification_type='activity_reminder',
-                related_object_id=activity.id
-            )
+            # Notification de l'organisateur : en tâche de fond, après le commit
+            tasks.notify_organizer_of_registration.enqueue(registration.id)
             
             return Response({
                 'message': 'Inscription réussie !',
@@ -860,10 +1212,12 @@ class UserActivityView(APIView):
             registered_activities = ActivityRegistration.objects.filter(
                 user=request.user,
                 status='confirmed'
-            ).select_related('activity')
+            ).prefetch_related(
+                Prefetch('activity', queryset=Activity.objects.with_participation(request.user))
+            )
             
             # Activités organisées
-            organized_activities = Activity.objects.filter(
+            organized_activities = Activity.objects.with_participation(request.user).filter(
                 organizer=request.user,
                 is_active=True
             )
@@ -871,7 +1225,7 @@ class UserActivityView(APIView):
             data = {
                 'registered_activities': [{
                     'registration_id': reg.id,
-                    'registration_date': reg.registration_date.isoformat(),
+                    'registration_date': reg.registration_date,
                     'notes': reg.notes,
                     'activity': ActivitySerializer(reg.activity, context={'request': request}).data
                 } for reg in registered_activities],
@@ -893,15 +1247,23 @@ class NotificationView(APIView):
         """Récupérer les notifications de l'utilisateur"""
         try:
             notifications = Notification.objects.filter(user=request.user)
-            serializer = NotificationSerializer(notifications, many=True)
             
-            # Compter les notifications non lues
-            unread_count = notifications.filter(is_read=False).count()
+            # Version, et nombre de notifications non lues dans la même requête
+            validators = conditional.Validators(request, 'notifications')
+            version = validators.aggregate(
+                notifications, timestamps=('updated_at', 'user__updated_at'),
+                unread=Count('id', filter=Q(is_read=False)),
+            )
+            not_modified = validators.not_modified()
+            if not_modified:
+                return not_modified
             
-            return Response({
+            serializer = NotificationSerializer(notifications.select_related('user'), many=True)
+            
+            return validators.apply(Response({
                 'notifications': serializer.data,
-                'unread_count': unread_count
-            }, status=status.HTTP_200_OK)
+                'unread_count': version['unread']
+            }, status=status.HTTP_200_OK))
             
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -929,7 +1291,8 @@ class NotificationMarkAllReadView(APIView):
                 is_read=False
             ).update(
                 is_read=True, 
-                read_at=timezone.now()
+                read_at=timezone.now(),
+                updated_at=timezone.now()
             )
             
             return Response({
@@ -946,47 +1309,11 @@ class DashboardView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        """Récupérer les données du tableau de bord"""
+        """Récupérer les données du tableau de bord (sections chargées en parallèle)"""
         try:
-            user = request.user
-            
-            # Statistiques utilisateur (créer si n'existe pas)
-            stats, created = UserStatistics.objects.get_or_create(user=user)
-            
-            # Activités à venir
-            upcoming_activities = Activity.objects.filter(
-                registrations__user=user,
-                registrations__status='confirmed',
-                date__gte=timezone.now(),
-                is_active=True
-            ).distinct()[:5]
-            
-            # Messages récents
-            recent_messages = Message.objects.filter(
-                Q(sender=user) | Q(receiver=user)
-            ).order_by('-created_at')[:10]
-            
-            # Demandes d'amis en attente
-            pending_requests = Contact.objects.filter(
-                contact=user,
-                status='pending'
-            )[:5]
-            
-            # Notifications récentes
-            recent_notifications = Notification.objects.filter(
-                user=user
-            )[:10]
-            
-            data = {
-                'user_stats': UserStatisticsSerializer(stats).data,
-                'upcoming_activities': ActivitySerializer(upcoming_activities, many=True, context={'request': request}).data,
-                'recent_messages': MessageSerializer(recent_messages, many=True).data,
-                'pending_requests': ContactSerializer(pending_requests, many=True).data,
-                'recent_notifications': NotificationSerializer(recent_notifications, many=True).data,
-                'unread_messages_count': Message.objects.filter(receiver=user, is_read=False).count(),
-                'unread_notifications_count': Notification.objects.filter(user=user, is_read=False).count(),
-            }
-            
+            # Statistiques créées au besoin : écriture sur le thread de la requête, pas dans le pool
+            data = {'user_stats': aggregates.user_stats(request.user)}
+            data.update(aggregates.load_sections(aggregates.dashboard_sections(request.user, request)))
             return Response(data, status=status.HTTP_200_OK)
             
         except Exception as e:
@@ -995,6 +1322,7 @@ class DashboardView(APIView):
 class ProfilePictureUploadView(APIView):
     """Vue dédiée à l'upload de photo de profil"""
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'uploads'
     parser_classes = [MultiPartParser, FormParser]
     
     def post(self, request):
@@ -1024,3 +1352,41 @@ class ProfilePictureUploadView(APIView):
             
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+# ===== PROFILAGE =====
+
+class RequestProfileListView(APIView):
+    """Derniers rapports de profilage conservés (staff)"""
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        return Response(profiling.recent_reports(), status=status.HTTP_200_OK)
+
+class RequestProfileDetailView(APIView):
+    """Rapport de profilage complet, en JSON ou en texte avec ?as=text (staff)"""
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request, profile_id):
+        report = profiling.get_report(profile_id)
+        if report is None:
+            return Response({'error': 'Rapport introuvable ou expiré'}, status=status.HTTP_404_NOT_FOUND)
+        if request.GET.get('as') == 'text':
+            return HttpResponse(profiling.render_text(report), content_type='text/plain; charset=utf-8')
+        return Response(report, status=status.HTTP_200_OK)
+
+# ===== MÉTRIQUES =====
+
+class MetricsView(View):
+    """Exposition des métriques du worker au format texte Prometheus"""
+    
+    def get(self, request):
+        # Jeton Bearer requis si METRICS_TOKEN est défini, sinon seulement en DEBUG
+        expected = settings.METRICS_TOKEN
+        if expected:
+            # Comparaison en temps constant : le jeton ne se devine pas caractère par caractère
+            if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {expected}'.encode()):
+                return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+        elif not settings.DEBUG:
+            return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+        
+        return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
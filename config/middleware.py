@@ -1,6 +1,69 @@
 import os
-from django.http import HttpResponse, Http404
+import random
+import threading
+import time
+from contextlib import ExitStack
+from django.http import HttpResponse, Http404, JsonResponse
 from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.exceptions import AuthenticationFailed
+from backend import compression, db_routing, profiling
+from backend.memory_profiling import memory_profile, measure, start as start_tracemalloc
+from backend.nplusone import QueryShapeTracker, handle_offenders
+from backend.slow_queries import slow_query_log, normalize_sql, fingerprint, param_shapes
+from backend.authentication import CachedTokenAuthentication
+from backend.metrics import counter, histogram
+from backend.storage import is_content_addressed
+from backend.structured_logging import new_request_id, bind_request, unbind_request
+
+# Les fichiers nommés par leur hash ne changent jamais de contenu
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Métriques par vue (voir RequestMetricsMiddleware)
+request_latency = histogram(
+    'age2meet_http_request_duration_seconds', "Latence des requêtes HTTP", ('view', 'method'),
+)
+db_queries = histogram(
+    'age2meet_http_db_queries', "Requêtes SQL exécutées par requête HTTP", ('view',),
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+db_duration = histogram(
+    'age2meet_http_db_duration_seconds', "Temps passé en base par requête HTTP", ('view',),
+)
+response_size = histogram(
+    'age2meet_http_response_size_bytes', "Taille du corps des réponses", ('view',),
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+responses_total = counter(
+    'age2meet_http_responses_total', "Réponses HTTP par vue, méthode et classe de statut",
+    ('view', 'method', 'status'),
+)
+profiled_requests = counter(
+    'age2meet_profiled_requests_total', "Requêtes profilées par profileur et déclencheur",
+    ('profiler', 'trigger'),
+)
+
+class RequestIdMiddleware:
+    """
+    Identifiant de corrélation : X-Request-ID repris du proxy (ou généré),
+    renvoyé dans la réponse et ajouté à chaque ligne de log de la requête.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.id = new_request_id(request.META.get('HTTP_X_REQUEST_ID'))
+        tokens = bind_request(request.id, request.method, request.path)
+        try:
+            response = self.get_response(request)
+        finally:
+            unbind_request(tokens)
+        response['X-Request-ID'] = request.id
+        return response
+
 
 class MediaFilesMiddleware:
     def __init__(self, get_response):
@@ -36,9 +99,314 @@ class MediaFilesMiddleware:
                 
                 response = HttpResponse(content, content_type=content_type)
                 response['Content-Length'] = len(content)
+                if is_content_addressed(file_path):
+                    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
                 return response
             else:
                 raise Http404("Media file not found")
                 
         except Exception as e:
             raise Http404(f"Error serving media file: {e}")
+
+
+class ApiSessionMiddleware(SessionMiddleware):
+    """
+    SessionMiddleware qui ignore le cookie de session sur les routes /api/.
+    Les clients de l'API s'authentifient par token : une session vide ne
+    déclenche aucune requête SQL, ni en lecture ni en écriture.
+    """
+    api_prefix = '/api/'
+
+    def process_request(self, request):
+        if request.path.startswith(self.api_prefix):
+            request.session = self.SessionStore(None)
+        else:
+            super().process_request(request)
+
+    def process_response(self, request, response):
+        if request.path.startswith(self.api_prefix):
+            return response
+        return super().process_response(request, response)
+
+
+class QueryStats:
+    """Wrapper d'exécution SQL qui compte les requêtes et leur durée"""
+    __slots__ = ('count', 'duration', 'lock')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        # Les sections des endpoints agrégés s'exécutent sur plusieurs threads
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.duration += elapsed
+                self.count += 1
+
+
+class SlowQueryDetector:
+    """Wrapper d'exécution SQL qui confie les requêtes au-delà du seuil au journal des requêtes lentes"""
+    __slots__ = ('request', 'threshold')
+
+    def __init__(self, request, threshold):
+        self.request = request
+        self.threshold = threshold
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            if elapsed >= self.threshold:
+                self.report(sql, params, many, context, elapsed)
+
+    def report(self, sql, params, many, context, elapsed):
+        normalized = normalize_sql(sql)
+        # EXPLAIN seulement pour les lectures : ANALYZE exécute réellement la requête
+        explainable = not many and sql.lstrip()[:6].upper() == 'SELECT'
+        slow_query_log.submit({
+            'fingerprint': fingerprint(normalized),
+            'normalized_sql': normalized,
+            'sql': sql,
+            'params_for_explain': params if explainable else None,
+            'param_shapes': param_shapes(params, many),
+            'view_name': request_view_name(self.request),
+            'origin': profiling.query_origin(),
+            'alias': context['connection'].alias,
+            'ms': round(elapsed * 1000, 3),
+        })
+
+
+class RequestMetricsMiddleware:
+    """
+    Mesure chaque requête par nom d'URL (ex. 'backend:messages') : latence,
+    nombre et durée des requêtes SQL, taille de la réponse et classe de statut.
+    Les métriques sont exposées au format Prometheus sur /metrics.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(stats))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        view = request_view_name(request)
+        request_latency.observe(elapsed, view=view, method=request.method)
+        db_queries.observe(stats.count, view=view)
+        db_duration.observe(stats.duration, view=view)
+        if not response.streaming:
+            response_size.observe(len(response.content), view=view)
+        responses_total.inc(view=view, method=request.method, status=f'{response.status_code // 100}xx')
+        return response
+
+
+def request_view_name(request):
+    """Nom de la route résolue, ou une étiquette fixe pour borner la cardinalité"""
+    match = getattr(request, 'resolver_match', None)
+    if match is not None:
+        return match.view_name
+    if request.path.startswith(settings.MEDIA_URL):
+        return 'media'
+    return 'unresolved'
+
+
+class RequestProfilingMiddleware:
+    """
+    Profilage d'une requête à la demande (PROFILING_ENABLED), réservé au staff :
+        ?__profile=1          rapport texte à la place de la réponse
+        ?__profile=json       rapport JSON à la place de la réponse
+        ?__profile=store      réponse normale, rapport conservé (en-tête X-Profile-Id)
+        &__profiler=sampling  échantillonneur de pile au lieu de cProfile
+    PROFILING_SAMPLE_RATE profile en plus une fraction des requêtes de tous les
+    membres (échantillonneur, rapport conservé). Désactivé, le middleware est
+    retiré de la pile au démarrage : aucun surcoût.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+
+    def __call__(self, request):
+        mode = request.GET.get('__profile')
+        if mode is not None and is_staff_request(request):
+            profiler = request.GET.get('__profiler', settings.PROFILING_DEFAULT_PROFILER)
+            trigger = 'explicit'
+        elif self.sample_rate and random.random() < self.sample_rate:
+            mode, profiler, trigger = 'store', 'sampling', 'sampled'
+        else:
+            return self.get_response(request)
+        if profiler not in profiling.PROFILERS:
+            profiler = 'cprofile'
+
+        recorder = profiling.SqlRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            response, call_tree = profiling.profile_call(lambda: self.get_response(request), profiler)
+        elapsed = time.perf_counter() - start
+
+        report = profiling.build_report(request, response, profiler, trigger, elapsed, call_tree, recorder)
+        profiling.store_report(report)
+        profiled_requests.inc(profiler=profiler, trigger=trigger)
+
+        if mode == 'store':
+            response['X-Profile-Id'] = report['id']
+            return response
+        if mode == 'json':
+            profiled = JsonResponse(report)
+        else:
+            profiled = HttpResponse(profiling.render_text(report), content_type='text/plain; charset=utf-8')
+        profiled['X-Profile-Id'] = report['id']
+        return profiled
+
+
+def is_staff_request(request):
+    """Staff authentifié par token (cache, sans SQL en régime établi) ou par session"""
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if header.startswith('Token '):
+        try:
+            user, _ = CachedTokenAuthentication().authenticate_credentials(header[6:].strip())
+        except AuthenticationFailed:
+            return False
+        return user.is_staff
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_staff)
+
+
+class SlowQueryLogMiddleware:
+    """
+    Repère les requêtes SQL plus lentes que SLOW_QUERY_THRESHOLD_MS avec la vue
+    et la ligne de code d'origine. L'agrégation par empreinte et l'EXPLAIN sont
+    faits en arrière-plan ; consultation dans l'admin (Slow queries).
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SLOW_QUERY_LOG_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = settings.SLOW_QUERY_THRESHOLD_MS / 1000
+
+    def __call__(self, request):
+        detector = SlowQueryDetector(request, self.threshold)
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(detector))
+            return self.get_response(request)
+
+
+class NPlusOneMiddleware:
+    """
+    Détection des N+1 (NPLUSONE_MODE) : 'raise' lève NPlusOneError en fin de
+    requête (développement, tests), 'log' journalise avec la pile d'appels,
+    'sample' journalise pour une fraction NPLUSONE_SAMPLE_RATE des requêtes
+    (canary de production), 'off' retire le middleware de la pile.
+    """
+
+    def __init__(self, get_response):
+        self.mode = getattr(settings, 'NPLUSONE_MODE', 'off')
+        if self.mode not in ('raise', 'log', 'sample'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = settings.NPLUSONE_THRESHOLD
+        self.sample_rate = settings.NPLUSONE_SAMPLE_RATE if self.mode == 'sample' else 1.0
+
+    def __call__(self, request):
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        tracker = QueryShapeTracker(self.threshold)
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(tracker))
+            response = self.get_response(request)
+        handle_offenders(request_view_name(request), tracker.report(), self.mode)
+        return response
+
+
+class MemoryProfilingMiddleware:
+    """
+    Pic d'allocation Python de chaque requête par nom d'URL (MEMORY_PROFILING_ENABLED),
+    et sites d'allocation pour une fraction MEMORY_PROFILING_SNAPSHOT_RATE des
+    requêtes. Rapport : python manage.py memory_report.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'MEMORY_PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.snapshot_rate = settings.MEMORY_PROFILING_SNAPSHOT_RATE
+        self.top = settings.MEMORY_PROFILING_TOP
+        start_tracemalloc()
+
+    def __call__(self, request):
+        # Une autre requête est déjà mesurée dans ce processus : ses chiffres seraient faussés
+        if not memory_profile.measuring.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            snapshot = random.random() < self.snapshot_rate
+            response, measurement = measure(lambda: self.get_response(request), snapshot, self.top)
+        finally:
+            memory_profile.measuring.release()
+        memory_profile.record(request_view_name(request), measurement)
+        return response
+
+
+class CompressionMiddleware:
+    """
+    Compression négociée (Accept-Encoding) des réponses de l'API : Brotli si le
+    paquet brotli est installé, sinon gzip ; voir backend.compression. Placé
+    juste après RequestMetricsMiddleware, qui mesure ainsi la taille envoyée.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'COMPRESSION_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.paths = tuple(settings.COMPRESSION_PATHS)
+        self.excluded_paths = tuple(settings.COMPRESSION_EXCLUDED_PATHS)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        path = request.path
+        if path.startswith(self.paths) and not path.startswith(self.excluded_paths):
+            compression.compress_response(request, response)
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lectures des requêtes GET vers les réplicas (DATABASE_REPLICA_URLS), sauf
+    pour un membre qui vient d'écrire : voir backend.db_routing. Placé après
+    AuthenticationMiddleware pour les sessions ; les tokens sont reconnus par
+    CachedTokenAuthentication.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'DATABASE_REPLICAS', None):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with db_routing.routing(request.method) as state:
+            # Évaluer request.user charge la session : seulement si le client en a une
+            if settings.SESSION_COOKIE_NAME in request.COOKIES and request.user.is_authenticated:
+                db_routing.bind_user(request.user.id)
+            response = self.get_response(request)
+            db_routing.stick_to_primary(state)
+        return response
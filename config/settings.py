@@ -10,9 +10,10 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+from importlib.util import find_spec
 from pathlib import Path
 import os
-from decouple import config
+from decouple import config, Csv
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -62,14 +63,25 @@ INSTALLED_APPS = [
     # 'drf_spectacular',  # Temporairement commenté
 ]
 
+# Profil "API seule" : pas de session en base ni de SessionAuthentication sur /api/
+API_ONLY_MIDDLEWARE = config('API_ONLY_MIDDLEWARE', default=False, cast=bool)
+
 MIDDLEWARE = [
+    'config.middleware.RequestIdMiddleware',  # En premier : corrélation de tous les logs
+    'config.middleware.RequestMetricsMiddleware',  # Mesure toute la pile
+    'config.middleware.CompressionMiddleware',  # Retiré de la pile si COMPRESSION_ENABLED=False
+    'config.middleware.SlowQueryLogMiddleware',
+    'config.middleware.NPlusOneMiddleware',  # Retiré de la pile si NPLUSONE_MODE='off'
+    'config.middleware.MemoryProfilingMiddleware',  # Retiré de la pile si MEMORY_PROFILING_ENABLED=False
     "corsheaders.middleware.CorsMiddleware",
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Pour servir les fichiers statiques
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'config.middleware.ApiSessionMiddleware' if API_ONLY_MIDDLEWARE else 'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'config.middleware.ReplicaRoutingMiddleware',  # Retiré de la pile sans DATABASE_REPLICA_URLS
+    'config.middleware.RequestProfilingMiddleware',  # Retiré de la pile si PROFILING_ENABLED=False
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'config.middleware.MediaFilesMiddleware',
@@ -108,6 +120,61 @@ DATABASES = {
     )
 }
 
+# Réplicas en lecture (DATABASE_REPLICA_URLS=postgres://...,postgres://...), voir backend/db_routing.py.
+# Pour essayer en local : DATABASE_REPLICA_URLS=sqlite:///db.sqlite3 (même fichier, sans retard)
+DATABASE_REPLICAS = []
+for _index, _url in enumerate(config('DATABASE_REPLICA_URLS', default='', cast=Csv()), 1):
+    DATABASES[f'replica{_index}'] = dj_database_url.parse(_url, conn_max_age=600)
+    # Les tests n'ont qu'une base : les réplicas la lisent
+    DATABASES[f'replica{_index}']['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(f'replica{_index}')
+
+DATABASE_ROUTERS = ['backend.db_routing.ReplicaRouter']
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=10, cast=int)  # lectures sur le primaire après une écriture
+REPLICA_MAX_LAG_SECONDS = config('REPLICA_MAX_LAG_SECONDS', default=5, cast=float)  # au-delà, le réplica est écarté
+REPLICA_HEALTH_INTERVAL = config('REPLICA_HEALTH_INTERVAL', default=5, cast=float)  # secondes entre deux mesures
+
+# Connexions (voir backend/db_pool.py), pour 'default' et les réplicas :
+#   persistent : une connexion par worker, gardée DB_CONN_MAX_AGE secondes et vérifiée avant réutilisation
+#   psycopg    : pool psycopg 3 par processus (PostgreSQL, paquet psycopg[pool]) ; bases SQLite inchangées
+#   external   : derrière PgBouncer en mode transaction (sans curseurs côté serveur ni requêtes préparées)
+DB_POOL_MODE = config('DB_POOL_MODE', default='persistent')
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=600, cast=int)  # secondes, modes persistent et external
+DB_POOL_MIN_SIZE = config('DB_POOL_MIN_SIZE', default=2, cast=int)  # connexions par processus
+DB_POOL_MAX_SIZE = config('DB_POOL_MAX_SIZE', default=10, cast=int)  # >= threads du worker + AGGREGATE_SECTION_WORKERS
+DB_POOL_TIMEOUT = config('DB_POOL_TIMEOUT', default=10, cast=float)  # attente maximale d'une connexion libre
+DB_POOL_MAX_IDLE = config('DB_POOL_MAX_IDLE', default=300, cast=float)  # fermeture des connexions inutilisées
+DB_POOL_MAX_LIFETIME = config('DB_POOL_MAX_LIFETIME', default=1800, cast=float)  # renouvellement périodique
+
+if DB_POOL_MODE not in ('persistent', 'psycopg', 'external'):
+    from django.core.exceptions import ImproperlyConfigured
+    raise ImproperlyConfigured(f"DB_POOL_MODE inconnu : {DB_POOL_MODE!r} (persistent, psycopg ou external)")
+
+# Django préfère psycopg 3 à psycopg2 quand les deux sont installés
+_psycopg3 = find_spec('psycopg') is not None
+if DB_POOL_MODE == 'psycopg' and not (_psycopg3 and find_spec('psycopg_pool')):
+    from django.core.exceptions import ImproperlyConfigured
+    raise ImproperlyConfigured("DB_POOL_MODE='psycopg' demande psycopg 3 et son pool (pip install \"psycopg[pool]\")")
+for _database in DATABASES.values():
+    _database['CONN_HEALTH_CHECKS'] = True
+    _database['CONN_MAX_AGE'] = DB_CONN_MAX_AGE
+    _postgresql = 'postgresql' in _database['ENGINE']
+    if DB_POOL_MODE == 'psycopg' and _postgresql:
+        # Le pool remplace les connexions persistantes ; CONN_HEALTH_CHECKS vérifie chaque emprunt
+        _database['CONN_MAX_AGE'] = 0
+        _database.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': DB_POOL_MIN_SIZE,
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': DB_POOL_TIMEOUT,
+            'max_idle': DB_POOL_MAX_IDLE,
+            'max_lifetime': DB_POOL_MAX_LIFETIME,
+        }
+    elif DB_POOL_MODE == 'external' and _postgresql:
+        # Une transaction peut changer de connexion serveur à chaque fois
+        _database['DISABLE_SERVER_SIDE_CURSORS'] = True
+        if _psycopg3:
+            _database.setdefault('OPTIONS', {})['prepare_threshold'] = None
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -171,18 +238,203 @@ CORS_ALLOWED_ORIGINS = [
 # Ou pour le développement (moins sécurisé mais plus simple)
 CORS_ALLOW_ALL_ORIGINS = True
 
+# JSON de l'API : 'orjson' (rendu et lecture rapides, paquet `orjson`) ou 'stdlib' (json de DRF)
+API_JSON_BACKEND = config('API_JSON_BACKEND', default='orjson' if find_spec('orjson') else 'stdlib')
+
+if API_JSON_BACKEND not in ('orjson', 'stdlib'):
+    from django.core.exceptions import ImproperlyConfigured
+    raise ImproperlyConfigured(f"API_JSON_BACKEND inconnu : {API_JSON_BACKEND!r} (orjson ou stdlib)")
+if API_JSON_BACKEND == 'orjson' and find_spec('orjson') is None:
+    from django.core.exceptions import ImproperlyConfigured
+    raise ImproperlyConfigured("API_JSON_BACKEND='orjson' demande le paquet orjson (pip install orjson)")
+
 # Configuration REST Framework
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'backend.renderers.ORJSONRenderer' if API_JSON_BACKEND == 'orjson' else 'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    # JSON, formulaires et multipart (envoi de fichiers de /api/profile/)
+    'DEFAULT_PARSER_CLASSES': [
+        'backend.parsers.ORJSONParser' if API_JSON_BACKEND == 'orjson' else 'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'backend.authentication.CachedTokenAuthentication',
+    ] + ([] if API_ONLY_MIDDLEWARE else [
         'rest_framework.authentication.SessionAuthentication',
-    ],
+    ]),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Budgets par utilisateur et par endpoint (throttle_scope sur les vues)
+    'DEFAULT_THROTTLE_CLASSES': [
+        'backend.throttling.UserBudgetThrottle',
+        'backend.throttling.EndpointRateThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': config('THROTTLE_RATE_ANON', default='120/min'),
+        'user': config('THROTTLE_RATE_USER', default='600/min'),
+        'auth': config('THROTTLE_RATE_AUTH', default='10/min'),
+        'messages_read': config('THROTTLE_RATE_MESSAGES_READ', default='120/min'),
+        'messages_write': config('THROTTLE_RATE_MESSAGES_WRITE', default='30/min'),
+        'contact_requests': config('THROTTLE_RATE_CONTACT_REQUESTS', default='20/min'),
+        'activity_register': config('THROTTLE_RATE_ACTIVITY_REGISTER', default='10/min'),
+        'uploads': config('THROTTLE_RATE_UPLOADS', default='10/min'),
+    },
     # 'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',  # Temporairement commenté
 }
 
+# Nombre maximum d'éléments par opération groupée (/api/messages/batch/...)
+MESSAGE_BATCH_MAX = config('MESSAGE_BATCH_MAX', default=100, cast=int)
+
+# Conversations de groupe : taille des pages de messages (?limit= plafonné)
+CONVERSATION_PAGE_SIZE = config('CONVERSATION_PAGE_SIZE', default=50, cast=int)
+CONVERSATION_PAGE_MAX = config('CONVERSATION_PAGE_MAX', default=100, cast=int)
+
+# Notifications groupées : taille des lots d'insertion et fenêtre de regroupement des modifications
+NOTIFICATION_BULK_BATCH_SIZE = config('NOTIFICATION_BULK_BATCH_SIZE', default=500, cast=int)
+NOTIFICATION_COALESCE_SECONDS = config('NOTIFICATION_COALESCE_SECONDS', default=600, cast=int)
+
+# Rappels d'activités et d'événements (python manage.py run_reminders)
+REMINDER_LEAD_HOURS = config('REMINDER_LEAD_HOURS', default='24,2', cast=Csv(int))  # heures avant le début
+REMINDER_GRACE_MINUTES = config('REMINDER_GRACE_MINUTES', default=30, cast=int)  # retard toléré à la planification
+REMINDER_BATCH_SIZE = config('REMINDER_BATCH_SIZE', default=500, cast=int)
+REMINDER_POLL_INTERVAL = config('REMINDER_POLL_INTERVAL', default=30, cast=float)  # secondes
+REMINDER_PLAN_INTERVAL = config('REMINDER_PLAN_INTERVAL', default=300, cast=float)  # secondes
+
+# Tâches de fond en base (python manage.py run_tasks)
+TASK_WORKERS = config('TASK_WORKERS', default=2, cast=int)  # processus du pool
+TASK_BATCH_SIZE = config('TASK_BATCH_SIZE', default=10, cast=int)  # tâches réservées à la fois par processus
+TASK_POLL_INTERVAL = config('TASK_POLL_INTERVAL', default=1.0, cast=float)  # secondes
+TASK_LEASE_SECONDS = config('TASK_LEASE_SECONDS', default=300, cast=int)  # au-delà, la tâche est reprise
+TASK_MAX_ATTEMPTS = config('TASK_MAX_ATTEMPTS', default=5, cast=int)
+TASK_RETRY_BASE_DELAY = config('TASK_RETRY_BASE_DELAY', default=10, cast=float)  # secondes, doublé à chaque essai
+TASK_RETRY_MAX_DELAY = config('TASK_RETRY_MAX_DELAY', default=3600, cast=float)  # secondes
+TASK_RESULT_TTL_HOURS = config('TASK_RESULT_TTL_HOURS', default=24, cast=int)  # tâches terminées conservées
+
+# Accueil et tableau de bord : sections chargées en parallèle (0 : l'une après l'autre).
+# Chaque section tient une connexion : jusqu'à AGGREGATE_SECTION_WORKERS connexions
+# de plus par processus, à compter dans DB_POOL_MAX_SIZE et le max_connections de la base
+AGGREGATE_SECTION_WORKERS = config('AGGREGATE_SECTION_WORKERS', default=8, cast=int)  # threads (et connexions) par processus
+
+# Compression des réponses de l'API : Brotli si le paquet `brotli` est installé, sinon gzip
+COMPRESSION_ENABLED = config('COMPRESSION_ENABLED', default=True, cast=bool)
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', default=1024, cast=int)  # octets
+COMPRESSION_PATHS = config('COMPRESSION_PATHS', default='/api/', cast=Csv())
+# Réponses portant un token : pas de compression (attaque BREACH)
+COMPRESSION_EXCLUDED_PATHS = config('COMPRESSION_EXCLUDED_PATHS', default='/api/auth/', cast=Csv())
+COMPRESSION_LEVELS = {
+    # Type de contenu (ou famille 'text/') : niveau par encodage (Brotli 0-11, gzip 1-9).
+    # Réponses dynamiques : des niveaux moyens, les plus hauts coûtent plus de CPU qu'ils ne gagnent
+    'application/json': {'br': 5, 'gzip': 6},
+    'application/problem+json': {'br': 5, 'gzip': 6},
+    'text/html': {'br': 5, 'gzip': 6},
+    'text/': {'br': 4, 'gzip': 5},
+}
+
+# Cache mémoire token -> utilisateur (par worker)
+AUTH_TOKEN_CACHE_SIZE = config('AUTH_TOKEN_CACHE_SIZE', default=10000, cast=int)
+AUTH_TOKEN_CACHE_TTL = config('AUTH_TOKEN_CACHE_TTL', default=60, cast=int)  # secondes
+
+# Tokens expirants (un par appareil) avec renouvellement glissant
+AUTH_TOKEN_TTL = config('AUTH_TOKEN_TTL', default=30 * 24 * 3600, cast=int)  # secondes
+AUTH_TOKEN_MAX_PER_USER = config('AUTH_TOKEN_MAX_PER_USER', default=10, cast=int)
+AUTH_TOKEN_REVOCATION_SYNC = config('AUTH_TOKEN_REVOCATION_SYNC', default=5, cast=int)  # secondes
+
+# Cache (présence, throttling partagé...) : LocMemCache par défaut, à remplacer
+# par un cache partagé quand plusieurs workers tournent. En production (render.yaml) :
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache et CACHE_LOCATION=redis://...
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='age2meet'),
+    }
+}
+
+# Présence : un client est en ligne tant qu'il envoie des heartbeats
+PRESENCE_TTL = config('PRESENCE_TTL', default=90, cast=int)  # secondes
+PRESENCE_CACHE_ALIAS = config('PRESENCE_CACHE_ALIAS', default='default')
+
+# Un LocMemCache est propre à chaque processus : avec plusieurs workers gunicorn, un
+# membre serait en ligne ou hors ligne selon le worker qui répond
+WEB_CONCURRENCY = config('WEB_CONCURRENCY', default=1, cast=int)  # lu aussi par gunicorn
+if WEB_CONCURRENCY > 1 and CACHES.get(PRESENCE_CACHE_ALIAS, {}).get('BACKEND', '').endswith('.LocMemCache'):
+    from django.core.exceptions import ImproperlyConfigured
+    raise ImproperlyConfigured(
+        f"WEB_CONCURRENCY={WEB_CONCURRENCY} : la présence demande un cache partagé entre les workers "
+        f"(CACHE_BACKEND=django.core.cache.backends.redis.RedisCache, ou PRESENCE_CACHE_ALIAS)"
+    )
+
+# Compteurs de throttling : 'local' (mémoire du worker) ou 'cache' (partagé via CACHES)
+THROTTLE_COUNTER_BACKEND = config('THROTTLE_COUNTER_BACKEND', default='local')
+THROTTLE_CACHE_ALIAS = config('THROTTLE_CACHE_ALIAS', default='default')
+
+# Jeton Bearer pour le scrape de /metrics (sans jeton : accessible seulement en DEBUG)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Profilage à la demande (?__profile=1 pour le staff, ou une fraction des requêtes)
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=False, cast=bool)
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.0, cast=float)  # 0.001 = 1 requête sur 1000
+PROFILING_DEFAULT_PROFILER = config('PROFILING_DEFAULT_PROFILER', default='cprofile')  # ou 'sampling'
+PROFILING_SAMPLE_INTERVAL = config('PROFILING_SAMPLE_INTERVAL', default=0.005, cast=float)  # secondes
+PROFILING_STORE_TTL = config('PROFILING_STORE_TTL', default=3600, cast=int)  # secondes
+PROFILING_STORE_SIZE = config('PROFILING_STORE_SIZE', default=50, cast=int)
+PROFILING_CACHE_ALIAS = config('PROFILING_CACHE_ALIAS', default='default')
+
+# Journal des requêtes SQL lentes (admin > Slow queries)
+SLOW_QUERY_LOG_ENABLED = config('SLOW_QUERY_LOG_ENABLED', default=True, cast=bool)
+SLOW_QUERY_THRESHOLD_MS = config('SLOW_QUERY_THRESHOLD_MS', default=200, cast=float)
+SLOW_QUERY_EXPLAIN_ANALYZE = config('SLOW_QUERY_EXPLAIN_ANALYZE', default=False, cast=bool)  # PostgreSQL : réexécute la requête
+SLOW_QUERY_EXPLAIN_INTERVAL = config('SLOW_QUERY_EXPLAIN_INTERVAL', default=3600, cast=int)  # secondes entre deux EXPLAIN
+SLOW_QUERY_QUEUE_SIZE = config('SLOW_QUERY_QUEUE_SIZE', default=1000, cast=int)
+
+# Détection des N+1 : 'raise' (dev/tests), 'log', 'sample' (canary de production) ou 'off'
+NPLUSONE_MODE = config('NPLUSONE_MODE', default='log' if DEBUG else 'off')
+NPLUSONE_THRESHOLD = config('NPLUSONE_THRESHOLD', default=3, cast=int)  # répétitions depuis la même ligne
+NPLUSONE_SAMPLE_RATE = config('NPLUSONE_SAMPLE_RATE', default=0.01, cast=float)  # mode 'sample'
+
+# Profilage mémoire par vue (tracemalloc) : à activer ponctuellement, workers à un seul thread
+MEMORY_PROFILING_ENABLED = config('MEMORY_PROFILING_ENABLED', default=False, cast=bool)
+MEMORY_PROFILING_FRAMES = config('MEMORY_PROFILING_FRAMES', default=16, cast=int)  # profondeur de pile suivie
+MEMORY_PROFILING_SNAPSHOT_RATE = config('MEMORY_PROFILING_SNAPSHOT_RATE', default=0.1, cast=float)  # sites d'allocation
+MEMORY_PROFILING_TOP = config('MEMORY_PROFILING_TOP', default=10, cast=int)  # sites gardés par instantané
+MEMORY_PROFILING_FLUSH_INTERVAL = config('MEMORY_PROFILING_FLUSH_INTERVAL', default=30, cast=int)  # secondes
+MEMORY_PROFILING_DIR = config('MEMORY_PROFILING_DIR', default=os.path.join('/tmp', 'age2meet-memory'))
+
+# Journalisation structurée : formatage et écriture dans un thread dédié (file bornée)
+LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+LOG_FORMAT = config('LOG_FORMAT', default='json')  # ou 'text'
+LOG_QUEUE_SIZE = config('LOG_QUEUE_SIZE', default=10000, cast=int)
+LOG_SAMPLE_RATE_DEBUG = config('LOG_SAMPLE_RATE_DEBUG', default=0.1, cast=float)  # fraction des requêtes
+LOG_SAMPLE_RATE_INFO = config('LOG_SAMPLE_RATE_INFO', default=1.0, cast=float)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_context': {'()': 'backend.structured_logging.RequestContextFilter'},
+        'sampling': {
+            '()': 'backend.structured_logging.SamplingFilter',
+            'rates': {'DEBUG': LOG_SAMPLE_RATE_DEBUG, 'INFO': LOG_SAMPLE_RATE_INFO},
+        },
+    },
+    'handlers': {
+        'queue': {
+            'class': 'backend.structured_logging.BackgroundQueueHandler',
+            'stream': 'ext://sys.stdout',
+            'format': LOG_FORMAT,
+            'queue_size': LOG_QUEUE_SIZE,
+            'filters': ['request_context', 'sampling'],
+        },
+    },
+    'root': {'handlers': ['queue'], 'level': LOG_LEVEL},
+    'loggers': {
+        'django': {'handlers': ['queue'], 'level': config('DJANGO_LOG_LEVEL', default='INFO'), 'propagate': False},
+    },
+}
+
 # Configuration Swagger/OpenAPI
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Age2Meet API',
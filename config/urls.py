@@ -18,11 +18,13 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from backend.views import MetricsView
 # from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('backend.urls')),
+    path('metrics', MetricsView.as_view(), name='metrics'),
     
     # Documentation API Swagger - Temporairement commenté
     # path('api/schema/', SpectacularAPIView.as_view(), name='schema'),